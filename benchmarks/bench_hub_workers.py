@@ -0,0 +1,135 @@
+# benchmarks/bench_hub_workers.py
+
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import subprocess
+import multiprocessing
+import websockets
+
+# --- Persian: هاب با تعداد worker های مختلف اجرا می‌شود و تعداد پیام تحویل‌شده به viewer ها در ثانیه اندازه‌گیری می‌شود ---
+# --- English: The hub is started with different worker counts and messages delivered to viewers per second are measured ---
+HUB_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "websocket_hub", "websocket_hub.py")
+HUB_PORT = int(os.environ.get("BENCH_HUB_PORT", 18765))
+WORKER_COUNTS = [int(n) for n in os.environ.get("BENCH_WORKERS", "1,2,4").split(",")]
+VIEWERS = int(os.environ.get("BENCH_VIEWERS", 200))
+CLIENT_PROCESSES = int(os.environ.get("BENCH_CLIENT_PROCESSES", 4))
+MESSAGES = int(os.environ.get("BENCH_MESSAGES", 500))
+POSITIONS = int(os.environ.get("BENCH_POSITIONS", 20))
+
+def make_message(i):
+    # --- Persian: پیامی با اندازه‌ای مشابه account_update واقعی ---
+    # --- English: A message sized like a real account_update ---
+    return json.dumps({
+        "type": "account_update", "account_number": 12345678, "timestamp": 1757000000 + i,
+        "data": {
+            "login": 12345678, "balance": 10000.0, "equity": 10000.0 + i, "margin": 250.0,
+            "free_margin": 9750.0 + i, "margin_level": 4000.0, "profit": float(i),
+            "open_trades": [
+                {"ticket": 500000 + k, "symbol": "EURUSD", "type": "BUY", "volume": 0.1,
+                 "price_open": 1.1, "price_current": 1.1 + i / 1e5, "sl": 0.0, "tp": 0.0,
+                 "profit": i / 10, "swap": 0.0, "comment": "", "magic": 0}
+                for k in range(POSITIONS)
+            ],
+        },
+    })
+
+def wait_for_port(port, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Hub did not start on port {port}")
+
+def run_viewers(count, last_marker, ready, results):
+    """
+    Persian: یک پردازه‌ی کلاینت با چند viewer که پیام‌ها را تا رسیدن آخرین پیام می‌شمارد.
+    English: A client process with several viewers that count the messages they receive until the last one arrives.
+    """
+    async def viewer():
+        async with websockets.connect(f"ws://127.0.0.1:{HUB_PORT}", max_size=None) as websocket:
+            await websocket.send(json.dumps({"type": "viewer_hello"}))
+            await websocket.recv()  # subscription state
+            ready.put(1)
+            received, last = 0, None
+            try:
+                while last is None:
+                    message = await asyncio.wait_for(websocket.recv(), timeout=60)
+                    received += 1
+                    # --- Persian: پیام‌های یک viewer کند ممکن است ادغام شوند؛ رسیدن آخرین وضعیت ملاک است ---
+                    # --- English: A slow viewer's messages may be conflated; what counts is reaching the last state ---
+                    if last_marker in message:
+                        last = time.monotonic()
+            except asyncio.TimeoutError:
+                pass
+            return received, last
+
+    async def main():
+        return await asyncio.gather(*(viewer() for _ in range(count)))
+
+    results.put(asyncio.run(main()))
+
+async def publish(messages):
+    async with websockets.connect(f"ws://127.0.0.1:{HUB_PORT}") as websocket:
+        await websocket.send(json.dumps({"type": "streamer_hello", "account_number": 12345678}))
+        started = time.monotonic()
+        for message in messages:
+            await websocket.send(message)
+        return started
+
+def run_case(workers, messages):
+    hub = subprocess.Popen(
+        [sys.executable, HUB_SCRIPT, "--workers", str(workers), "--port", str(HUB_PORT)],
+        cwd=os.path.dirname(HUB_SCRIPT), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_port(HUB_PORT)
+        context = multiprocessing.get_context("spawn")
+        ready, results = context.Queue(), context.Queue()
+        per_process = [VIEWERS // CLIENT_PROCESSES + (i < VIEWERS % CLIENT_PROCESSES) for i in range(CLIENT_PROCESSES)]
+        clients = [
+            context.Process(target=run_viewers, args=(count, f'"timestamp": {1757000000 + len(messages) - 1}', ready, results))
+            for count in per_process if count
+        ]
+        for client in clients:
+            client.start()
+        for _ in range(VIEWERS):
+            ready.get(timeout=60)
+
+        started = asyncio.run(publish(messages))
+        viewers = [viewer for _ in clients for viewer in results.get(timeout=120)]
+        for client in clients:
+            client.join()
+
+        delivered = sum(received for received, _ in viewers)
+        if any(last is None for _, last in viewers):
+            raise RuntimeError("Some viewers never received the last message")
+        elapsed = max(last for _, last in viewers) - started
+        return delivered, elapsed
+    finally:
+        hub.terminate()
+        hub.wait()
+        time.sleep(0.5)
+
+def run_benchmark():
+    print(f"🧪 --- Hub fan-out benchmark: {VIEWERS} viewers, {MESSAGES} messages, "
+          f"{len(make_message(0))} bytes each, {os.cpu_count()} CPUs ---")
+    print("   msg/s = messages x viewers / time until every viewer has the last message")
+    messages = [make_message(i) for i in range(MESSAGES)]
+    baseline = None
+    for workers in WORKER_COUNTS:
+        delivered, elapsed = run_case(workers, messages)
+        rate = MESSAGES * VIEWERS / elapsed
+        baseline = baseline or rate
+        print(f"{workers:>2} worker(s): {elapsed:6.2f} s | {rate:>10.0f} msg/s | x{rate / baseline:.2f} | "
+              f"written {delivered} of {MESSAGES * VIEWERS} (rest conflated)")
+
+
+if __name__ == "__main__":
+    run_benchmark()
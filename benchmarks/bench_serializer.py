@@ -0,0 +1,75 @@
+# benchmarks/bench_serializer.py
+
+import os
+import sys
+import json
+import time
+
+# --- Persian: داده‌ها از MetaTrader5 ساختگی (tests/fake_mt5) می‌آیند، با همان چیدمان خروجی‌های کتابخانه واقعی ---
+# --- English: The data comes from the fake MetaTrader5 (tests/fake_mt5), with the same layouts as the real library's results ---
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path[:0] = [os.path.join(ROOT, "tests", "fake_mt5"), os.path.join(ROOT, "src")]
+import MetaTrader5 as mt5
+import api_gateway
+
+RESULT_SIZE = int(os.environ.get("BENCH_RESULT_SIZE", 10000))
+REPEATS = int(os.environ.get("BENCH_REPEATS", 5))
+
+def make_deals(count):
+    now = int(time.time())
+    return mt5.history_deals_get(now - count * mt5.DEAL_INTERVAL_SECONDS + 1, now)
+
+def make_symbols(count):
+    mt5.SYMBOL_COUNT = count
+    return mt5.symbols_get()
+
+def legacy_serialize(function_name, result):
+    """
+    Persian: مسیر قبلی: تبدیل با _asdict، سپس json.dumps و json.loads و در آخر jsonify.
+    English: The previous path: _asdict conversion, then json.dumps and json.loads, then jsonify.
+    """
+    final_result = [item._asdict() if hasattr(item, '_asdict') else item for item in result]
+    json_result = json.loads(json.dumps(final_result, default=api_gateway.custom_json_encoder))
+    with api_gateway.app.app_context():
+        response = api_gateway.jsonify({"status": "success", "function_name": function_name, "data": json_result})
+    return response.get_data()
+
+def current_serialize(function_name, result):
+    """
+    Persian: مسیر جدید: مبدل کش‌شده برای هر نوع و یک مرحله سریال‌سازی.
+    English: The new path: a cached per-type converter and a single serialization pass.
+    """
+    return api_gateway.serialize_json({
+        "status": "success", "function_name": function_name, "data": api_gateway.convert_result(result)
+    })
+
+def best_time(func, *args):
+    timings = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+def run_benchmark():
+    # --- Persian: فقط سریال‌سازی اندازه‌گیری می‌شود، پس تاخیر ترمینال ساختگی صفر است ---
+    # --- English: Only serialization is measured, so the fake terminal's latency is zero ---
+    mt5.LATENCY = 0
+    mt5.initialize()
+    print(f"🧪 --- Serializer benchmark: {RESULT_SIZE} items, best of {REPEATS} ---")
+    print(f"   JSON backend: {'orjson' if api_gateway.orjson is not None else 'json (stdlib)'}")
+    cases = [
+        ("history_deals_get", make_deals(RESULT_SIZE)),
+        ("symbols_get", make_symbols(RESULT_SIZE)),
+    ]
+    for function_name, result in cases:
+        legacy = best_time(legacy_serialize, function_name, result)
+        current = best_time(current_serialize, function_name, result)
+        assert json.loads(legacy_serialize(function_name, result))["data"] == \
+            json.loads(current_serialize(function_name, result))["data"], "Serializers disagree"
+        print(f"{function_name:>18}: legacy {legacy * 1000:8.1f} ms | "
+              f"single-pass {current * 1000:8.1f} ms | speedup x{legacy / current:.1f}")
+
+
+if __name__ == "__main__":
+    run_benchmark()
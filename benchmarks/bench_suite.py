@@ -0,0 +1,420 @@
+# benchmarks/bench_suite.py
+
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import platform
+import threading
+import subprocess
+import http.client
+import multiprocessing
+from datetime import datetime, timezone
+import websockets
+
+# --- Persian: مجموعه بنچمارک روی MetaTrader5 ساختگی (tests/fake_mt5)، پس روی لینوکس و CI هم اجرا می‌شود.
+#     سه سناریو: توان عملیاتی و تاخیر /rpc، نظم زمانی ارسال استریمر، و پخش هاب از M استریمر به N viewer.
+#     نتیجه یک فایل JSON است؛ با BENCH_BASELINE با یک اجرای قبلی مقایسه شده و در صورت پسرفت با کد 1 خارج می‌شود ---
+# --- English: A benchmark suite on the fake MetaTrader5 (tests/fake_mt5), so it also runs on Linux and CI.
+#     Three scenarios: /rpc throughput and latency, streamer send cadence, and hub fan-out from M streamers to N viewers.
+#     The result is a JSON file; with BENCH_BASELINE it is compared to an earlier run and exits with code 1 on a regression ---
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+SRC_DIR = os.path.join(ROOT, "src")
+HUB_DIR = os.path.join(ROOT, "websocket_hub")
+FAKE_MT5_DIR = os.path.join(ROOT, "tests", "fake_mt5")
+sys.path[:0] = [FAKE_MT5_DIR, SRC_DIR]
+import MetaTrader5 as mt5
+import streamer
+
+SCENARIOS = [s.strip() for s in os.environ.get("BENCH_SCENARIOS", "rpc,streamer,hub").split(",") if s.strip()]
+OUTPUT = os.environ.get("BENCH_OUTPUT", "bench_results.json")
+BASELINE = os.environ.get("BENCH_BASELINE", "")
+# --- Persian: تغییر نسبی مجاز نسبت به baseline قبل از اینکه پسرفت حساب شود ---
+# --- English: Relative change allowed against the baseline before it counts as a regression ---
+TOLERANCE = float(os.environ.get("BENCH_TOLERANCE", 0.25))
+# --- Persian: تغییرات کوچک‌تر از این (میلی‌ثانیه) در معیارهای زمانی نویز حساب می‌شوند ---
+# --- English: Changes smaller than this (in ms) in the timing metrics count as noise ---
+TOLERANCE_MS = float(os.environ.get("BENCH_TOLERANCE_MS", 2))
+
+RPC_PORT = int(os.environ.get("BENCH_API_PORT", 18080))
+RPC_WS_PORT = int(os.environ.get("BENCH_WS_RPC_PORT", 18081))
+RPC_SECONDS = float(os.environ.get("BENCH_RPC_SECONDS", 5))
+RPC_CONCURRENCY = int(os.environ.get("BENCH_RPC_CONCURRENCY", 8))
+
+STREAMER_PORT = int(os.environ.get("BENCH_STREAMER_PORT", 18766))
+STREAMER_SECONDS = float(os.environ.get("BENCH_STREAMER_SECONDS", 10))
+STREAMER_SEND_INTERVAL = float(os.environ.get("BENCH_STREAMER_SEND_INTERVAL", 0.5))
+STREAMER_MARKET_INTERVAL = float(os.environ.get("BENCH_STREAMER_MARKET_INTERVAL", 0.1))
+STREAMER_WATCHLIST = os.environ.get("BENCH_STREAMER_WATCHLIST", "EURUSD,GBPUSD,USDJPY,XAUUSD")
+
+HUB_PORT = int(os.environ.get("BENCH_HUB_PORT", 18765))
+HUB_WORKERS = int(os.environ.get("BENCH_HUB_WORKERS", 1))
+HUB_STREAMERS = [int(n) for n in os.environ.get("BENCH_HUB_STREAMERS", "1,4").split(",")]
+HUB_VIEWERS = [int(n) for n in os.environ.get("BENCH_HUB_VIEWERS", "10,100").split(",")]
+HUB_RATE = float(os.environ.get("BENCH_HUB_RATE", 10))
+HUB_SECONDS = float(os.environ.get("BENCH_HUB_SECONDS", 5))
+CLIENT_PROCESSES = int(os.environ.get("BENCH_CLIENT_PROCESSES", 4))
+
+API_KEY = "bench-key"
+# --- Persian: فراخوانی‌های /rpc؛ همه به جز مورد cached کش را دور می‌زنند تا هر بار به ترمینال برسند ---
+# --- English: The /rpc calls; all but the cached case bypass the cache so that each one reaches the terminal ---
+RPC_CASES = [
+    ("account_info", {"function_name": "account_info"}, True),
+    ("account_info_cached", {"function_name": "account_info"}, False),
+    ("symbol_info_tick", {"function_name": "symbol_info_tick", "args": ["EURUSD"]}, True),
+    ("positions_get", {"function_name": "positions_get"}, True),
+    ("copy_rates_from_pos_1000", {"function_name": "copy_rates_from_pos", "args": ["EURUSD", 1, 0, 1000]}, True),
+]
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def latency_summary(seconds):
+    """
+    Persian: خلاصه توزیع تاخیرها به میلی‌ثانیه.
+    English: Summary of a latency distribution in milliseconds.
+    """
+    if not seconds:
+        return {"count": 0}
+    return {
+        "count": len(seconds), "mean_ms": round(sum(seconds) / len(seconds) * 1e3, 3),
+        "p50_ms": round(percentile(seconds, 0.5) * 1e3, 3), "p90_ms": round(percentile(seconds, 0.9) * 1e3, 3),
+        "p99_ms": round(percentile(seconds, 0.99) * 1e3, 3), "max_ms": round(max(seconds) * 1e3, 3),
+    }
+
+def child_env(**settings):
+    """
+    Persian: محیط پردازه‌های سرویس: ماژول ساختگی جلوتر از هر MetaTrader5 نصب‌شده در PYTHONPATH قرار می‌گیرد.
+    English: Environment of the service processes: the fake module goes ahead of any installed MetaTrader5 on PYTHONPATH.
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [FAKE_MT5_DIR, env.get("PYTHONPATH")]))
+    env.update(MT5_ACCOUNT="12345678", MT5_PASSWORD="bench", MT5_SERVER="Fake-Server", MT5_INIT_RETRY_SECONDS="0.1")
+    env.update({key: str(value) for key, value in settings.items()})
+    return env
+
+def start_service(script, cwd, **settings):
+    return subprocess.Popen([sys.executable, script], cwd=cwd, env=child_env(**settings),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def stop_service(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Nothing is listening on port {port}")
+
+
+# --- Persian: سناریو ۱: توان عملیاتی و تاخیر /rpc با چند کلاینت هم‌زمان ---
+# --- English: Scenario 1: /rpc throughput and latency with several concurrent clients ---
+def rpc_client(body, headers, deadline, latencies, errors):
+    connection = http.client.HTTPConnection("127.0.0.1", RPC_PORT, timeout=30)
+    try:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            connection.request("POST", "/rpc", body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            latencies.append(time.perf_counter() - started)
+            if response.status != 200:
+                errors.append(response.status)
+    finally:
+        connection.close()
+
+def run_rpc_case(payload, bypass_cache):
+    body = json.dumps(payload)
+    headers = {"Content-Type": "application/json", "X-API-KEY": API_KEY}
+    if bypass_cache:
+        headers["X-Cache-Bypass"] = "1"
+    latencies, errors = [], []
+    deadline = time.perf_counter() + RPC_SECONDS
+    clients = [threading.Thread(target=rpc_client, args=(body, headers, deadline, latencies, errors))
+               for _ in range(RPC_CONCURRENCY)]
+    started = time.perf_counter()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    elapsed = time.perf_counter() - started
+    return dict(latency_summary(latencies), requests_per_second=round(len(latencies) / elapsed, 1), errors=len(errors))
+
+def run_rpc():
+    print(f"🧪 --- /rpc: {RPC_CONCURRENCY} concurrent clients, {RPC_SECONDS:g} s per call ---")
+    gateway = start_service(os.path.join(SRC_DIR, "api_gateway.py"), SRC_DIR, API_KEY=API_KEY, API_PORT=RPC_PORT,
+                            WS_RPC_PORT=RPC_WS_PORT, BAR_STORE_ENABLED=0)
+    try:
+        wait_for_port(RPC_PORT)
+        results = []
+        for name, payload, bypass_cache in RPC_CASES:
+            result = dict(name=name, **run_rpc_case(payload, bypass_cache))
+            results.append(result)
+            print(f"{name:>26}: {result['requests_per_second']:>8.1f} req/s | p50 {result['p50_ms']:7.2f} ms | "
+                  f"p99 {result['p99_ms']:7.2f} ms | errors {result['errors']}")
+        return results
+    finally:
+        stop_service(gateway)
+
+
+# --- Persian: سناریو ۲: فاصله پیام‌های استریمر در یک هاب ساختگی، در مقایسه با بازه تنظیم‌شده ---
+# --- English: Scenario 2: spacing of the streamer's messages at a stand-in hub, against the configured interval ---
+async def receive_stream(seconds):
+    arrivals = {}
+    first_message = asyncio.get_running_loop().create_future()
+
+    async def handler(websocket):
+        await websocket.recv()  # streamer_hello
+        async for message in websocket:
+            arrivals.setdefault(json.loads(message)["type"], []).append(time.perf_counter())
+            if not first_message.done():
+                first_message.set_result(None)
+
+    async with websockets.serve(handler, "127.0.0.1", STREAMER_PORT, max_size=None):
+        await asyncio.wait_for(first_message, timeout=60)
+        await asyncio.sleep(seconds)
+    return arrivals
+
+def cadence_summary(times, nominal):
+    intervals = [later - earlier for earlier, later in zip(times, times[1:])]
+    if not intervals:
+        return {"messages": len(times)}
+    mean = sum(intervals) / len(intervals)
+    deviations = [abs(interval - nominal) for interval in intervals]
+    return {
+        "messages": len(times), "nominal_ms": round(nominal * 1e3, 3), "mean_interval_ms": round(mean * 1e3, 3),
+        "drift_ms": round((mean - nominal) * 1e3, 3),
+        "jitter_p50_ms": round(percentile(deviations, 0.5) * 1e3, 3),
+        "jitter_p99_ms": round(percentile(deviations, 0.99) * 1e3, 3),
+        "jitter_max_ms": round(max(deviations) * 1e3, 3),
+    }
+
+def run_streamer():
+    print(f"🧪 --- Streamer cadence: account every {STREAMER_SEND_INTERVAL:g} s, "
+          f"market data every {STREAMER_MARKET_INTERVAL:g} s, {STREAMER_SECONDS:g} s ---")
+    # --- Persian: فاصله تیک‌ها کوتاه‌تر از بازه داده بازار است تا هر دور یک فریم داشته باشد ---
+    # --- English: Ticks come faster than the market data interval, so every poll has a frame to send ---
+    process = start_service(
+        os.path.join(SRC_DIR, "streamer.py"), SRC_DIR, WEBSOCKET_URI=f"ws://127.0.0.1:{STREAMER_PORT}",
+        SEND_INTERVAL_SECONDS=STREAMER_SEND_INTERVAL, MARKET_DATA_INTERVAL_SECONDS=STREAMER_MARKET_INTERVAL,
+        WATCHLIST=STREAMER_WATCHLIST, STREAMER_METRICS_PORT=0,
+        FAKE_MT5_TICK_INTERVAL_MS=max(1, int(STREAMER_MARKET_INTERVAL * 1000) // 4),
+    )
+    try:
+        arrivals = asyncio.run(receive_stream(STREAMER_SECONDS))
+    finally:
+        stop_service(process)
+    nominal = {"account_update": STREAMER_SEND_INTERVAL, "market_data": STREAMER_MARKET_INTERVAL}
+    results = []
+    for message_type, times in sorted(arrivals.items()):
+        result = dict(type=message_type, **cadence_summary(times, nominal.get(message_type, STREAMER_SEND_INTERVAL)))
+        results.append(result)
+        print(f"{message_type:>26}: {result['messages']:>5} messages | mean {result.get('mean_interval_ms', 0):8.2f} ms | "
+              f"jitter p50 {result.get('jitter_p50_ms', 0):6.2f} ms, p99 {result.get('jitter_p99_ms', 0):6.2f} ms")
+    return results
+
+
+# --- Persian: سناریو ۳: پخش هاب از M استریمر به N viewer؛ تاخیر از ارسال استریمر تا دریافت viewer ---
+# --- English: Scenario 3: hub fan-out from M streamers to N viewers; latency from the streamer's send to the viewer's receive ---
+def sent_at(message):
+    start = message.index('"sent_at": ') + 11
+    return float(message[start:message.index(",", start)])
+
+def run_viewers(count, streamers, ready, results):
+    """
+    Persian: یک پردازه کلاینت با چند viewer که تا رسیدن آخرین پیام همه استریمرها تاخیر هر پیام را ثبت می‌کنند.
+    English: A client process with several viewers that record each message's latency until every streamer's last message arrives.
+    """
+    async def viewer():
+        async with websockets.connect(f"ws://127.0.0.1:{HUB_PORT}", max_size=None) as websocket:
+            await websocket.send(json.dumps({"type": "viewer_hello", "types": ["account_update"]}))
+            await websocket.recv()  # subscription state
+            ready.put(1)
+            latencies, finished = [], 0
+            try:
+                while finished < streamers:
+                    message = await asyncio.wait_for(websocket.recv(), timeout=60)
+                    latencies.append(time.time() - sent_at(message))
+                    # --- Persian: پیام‌های یک viewer کند ممکن است ادغام شوند؛ آخرین وضعیت همیشه می‌رسد ---
+                    # --- English: A slow viewer's messages may be conflated; the last state always arrives ---
+                    if '"last": true' in message:
+                        finished += 1
+            except asyncio.TimeoutError:
+                pass
+            return latencies, time.time(), finished == streamers
+
+    async def main():
+        return await asyncio.gather(*(viewer() for _ in range(count)))
+
+    results.put(asyncio.run(main()))
+
+async def publish(update, streamers):
+    """
+    Persian: M استریمر هر کدام با نرخ HUB_RATE پیام در ثانیه ارسال می‌کنند؛ برمی‌گرداند (زمان شروع، تعداد ارسال‌شده).
+    English: M streamers each send HUB_RATE messages per second; returns (start time, messages sent).
+    """
+    count = max(1, int(HUB_RATE * HUB_SECONDS))
+
+    async def stream(index):
+        account_number = 10000000 + index
+        async with websockets.connect(f"ws://127.0.0.1:{HUB_PORT}") as websocket:
+            await websocket.send(json.dumps({"type": "streamer_hello", "account_number": account_number}))
+            started = time.monotonic()
+            for i in range(count):
+                await asyncio.sleep(max(0.0, started + i / HUB_RATE - time.monotonic()))
+                await websocket.send(json.dumps({"sent_at": time.time(), "last": i == count - 1,
+                                                 **update, "account_number": account_number}))
+            # --- Persian: اتصال تا تحویل آخرین پیام باز می‌ماند ---
+            # --- English: The connection stays open until the last message has been delivered ---
+            await asyncio.sleep(1)
+
+    started = time.time()
+    await asyncio.gather(*(stream(index) for index in range(streamers)))
+    return started, count * streamers
+
+def run_hub_case(update, streamers, viewers):
+    hub = subprocess.Popen(
+        [sys.executable, os.path.join(HUB_DIR, "websocket_hub.py"), "--workers", str(HUB_WORKERS), "--port", str(HUB_PORT)],
+        cwd=HUB_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_port(HUB_PORT)
+        context = multiprocessing.get_context("spawn")
+        ready, results = context.Queue(), context.Queue()
+        processes = min(CLIENT_PROCESSES, viewers)
+        per_process = [viewers // processes + (i < viewers % processes) for i in range(processes)]
+        clients = [context.Process(target=run_viewers, args=(count, streamers, ready, results)) for count in per_process]
+        for client in clients:
+            client.start()
+        for _ in range(viewers):
+            ready.get(timeout=60)
+
+        started, published = asyncio.run(publish(update, streamers))
+        received = [viewer for _ in clients for viewer in results.get(timeout=120)]
+        for client in clients:
+            client.join()
+    finally:
+        stop_service(hub)
+        time.sleep(0.5)
+
+    latencies = [latency for viewer_latencies, _, _ in received for latency in viewer_latencies]
+    finished = max(finished_at for _, finished_at, _ in received)
+    return dict(
+        streamers=streamers, viewers=viewers, published=published, expected=published * viewers,
+        delivered=len(latencies), complete=all(complete for _, _, complete in received),
+        deliveries_per_second=round(len(latencies) / (finished - started), 1), latency=latency_summary(latencies),
+    )
+
+def run_hub():
+    # --- Persian: بدنه پیام همان account_update واقعی استریمر است که از حساب ساختگی ساخته می‌شود ---
+    # --- English: The message body is the streamer's real account_update, built from the fake account ---
+    mt5.initialize()
+    update = streamer.build_account_update(mt5.account_info(), mt5.positions_get())
+    print(f"🧪 --- Hub fan-out: {HUB_WORKERS} worker(s), {HUB_RATE:g} msg/s per streamer for {HUB_SECONDS:g} s, "
+          f"{len(json.dumps(update))} bytes each ---")
+    results = []
+    for streamers in HUB_STREAMERS:
+        for viewers in HUB_VIEWERS:
+            result = run_hub_case(update, streamers, viewers)
+            results.append(result)
+            print(f"{f'{streamers} x {viewers}':>26}: {result['deliveries_per_second']:>8.0f} msg/s | "
+                  f"p50 {result['latency'].get('p50_ms', 0):7.2f} ms | p99 {result['latency'].get('p99_ms', 0):7.2f} ms | "
+                  f"delivered {result['delivered']} of {result['expected']}" + ("" if result["complete"] else " (incomplete)"))
+    return results
+
+
+# --- Persian: خروجی قابل خواندن توسط ماشین و مقایسه با baseline ---
+# --- English: Machine-readable output and the baseline comparison ---
+def flatten(results):
+    """
+    Persian: اعداد اصلی هر سناریو با نام پایدار؛ مقایسه با baseline روی همین‌ها انجام می‌شود.
+    English: The headline numbers of each scenario under stable names; the baseline comparison uses these.
+    """
+    flat = {}
+    for result in results.get("rpc", []):
+        for key in ("requests_per_second", "p50_ms", "p99_ms"):
+            flat[f"rpc.{result['name']}.{key}"] = result.get(key)
+    for result in results.get("streamer", []):
+        for key in ("drift_ms", "jitter_p50_ms", "jitter_p99_ms"):
+            flat[f"streamer.{result['type']}.{key}"] = result.get(key)
+    for result in results.get("hub", []):
+        name = f"hub.{result['streamers']}x{result['viewers']}"
+        flat[f"{name}.deliveries_per_second"] = result["deliveries_per_second"]
+        flat[f"{name}.p50_ms"] = result["latency"].get("p50_ms")
+        flat[f"{name}.p99_ms"] = result["latency"].get("p99_ms")
+    return {name: value for name, value in flat.items() if value is not None}
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(metrics, baseline_metrics):
+    """
+    Persian: معیارهایی که بیش از TOLERANCE بدتر شده‌اند؛ برای _per_second بیشتر بهتر است و برای _ms کمتر.
+    یک معیار زمانی باید بیش از TOLERANCE_MS هم تغییر کرده باشد.
+    English: The metrics that got worse by more than TOLERANCE; higher is better for _per_second, lower for _ms.
+    A timing metric must also have moved by more than TOLERANCE_MS.
+    """
+    regressions = []
+    for name, value in metrics.items():
+        previous = baseline_metrics.get(name)
+        if not previous:
+            continue
+        change = (value - previous) / abs(previous)
+        worse = -change if name.endswith("_per_second") else change
+        if name.endswith("_ms") and abs(value - previous) <= TOLERANCE_MS:
+            continue
+        if worse > TOLERANCE:
+            regressions.append((name, previous, value, change))
+    return regressions
+
+def run_benchmark():
+    scenarios = {"rpc": run_rpc, "streamer": run_streamer, "hub": run_hub}
+    unknown = [name for name in SCENARIOS if name not in scenarios]
+    if unknown:
+        print(f"❌ Unknown scenario(s): {', '.join(unknown)}. Choose from {', '.join(scenarios)}.")
+        sys.exit(2)
+
+    report = {
+        "schema": 1, "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"), "git_commit": git_commit(),
+        "host": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "fake_mt5": {"latency": mt5.LATENCY, "latency_jitter": mt5.LATENCY_JITTER, "latency_per_item": mt5.LATENCY_PER_ITEM,
+                     "symbols": mt5.SYMBOL_COUNT, "positions": mt5.POSITION_COUNT},
+    }
+    results = {name: scenarios[name]() for name in SCENARIOS}
+    report.update(results)
+    report["metrics"] = flatten(results)
+    with open(OUTPUT, "w") as output:
+        json.dump(report, output, indent=2)
+    print(f"   Results written to {OUTPUT}")
+
+    if BASELINE:
+        with open(BASELINE) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(report["metrics"], baseline.get("metrics", {}))
+        print(f"   Compared with {BASELINE} (commit {baseline.get('git_commit')}), "
+              f"tolerance {TOLERANCE:.0%} and {TOLERANCE_MS:g} ms")
+        for name, previous, value, change in regressions:
+            print(f"❌ {name}: {previous} -> {value} ({change:+.0%})")
+        if regressions:
+            sys.exit(1)
+        print("   No regressions.")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,108 @@
+# benchmarks/bench_wire_encoding.py
+
+import os
+import sys
+import time
+import zlib
+import random
+
+# --- Persian: ماژول wire هاب برای کدگذاری استفاده می‌شود تا اعداد با مسیر واقعی یکی باشند ---
+# --- English: The hub's wire module is used for encoding, so the numbers match the real path ---
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "websocket_hub"))
+import wire
+
+POSITIONS = int(os.environ.get("BENCH_POSITIONS", 500))
+MESSAGES = int(os.environ.get("BENCH_MESSAGES", 200))
+VIEWERS = int(os.environ.get("BENCH_VIEWERS", 100))
+# --- Persian: همان تنظیمات پیش‌فرض permessage-deflate هاب ---
+# --- English: The hub's default permessage-deflate settings ---
+DEFLATE_WINDOW_BITS = int(os.environ.get("HUB_DEFLATE_WINDOW_BITS", 12))
+DEFLATE_MEM_LEVEL = int(os.environ.get("HUB_DEFLATE_MEM_LEVEL", 5))
+DEFLATE_LEVEL = int(os.environ.get("HUB_DEFLATE_LEVEL", 6))
+
+def make_updates(count):
+    """
+    Persian: دنباله‌ای از account_update های یک حساب با POSITIONS پوزیشن که قیمت‌هایشان تغییر می‌کند.
+    English: A sequence of account_update messages for one account with POSITIONS positions whose prices move.
+    """
+    symbols = ["EURUSD", "GBPUSD", "USDJPY", "XAUUSD", "US30", "BTCUSD"]
+    positions = [
+        {"ticket": 700000000 + k, "symbol": random.choice(symbols), "type": random.choice(["BUY", "SELL"]),
+         "volume": random.choice([0.01, 0.1, 0.5, 1.0]), "price_open": round(random.uniform(1, 2), 5),
+         "price_current": 0.0, "profit": 0.0, "swap": round(random.uniform(-5, 0), 2), "time_open": 1757000000 - k * 60}
+        for k in range(POSITIONS)
+    ]
+    updates = []
+    for i in range(count):
+        for position in positions:
+            position["price_current"] = round(position["price_open"] + random.uniform(-0.01, 0.01), 5)
+            position["profit"] = round((position["price_current"] - position["price_open"]) * 1e5 * position["volume"], 2)
+        profit = round(sum(p["profit"] for p in positions), 2)
+        updates.append({
+            "type": "account_update", "account_number": 12345678, "timestamp": 1757000000 + i,
+            "data": {
+                "balance": 100000.0, "equity": 100000.0 + profit, "profit": profit, "margin": 25000.0,
+                "margin_free": 75000.0 + profit, "margin_level": round((100000.0 + profit) / 250, 2),
+                "open_trades_count": POSITIONS, "open_trades": [dict(p) for p in positions],
+            },
+        })
+    return updates
+
+def deflater():
+    """
+    Persian: مثل permessage-deflate یک اتصال واقعی: context بین پیام‌ها حفظ می‌شود.
+    English: Like one connection's permessage-deflate: the context is kept between messages.
+    """
+    compressor = zlib.compressobj(DEFLATE_LEVEL, zlib.DEFLATED, -DEFLATE_WINDOW_BITS, DEFLATE_MEM_LEVEL)
+    def deflate(message):
+        data = message.encode() if isinstance(message, str) else message
+        return len(compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)) - 4
+    return deflate
+
+def timed(func, items):
+    started = time.perf_counter()
+    results = [func(item) for item in items]
+    return (time.perf_counter() - started) / len(items), results
+
+def run_benchmark():
+    if wire.msgpack is None:
+        print("❌ msgpack is not installed; nothing to compare.")
+        sys.exit(1)
+    print(f"🧪 --- Wire encoding benchmark: account_update with {POSITIONS} positions, {MESSAGES} messages ---")
+    updates = make_updates(MESSAGES)
+    rows = {}
+    for encoding in (wire.ENCODING_JSON, wire.ENCODING_MSGPACK):
+        encode_time, encoded = timed(lambda update: wire.encode(encoding, update), updates)
+        tag_time, tagged = timed(lambda message: wire.with_hub_seq(encoding, message, 123456789), encoded)
+        decode_time, _ = timed(lambda message: wire.decode(encoding, message), tagged)
+        deflate_time, deflated = timed(deflater(), tagged)
+        rows[encoding] = {
+            "bytes": sum(len(m.encode() if isinstance(m, str) else m) for m in tagged) / MESSAGES,
+            "deflated": sum(deflated) / MESSAGES,
+            "encode": encode_time, "tag": tag_time, "decode": decode_time, "deflate": deflate_time,
+        }
+
+    # --- Persian: هزینه هاب برای هر پیام: یک بار decode برای کش، و در صورت نیاز یک بار ترجمه (نه برای هر viewer) ---
+    # --- English: Hub cost per message: one decode for its caches, and one translation if needed (not one per viewer) ---
+    for encoding, row in rows.items():
+        other = wire.ENCODING_MSGPACK if encoding == wire.ENCODING_JSON else wire.ENCODING_JSON
+        row["hub"] = row["decode"] + row["tag"]
+        row["hub_translating"] = row["hub"] + rows[other]["encode"]
+
+    print(f"{'':>22} {'json':>12} {'msgpack':>12} {'ratio':>8}")
+    def line(label, key, scale, unit):
+        json_value, msgpack_value = rows["json"][key] * scale, rows["msgpack"][key] * scale
+        print(f"{label:>22} {json_value:>10.1f}{unit} {msgpack_value:>10.1f}{unit} {msgpack_value / json_value:>8.2f}")
+    line("message size", "bytes", 1 / 1024, "KB")
+    line("after deflate", "deflated", 1 / 1024, "KB")
+    line("streamer encode", "encode", 1e3, "ms")
+    line("hub decode + tag", "hub", 1e3, "ms")
+    line("hub with translation", "hub_translating", 1e3, "ms")
+    line("viewer decode", "decode", 1e3, "ms")
+    line("deflate per viewer", "deflate", 1e3, "ms")
+    print(f"   With {VIEWERS} viewers and compression on, the hub deflates each message {VIEWERS} times: "
+          f"json {rows['json']['deflate'] * VIEWERS * 1e3:.0f} ms vs msgpack {rows['msgpack']['deflate'] * VIEWERS * 1e3:.0f} ms per message.")
+
+
+if __name__ == "__main__":
+    run_benchmark()
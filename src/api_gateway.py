@@ -4,12 +4,38 @@ import os
 import sys
 import json
 import logging
+import io
+import math
+import time
+import queue
+import itertools
+import threading
 import functools
+from collections import OrderedDict
+from concurrent.futures import Future
 from datetime import datetime
+import numpy as np
 import pandas as pd
+import asyncio
 import MetaTrader5 as mt5
-from flask import Flask, request, jsonify
+import websockets
+from flask import Flask, Response, request, jsonify
 from waitress import serve
+import metrics
+
+# --- Persian: pyarrow اختیاری است؛ بدون آن فرمت Arrow ارائه نمی‌شود ---
+# --- English: pyarrow is optional; without it the Arrow format is simply not offered ---
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+# --- Persian: orjson اختیاری است و در صورت نصب بودن، سریال‌سازی را چند برابر سریع‌تر می‌کند ---
+# --- English: orjson is optional and, when installed, makes serialization several times faster ---
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # --- Persian: تنظیمات اولیه از متغیرهای محیطی ---
 # --- English: Initial settings from environment variables ---
@@ -23,6 +49,121 @@ API_KEY = os.environ.get("API_KEY", "") # --- Persian: کلید امنیتی ج
 # --- English: List of disallowed functions to prevent connection tampering ---
 DISALLOWED_FUNCTIONS = ['initialize', 'login', 'shutdown']
 
+# --- Persian: حداکثر تعداد فراخوانی‌ها در یک درخواست دسته‌ای ---
+# --- English: Maximum number of calls accepted in a single batch request ---
+MAX_BATCH_CALLS = int(os.environ.get("MAX_BATCH_CALLS", 100))
+
+# --- Persian: نوع‌های محتوای قابل مذاکره از طریق هدر Accept برای نتایج آرایه‌ای (copy_rates_* و copy_ticks_*) ---
+# --- English: Content types negotiable through the Accept header for array results (copy_rates_* and copy_ticks_*) ---
+JSON_MIMETYPE = "application/json"
+ARROW_MIMETYPE = "application/vnd.apache.arrow.stream"
+NUMPY_MIMETYPE = "application/x-npy"
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+# --- Persian: توابعی که در حالت استریم به پنجره‌های زمانی تقسیم می‌شوند:
+#     (اندیس date_from در args، فیلد زمان هر رکورد، مقیاس آن نسبت به ثانیه، اندازه پیش‌فرض پنجره به ثانیه) ---
+# --- English: Functions that the streaming mode splits into time windows:
+#     (index of date_from in args, per-record time field, its scale relative to seconds, default window in seconds) ---
+STREAMABLE_FUNCTIONS = {
+    'history_deals_get': (0, 'time', 1, 30 * 86400),
+    'history_orders_get': (0, 'time_setup', 1, 30 * 86400),
+    'copy_rates_range': (2, 'time', 1, 30 * 86400),
+    'copy_ticks_range': (1, 'time_msc', 1000, 3600),
+}
+
+# --- Persian: سیاست کش برای توابع فقط‌خواندنی: (مدت اعتبار به ثانیه، حداکثر تعداد ورودی‌ها) ---
+# --- English: Cache policy for read-mostly functions: (TTL in seconds, maximum number of entries) ---
+RESPONSE_CACHE_ENABLED = os.environ.get("RESPONSE_CACHE_ENABLED", "1") == "1"
+CACHE_POLICIES = {
+    'version': (3600, 1),
+    'terminal_info': (1, 1),
+    'account_info': (1, 1),
+    'symbols_total': (60, 1),
+    'symbols_get': (60, 32),
+    'symbol_info': (1, 512),
+}
+# --- Persian: امکان تغییر سیاست‌ها با یک JSON مثل {"symbols_get": [30, 16]} ---
+# --- English: Policies can be overridden with JSON such as {"symbols_get": [30, 16]} ---
+CACHE_POLICIES.update({
+    name: tuple(policy) for name, policy in json.loads(os.environ.get("CACHE_POLICIES", "{}")).items()
+})
+
+# --- Persian: توابع تغییردهنده و ورودی‌هایی از کش که بعد از اجرای آن‌ها باید پاک شوند ---
+# --- English: Mutating functions and the cached functions they invalidate once executed ---
+CACHE_INVALIDATED_BY = {
+    'order_send': ['account_info', 'terminal_info'],
+    'symbol_select': ['symbols_total', 'symbols_get', 'symbol_info'],
+    'market_book_add': ['symbol_info'],
+    'market_book_release': ['symbol_info'],
+}
+
+# --- Persian: اولویت صف اجرا؛ عدد کمتر زودتر اجرا می‌شود ---
+# --- English: Execution queue priorities; a lower number runs first ---
+PRIORITY_TRADE = 0
+# --- Persian: خواندن‌های استریمر در حالت سرویس ترکیبی، تا آهنگ ارسال پشت فراخوانی‌های /rpc نماند ---
+# --- English: The streamer's reads in combined service mode, so its send cadence never waits behind /rpc calls ---
+PRIORITY_STREAMER = 1
+PRIORITY_DEFAULT = 2
+PRIORITY_BULK = 3
+TRADE_FUNCTIONS = ('order_send', 'order_check')
+BULK_FUNCTION_PREFIXES = ('history_', 'copy_')
+
+# --- Persian: توابعی که وضعیت ترمینال را تغییر می‌دهند و هرگز ادغام نمی‌شوند ---
+# --- English: Functions that change terminal state and are never coalesced ---
+MUTATING_FUNCTIONS = {'order_send', 'symbol_select', 'market_book_add', 'market_book_release'}
+
+# --- Persian: پورت کانال RPC وب‌سوکت و حداکثر فراخوانی‌های همزمان هر اتصال ---
+# --- English: Port of the WebSocket RPC channel and the maximum concurrent calls per connection ---
+WS_RPC_PORT = int(os.environ.get("WS_RPC_PORT", 8081))
+WS_RPC_MAX_INFLIGHT = int(os.environ.get("WS_RPC_MAX_INFLIGHT", 256))
+
+# --- Persian: انبار محلی کندل‌ها جلوی copy_rates_range؛ بازه‌هایی که قدیمی‌تر از settle_seconds باشند کامل ذخیره می‌شوند ---
+# --- English: Local bar store in front of copy_rates_range; ranges older than settle_seconds are stored completely ---
+BAR_STORE_ENABLED = os.environ.get("BAR_STORE_ENABLED", "1") == "1"
+BAR_STORE_DIR = os.environ.get("BAR_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "bar_store"))
+BAR_STORE_SETTLE_SECONDS = int(os.environ.get("BAR_STORE_SETTLE_SECONDS", 2 * 86400))
+BAR_STORE_MAX_SEGMENTS = int(os.environ.get("BAR_STORE_MAX_SEGMENTS", 32))
+
+# --- Persian: پورت وب سرور HTTP ---
+# --- English: Port of the HTTP web server ---
+API_PORT = int(os.environ.get("API_PORT", 8080))
+
+# --- Persian: تعداد تردهای waitress؛ این تردها فقط منتظر صف اجرای mt5 می‌مانند ---
+# --- English: Number of waitress threads; they only wait on the mt5 execution queue ---
+WAITRESS_THREADS = int(os.environ.get("WAITRESS_THREADS", 8))
+
+# --- Persian: هدری که کلاینت با آن می‌تواند کش را برای یک درخواست دور بزند ---
+# --- English: Header a client can send to bypass the cache for one request ---
+CACHE_BYPASS_HEADER = "X-Cache-Bypass"
+
+# --- Persian: در حالت سرویس ترکیبی، توابعی که از آخرین وضعیت خوانده‌شده توسط استریمر پاسخ داده می‌شوند،
+#     و حداکثر عمر پیش‌فرض آن وضعیت به ثانیه (قابل تغییر برای هر درخواست با هدر زیر؛ 0 یعنی همیشه فراخوانی زنده) ---
+# --- English: In combined service mode, the functions answered from the streamer's latest read,
+#     and the default maximum age of that read in seconds (per request through the header below; 0 means always call live) ---
+SNAPSHOT_FUNCTIONS = ('account_info', 'positions_get', 'positions_total')
+SNAPSHOT_MAX_AGE = float(os.environ.get("SNAPSHOT_MAX_AGE", 1.5))
+SNAPSHOT_MAX_AGE_HEADER = "X-Snapshot-Max-Age"
+
+# --- Persian: مسیر اختصاصی سفارش (/order): مدت اعتبار قالب هر نماد، نمادهایی که قالبشان هنگام راه‌اندازی ساخته می‌شود،
+#     انحراف قیمت پیش‌فرض، و مدت نگهداری و حداکثر تعداد کلیدهای Idempotency-Key ---
+# --- English: Dedicated order path (/order): lifetime of each symbol's template, symbols whose templates are built at startup,
+#     the default price deviation, and how long and how many Idempotency-Key results are kept ---
+ORDER_TEMPLATE_TTL = float(os.environ.get("ORDER_TEMPLATE_TTL", 300))
+ORDER_SYMBOLS = [s.strip() for s in os.environ.get("ORDER_SYMBOLS", "").split(",") if s.strip()]
+ORDER_DEVIATION = int(os.environ.get("ORDER_DEVIATION", 10))
+IDEMPOTENCY_TTL = float(os.environ.get("IDEMPOTENCY_TTL", 86400))
+IDEMPOTENCY_MAX_KEYS = int(os.environ.get("IDEMPOTENCY_MAX_KEYS", 10000))
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_WAIT_SECONDS = 30
+# --- Persian: اجرای order_check پیش از هر سفارش، اگر درخواست خودش check را تعیین نکند ---
+# --- English: Run order_check before every order, unless the request sets check itself ---
+ORDER_CHECK = os.environ.get("ORDER_CHECK", "0") == "1"
+
+# --- Persian: تلاش‌های initialize هنگام راه‌اندازی، به جای یک تاخیر ثابت برای آماده شدن ترمینال ---
+# --- English: initialize attempts at startup, instead of a fixed delay for the terminal to become ready ---
+MT5_INIT_ATTEMPTS = int(os.environ.get("MT5_INIT_ATTEMPTS", 10))
+MT5_INIT_RETRY_SECONDS = float(os.environ.get("MT5_INIT_RETRY_SECONDS", 3))
+
 # --- Persian: راه‌اندازی سیستم لاگینگ ---
 # --- English: Setting up the logging system ---
 log_formatter = logging.Formatter('%(asctime)s - API_GATEWAY - %(levelname)s - %(message)s')
@@ -37,6 +178,32 @@ if not logger.handlers:
 # --- English: Initializing the Flask web server ---
 app = Flask(__name__)
 
+# --- Persian: متریک‌های گیت‌وی که در GET /metrics با فرمت Prometheus نمایش داده می‌شوند ---
+# --- English: Gateway metrics, exposed in the Prometheus format on GET /metrics ---
+RPC_CALLS = metrics.Counter(
+    "gateway_rpc_calls_total", "RPC calls by function and outcome (success, error, cache, snapshot).",
+    ("function", "outcome"))
+RPC_STAGE_SECONDS = metrics.Histogram(
+    "gateway_rpc_stage_seconds",
+    "Time spent in each stage of an RPC call: queue (waiting for the mt5 thread), mt5 (the terminal call), "
+    "convert and serialize.", ("function", "stage"))
+RPC_RESPONSE_BYTES = metrics.Histogram(
+    "gateway_rpc_response_bytes", "Size of RPC response bodies.", ("function",), buckets=metrics.SIZE_BUCKETS)
+RPC_INFLIGHT = metrics.Gauge("gateway_rpc_inflight", "mt5 calls waiting for or running on the mt5 thread.")
+ORDER_STAGE_SECONDS = metrics.Histogram(
+    "gateway_order_stage_seconds", "Time spent in each stage of a /order request.", ("stage",))
+metrics.Gauge("gateway_executor_queue_depth", "Calls queued for the mt5 thread.",
+              callback=lambda: MT5_EXECUTOR.queue_depth())
+
+def function_label(function_name):
+    """
+    Persian: برچسب تابع در متریک‌ها؛ نام‌های ناشناخته "other" می‌شوند تا تعداد سری‌ها محدود بماند.
+    English: The function label of a metric; unknown names become "other" so the number of series stays bounded.
+    """
+    if isinstance(function_name, str) and not function_name.startswith('_') and hasattr(mt5, function_name):
+        return function_name
+    return "other"
+
 # --- Persian: تابع کمکی هوشمند و جهانی برای تبدیل انواع داده به JSON ---
 # --- English: Smart and universal helper function to convert data types to JSON ---
 def custom_json_encoder(obj):
@@ -50,6 +217,19 @@ def custom_json_encoder(obj):
     if isinstance(obj, pd.DataFrame):
         return obj.to_dict(orient='records')
 
+    # --- Persian: آرایه‌های ساخت‌یافته نامپای (خروجی copy_rates_* و copy_ticks_*) به لیست دیکشنری‌ها تبدیل می‌شوند ---
+    # --- English: NumPy structured arrays (returned by copy_rates_* and copy_ticks_*) become a list of dictionaries ---
+    if isinstance(obj, np.ndarray):
+        if obj.dtype.names:
+            names = obj.dtype.names
+            return [dict(zip(names, row)) for row in obj.tolist()]
+        return obj.tolist()
+
+    # --- Persian: اسکالرهای نامپای به نوع معادل پایتونی تبدیل می‌شوند ---
+    # --- English: NumPy scalars are converted to their Python equivalent ---
+    if isinstance(obj, np.generic):
+        return obj.item()
+
     # --- Persian: اگر تاریخ و زمان بود، به فرمت استاندارد ISO تبدیل کن ---
     # --- English: If it's a datetime object, convert it to standard ISO format ---
     if isinstance(obj, datetime):
@@ -64,6 +244,633 @@ def custom_json_encoder(obj):
     # --- English: If none of the above, let the error occur so we become aware of a new data type ---
     raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
 
+# --- Persian: کش مبدل‌ها برای هر نوع خروجی mt5 (مثل TradePosition، TradeDeal و SymbolInfo) ---
+# --- English: Cache of converters for each mt5 result type (such as TradePosition, TradeDeal and SymbolInfo) ---
+_RESULT_CONVERTERS = {}
+
+def _converter_for(result, result_type):
+    """
+    Persian: مبدل دیکشنری را برای یک نوع namedtuple یک بار بر اساس چیدمان فیلدهایش می‌سازد و کش می‌کند.
+    English: Builds, once per namedtuple type, a dict converter based on its field layout and caches it.
+    """
+    converter = _RESULT_CONVERTERS.get(result_type)
+    if converter is not None:
+        return converter
+
+    fields = result_type._fields
+    # --- Persian: فیلدهایی که خودشان namedtuple هستند (مثل request در OrderSendResult) ---
+    # --- English: Fields that are namedtuples themselves (like request in OrderSendResult) ---
+    nested = [index for index, value in enumerate(result) if hasattr(value, '_asdict')]
+    if not nested:
+        def converter(row):
+            return dict(zip(fields, row))
+    else:
+        def converter(row):
+            values = list(row)
+            for index in nested:
+                value = values[index]
+                if hasattr(value, '_asdict'):
+                    values[index] = _converter_for(value, type(value))(value)
+            return dict(zip(fields, values))
+
+    _RESULT_CONVERTERS[result_type] = converter
+    return converter
+
+def convert_result(result):
+    """
+    Persian: خروجی mt5 را به ساختاری تبدیل می‌کند که سریال‌ساز بتواند مستقیم بنویسد.
+    English: Converts an mt5 result into a structure the serializer can write directly.
+    """
+    # --- Persian: اگر نتیجه یک آبجکت تکی با متد _asdict بود (مثل account_info) ---
+    # --- English: If the result is a single object with the _asdict method (like account_info) ---
+    if hasattr(result, '_asdict'):
+        return _converter_for(result, type(result))(result)
+
+    # --- Persian: اگر نتیجه یک لیست یا تاپل از آبجکت‌ها بود (مثل history_deals_get) ---
+    # --- English: If the result is a list or tuple of objects (like history_deals_get) ---
+    if isinstance(result, (list, tuple)):
+        converted = []
+        append = converted.append
+        last_type = converter = None
+        for item in result:
+            item_type = type(item)
+            if item_type is not last_type:
+                last_type = item_type
+                converter = _converter_for(item, item_type) if hasattr(item, '_asdict') else None
+            append(converter(item) if converter is not None else item)
+        return converted
+
+    return result
+
+def serialize_json(payload):
+    """
+    Persian: کل بدنه پاسخ را در یک مرحله به بایت‌های JSON تبدیل می‌کند.
+    English: Encodes the whole response body to JSON bytes in a single pass.
+    """
+    if orjson is not None:
+        return orjson.dumps(payload, default=custom_json_encoder, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, default=custom_json_encoder, separators=(',', ':')).encode('utf-8')
+
+def json_response(payload, status_code=200, order=False):
+    """
+    Persian: پاسخ HTTP را از بایت‌های سریال‌شده می‌سازد؛ اگر داده قابل سریال‌سازی نبود خطای 500 برمی‌گرداند.
+    English: Builds the HTTP response from the serialized bytes; returns a 500 error if the data cannot be serialized.
+    /order responses (order=True) are measured in the /order metrics only, not in the RPC ones.
+    """
+    started = time.perf_counter() if metrics.ENABLED else None
+    try:
+        body = serialize_json(payload)
+    except TypeError as e:
+        logger.error(f"Could not serialize result of '{payload.get('function_name')}': {e}")
+        status_code = 500
+        body = serialize_json({
+            "status": "error",
+            "function_name": payload.get("function_name"),
+            "message": str(e)
+        })
+    # --- Persian: فقط پاسخ‌های RPC و /order اندازه‌گیری می‌شوند، هر کدام فقط در متریک‌های خودش ---
+    # --- English: Only RPC and /order responses are measured, each in its own metrics only ---
+    if started is not None and order:
+        ORDER_STAGE_SECONDS.observe(time.perf_counter() - started, ("serialize",))
+    elif started is not None and ("function_name" in payload or "results" in payload):
+        label = "batch" if "results" in payload else function_label(payload["function_name"])
+        RPC_STAGE_SECONDS.observe(time.perf_counter() - started, (label, "serialize"))
+        RPC_RESPONSE_BYTES.observe(len(body), (label,))
+    return Response(body, status=status_code, mimetype=JSON_MIMETYPE)
+
+
+class ResponseCache:
+    """
+    Persian: کش با مدت اعتبار (TTL) و محدودیت اندازه (LRU) جداگانه برای هر تابع mt5.
+    English: A cache with a separate TTL and LRU size bound for each mt5 function.
+    """
+
+    def __init__(self, policies, invalidated_by):
+        self.policies = policies
+        self.invalidated_by = invalidated_by
+        self._lock = threading.Lock()
+        self._entries = {name: OrderedDict() for name in policies}
+        self._stats = {name: {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0} for name in policies}
+
+    def is_cacheable(self, function_name):
+        return function_name in self.policies
+
+    @staticmethod
+    def make_key(args, kwargs):
+        # --- Persian: آرگومان‌ها نرمال می‌شوند تا ترتیب kwargs یا نوع لیست/تاپل کلید را تغییر ندهد ---
+        # --- English: Arguments are normalized so kwargs order or list/tuple type do not change the key ---
+        return json.dumps([list(args), kwargs], sort_keys=True, default=str)
+
+    def get(self, function_name, key):
+        """
+        Persian: (True, مقدار) در صورت موفقیت و (False, None) در غیر این صورت.
+        English: Returns (True, value) on a hit and (False, None) otherwise.
+        """
+        with self._lock:
+            entries = self._entries[function_name]
+            stats = self._stats[function_name]
+            entry = entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    entries.move_to_end(key)
+                    stats["hits"] += 1
+                    return True, value
+                del entries[key]
+            stats["misses"] += 1
+            return False, None
+
+    def put(self, function_name, key, value):
+        ttl, max_entries = self.policies[function_name]
+        with self._lock:
+            entries = self._entries[function_name]
+            entries[key] = (time.monotonic() + ttl, value)
+            entries.move_to_end(key)
+            while len(entries) > max_entries:
+                entries.popitem(last=False)
+                self._stats[function_name]["evictions"] += 1
+
+    def invalidate_after(self, function_name):
+        """
+        Persian: بعد از اجرای یک تابع تغییردهنده، ورودی‌های وابسته را پاک می‌کند.
+        English: Drops the dependent entries after a mutating function has run.
+        """
+        for name in self.invalidated_by.get(function_name, ()):
+            with self._lock:
+                if name in self._entries and self._entries[name]:
+                    self._entries[name].clear()
+                    self._stats[name]["invalidations"] += 1
+
+    def stats(self):
+        with self._lock:
+            report = {}
+            for name, stats in self._stats.items():
+                lookups = stats["hits"] + stats["misses"]
+                ttl, max_entries = self.policies[name]
+                report[name] = dict(
+                    stats, size=len(self._entries[name]), ttl=ttl, max_entries=max_entries,
+                    hit_ratio=round(stats["hits"] / lookups, 4) if lookups else None,
+                )
+            return report
+
+RESPONSE_CACHE = ResponseCache(CACHE_POLICIES if RESPONSE_CACHE_ENABLED else {}, CACHE_INVALIDATED_BY)
+
+class SnapshotStore:
+    """
+    Persian: آخرین account_info و positions_get که استریمر در حالت سرویس ترکیبی خوانده است.
+    خواندن‌های تازه‌تر از حد عمر هر درخواست بدون رفتن به صف mt5 پاسخ داده می‌شوند.
+    English: The latest account_info and positions_get the streamer read in combined service mode.
+    Reads fresher than each request's age limit are answered without going through the mt5 queue.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._account_info = None
+        self._positions = None
+        self._taken_at = None
+        self._stats = {"updates": 0, "hits": 0, "misses": 0, "invalidations": 0}
+
+    def update(self, account_info, positions):
+        # --- Persian: فقط خواندن‌های کامل نگه داشته می‌شوند؛ None یعنی خطای mt5 ---
+        # --- English: Only complete reads are kept; None means an mt5 failure ---
+        with self._lock:
+            if account_info is None or positions is None:
+                self._taken_at = None
+                return
+            self._account_info, self._positions = account_info, positions
+            self._taken_at = time.monotonic()
+            self._stats["updates"] += 1
+
+    def invalidate(self):
+        with self._lock:
+            if self._taken_at is not None:
+                self._taken_at = None
+                self._stats["invalidations"] += 1
+
+    def get(self, function_name, args, kwargs, max_age):
+        """
+        Persian: (True, نتیجه، عمر) اگر وضعیت تازه‌تر از max_age باشد و (False, None, None) در غیر این صورت.
+        English: Returns (True, result, age) if the read is fresher than max_age and (False, None, None) otherwise.
+        """
+        # --- Persian: positions_get با فیلتر (symbol، group یا ticket) همیشه زنده اجرا می‌شود ---
+        # --- English: positions_get with a filter (symbol, group or ticket) always runs live ---
+        if function_name not in SNAPSHOT_FUNCTIONS or args or kwargs or not max_age or max_age <= 0:
+            return False, None, None
+        with self._lock:
+            age = None if self._taken_at is None else time.monotonic() - self._taken_at
+            if age is None or age > max_age:
+                self._stats["misses"] += 1
+                return False, None, None
+            self._stats["hits"] += 1
+            if function_name == 'account_info':
+                return True, self._account_info, age
+            if function_name == 'positions_total':
+                return True, len(self._positions), age
+            return True, self._positions, age
+
+    def stats(self):
+        with self._lock:
+            age = None if self._taken_at is None else round(time.monotonic() - self._taken_at, 3)
+            return dict(self._stats, age=age, default_max_age=SNAPSHOT_MAX_AGE)
+
+SNAPSHOT_STORE = SnapshotStore()
+
+def call_priority(function_name):
+    """
+    Persian: اولویت یک تابع mt5 در صف اجرا؛ معاملات جلوتر از خواندن‌های حجیم تاریخچه اجرا می‌شوند.
+    English: Queue priority of an mt5 function; trades run ahead of bulk history reads.
+    """
+    if function_name in TRADE_FUNCTIONS:
+        return PRIORITY_TRADE
+    if function_name.startswith(BULK_FUNCTION_PREFIXES):
+        return PRIORITY_BULK
+    return PRIORITY_DEFAULT
+
+def timed_mt5_call(function_name, mt5_function):
+    """
+    Persian: تابع mt5 را طوری می‌پوشاند که زمان انتظار در صف و زمان خود فراخوانی ترمینال جدا اندازه‌گیری شوند.
+    English: Wraps an mt5 function so the time waiting in the queue and the terminal call itself are measured separately.
+    """
+    label = function_label(function_name)
+    submitted_at = time.perf_counter()
+
+    def timed(*args, **kwargs):
+        started = time.perf_counter()
+        RPC_STAGE_SECONDS.observe(started - submitted_at, (label, "queue"))
+        try:
+            return mt5_function(*args, **kwargs)
+        finally:
+            RPC_STAGE_SECONDS.observe(time.perf_counter() - started, (label, "mt5"))
+    return timed
+
+class MT5Executor:
+    """
+    Persian: یک ترد اختصاصی که مالک نشست mt5 است و همه فراخوانی‌ها را با صف اولویت‌دار اجرا می‌کند.
+    فراخوانی‌های خواندنی یکسان که همزمان در صف هستند در یک فراخوانی ترمینال ادغام می‌شوند (single-flight).
+    English: A dedicated thread that owns the mt5 session and runs every call from a priority queue.
+    Identical read calls that are in flight at the same time are merged into one terminal call (single-flight).
+    """
+
+    def __init__(self):
+        self._queue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._thread = None
+        self._stats = {"executed": 0, "coalesced": 0, "failed": 0}
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="mt5-executor", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        # --- Persian: درخواست توقف پس از اجرای همه کارهای در صف ---
+        # --- English: The stop request runs after everything already queued ---
+        if self._thread is not None:
+            self._queue.put((float('inf'), next(self._sequence), None, None, None, None, None))
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, func, *args, priority=PRIORITY_DEFAULT, coalesce_key=None, **kwargs):
+        """
+        Persian: یک تابع را برای اجرا در ترد mt5 در صف می‌گذارد و یک Future برمی‌گرداند.
+        English: Queues a function to run on the mt5 thread and returns a Future.
+        """
+        if self._thread is None:
+            self.start()
+        with self._lock:
+            if coalesce_key is not None:
+                future = self._inflight.get(coalesce_key)
+                if future is not None:
+                    self._stats["coalesced"] += 1
+                    return future
+            future = Future()
+            if coalesce_key is not None:
+                self._inflight[coalesce_key] = future
+        self._queue.put((priority, next(self._sequence), future, func, args, kwargs, coalesce_key))
+        return future
+
+    def call(self, function_name, mt5_function, args, kwargs):
+        """
+        Persian: یک تابع mt5 را با اولویت و کلید ادغام مناسب خودش اجرا می‌کند.
+        English: Runs an mt5 function with its own priority and coalescing key.
+        """
+        coalesce_key = None
+        if function_name not in MUTATING_FUNCTIONS:
+            coalesce_key = (function_name, ResponseCache.make_key(args, kwargs))
+        if not metrics.ENABLED:
+            return self.submit(mt5_function, *args, priority=call_priority(function_name),
+                               coalesce_key=coalesce_key, **kwargs)
+        future = self.submit(timed_mt5_call(function_name, mt5_function), *args,
+                             priority=call_priority(function_name), coalesce_key=coalesce_key, **kwargs)
+        RPC_INFLIGHT.inc()
+        future.add_done_callback(lambda _: RPC_INFLIGHT.dec())
+        return future
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, queue_depth=self._queue.qsize(), inflight=len(self._inflight))
+
+    def _run(self):
+        while True:
+            _, _, future, func, args, kwargs, coalesce_key = self._queue.get()
+            if future is None:
+                return
+            if not future.set_running_or_notify_cancel():
+                self._forget(coalesce_key)
+                continue
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                # --- Persian: خطای mt5 همین‌جا در همان ترد خوانده می‌شود تا فراخوانی دیگری آن را تغییر ندهد ---
+                # --- English: The mt5 error is read here, on the same thread, before another call can change it ---
+                try:
+                    e.mt5_last_error = mt5.last_error()
+                except Exception:
+                    pass
+                # --- Persian: از این لحظه، فراخوانی‌های جدید یکسان یک اجرای تازه می‌سازند ---
+                # --- English: From here on, new identical calls start a fresh execution ---
+                self._forget(coalesce_key)
+                self._stats["failed"] += 1
+                future.set_exception(e)
+            else:
+                if result is None:
+                    # --- Persian: None یعنی شکست mt5؛ خطای آن هم در همین نوبت خوانده می‌شود ---
+                    # --- English: None means an mt5 failure; its error is read in this same turn as well ---
+                    try:
+                        future.mt5_last_error = mt5.last_error()
+                    except Exception:
+                        pass
+                self._forget(coalesce_key)
+                self._stats["executed"] += 1
+                future.set_result(result)
+
+    def _forget(self, coalesce_key):
+        if coalesce_key is not None:
+            with self._lock:
+                self._inflight.pop(coalesce_key, None)
+
+MT5_EXECUTOR = MT5Executor()
+
+def timeframe_seconds(timeframe):
+    """
+    Persian: طول یک کندل به ثانیه بر اساس ثابت TIMEFRAME_* در mt5؛ برای تایم‌فریم ماهانه None برمی‌گرداند.
+    English: Length of one bar in seconds from an mt5 TIMEFRAME_* constant; returns None for the monthly timeframe.
+    """
+    if timeframe < 0x4000:
+        return timeframe * 60
+    if timeframe & 0xC000 == 0x4000:
+        return (timeframe & 0x3FFF) * 3600
+    if timeframe == 0x8001:
+        return 7 * 86400
+    return None
+
+def _merge_intervals(intervals):
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+def _is_covered(coverage, timestamp):
+    return any(covered_start <= timestamp <= covered_end for covered_start, covered_end in coverage)
+
+def _missing_intervals(coverage, start, end):
+    # --- Persian: بخش‌هایی از [start, end] که در پوشش ذخیره‌شده نیستند ---
+    # --- English: Parts of [start, end] that the stored coverage does not include ---
+    missing = []
+    cursor = start
+    for covered_start, covered_end in coverage:
+        if covered_end < cursor:
+            continue
+        if covered_start > end:
+            break
+        if covered_start > cursor:
+            missing.append((cursor, covered_start - 1))
+        cursor = max(cursor, covered_end + 1)
+    if cursor <= end:
+        missing.append((cursor, end))
+    return missing
+
+class BarStore:
+    """
+    Persian: انبار محلی کندل‌ها (OHLC) برای هر نماد و تایم‌فریم، در قالب سگمنت‌های .npy که به صورت memory-map خوانده می‌شوند.
+    بعد از بارگذاری اول، فقط بازه‌های ناموجود (معمولاً انتهای بازه) از ترمینال گرفته می‌شود.
+    متدهای این کلاس فقط در ترد mt5 اجرا می‌شوند، پس به قفل نیازی ندارند.
+    English: Local OHLC bar store per symbol and timeframe, kept as memory-mapped .npy segments.
+    After the first load only the missing ranges (usually the tail) are fetched from the terminal.
+    Its methods only run on the mt5 thread, so they need no locking.
+    """
+
+    def __init__(self, directory, settle_seconds, max_segments):
+        self.directory = directory
+        self.settle_seconds = settle_seconds
+        self.max_segments = max_segments
+        self._series = {}
+        self._stats = {"requests": 0, "full_hits": 0, "partial_hits": 0, "misses": 0,
+                       "bars_served": 0, "bars_from_store": 0, "bars_fetched": 0}
+
+    def _series_dir(self, symbol, timeframe):
+        safe_symbol = "".join(c if c.isalnum() or c in "._-" else "_" for c in symbol)
+        return os.path.join(self.directory, f"{safe_symbol}_{timeframe}")
+
+    def _load(self, symbol, timeframe):
+        key = (symbol, timeframe)
+        series = self._series.get(key)
+        if series is None:
+            series = {"dir": self._series_dir(symbol, timeframe), "coverage": [], "segments": [], "dtype": None}
+            index_path = os.path.join(series["dir"], "index.json")
+            if os.path.exists(index_path):
+                try:
+                    with open(index_path) as f:
+                        index = json.load(f)
+                    series["coverage"] = index["coverage"]
+                    series["dtype"] = np.lib.format.descr_to_dtype(
+                        [tuple(field) for field in index["dtype"]] if isinstance(index["dtype"], list) else index["dtype"]
+                    ) if index.get("dtype") else None
+                    series["segments"] = [
+                        dict(segment, data=np.load(os.path.join(series["dir"], segment["file"]), mmap_mode='r'))
+                        for segment in index["segments"]
+                    ]
+                except Exception as e:
+                    logger.warning(f"Discarding unreadable bar store for {symbol}/{timeframe}: {e}")
+                    series.update(coverage=[], segments=[], dtype=None)
+            self._series[key] = series
+        return series
+
+    def _save_index(self, series):
+        index = {
+            "coverage": series["coverage"],
+            "dtype": np.lib.format.dtype_to_descr(series["dtype"]) if series["dtype"] is not None else None,
+            "segments": [{k: v for k, v in segment.items() if k != "data"} for segment in series["segments"]],
+        }
+        temp_path = os.path.join(series["dir"], "index.json.tmp")
+        with open(temp_path, "w") as f:
+            json.dump(index, f)
+        os.replace(temp_path, os.path.join(series["dir"], "index.json"))
+
+    def _write_segment(self, series, bars):
+        os.makedirs(series["dir"], exist_ok=True)
+        file_name = f"{int(bars['time'][0])}_{int(bars['time'][-1])}_{time.time_ns()}.npy"
+        temp_path = os.path.join(series["dir"], file_name + ".tmp")
+        with open(temp_path, "wb") as f:
+            np.save(f, bars)
+        os.replace(temp_path, os.path.join(series["dir"], file_name))
+        series["segments"].append({
+            "file": file_name, "start": int(bars['time'][0]), "end": int(bars['time'][-1]),
+            "data": np.load(os.path.join(series["dir"], file_name), mmap_mode='r'),
+        })
+
+    def _compact(self, series):
+        # --- Persian: وقتی تعداد سگمنت‌ها زیاد شد، همه در یک فایل مرتب و بدون تکرار ادغام می‌شوند ---
+        # --- English: Once there are too many segments, they are merged into one sorted, de-duplicated file ---
+        bars = self._dedupe(np.concatenate([segment["data"] for segment in series["segments"]]))
+        old_files = [segment["file"] for segment in series["segments"]]
+        series["segments"] = []
+        self._write_segment(series, bars)
+        self._save_index(series)
+        for file_name in old_files:
+            try:
+                os.remove(os.path.join(series["dir"], file_name))
+            except OSError:
+                pass
+
+    @staticmethod
+    def _dedupe(bars):
+        # --- Persian: مرتب‌سازی بر اساس زمان؛ در صورت تکرار، آخرین نسخه (تازه‌ترین داده) نگه داشته می‌شود ---
+        # --- English: Sort by time; on duplicates the last copy (the freshest data) is kept ---
+        order = np.argsort(bars['time'], kind='stable')
+        bars = bars[order]
+        keep = np.ones(len(bars), dtype=bool)
+        keep[:-1] = bars['time'][1:] != bars['time'][:-1]
+        return bars[keep]
+
+    def _stored_bars(self, series, start, end):
+        parts = []
+        for segment in series["segments"]:
+            if segment["end"] < start or segment["start"] > end:
+                continue
+            data = segment["data"]
+            low, high = np.searchsorted(data['time'], [start, end + 1])
+            if high > low:
+                parts.append(np.asarray(data[low:high]))
+        return parts
+
+    def copy_rates_range(self, symbol, timeframe, date_from, date_to):
+        """
+        Persian: جایگزین mt5.copy_rates_range که بخش ذخیره‌شده را از دیسک و فقط بقیه را از ترمینال می‌خواند.
+        English: Drop-in for mt5.copy_rates_range that serves the stored part from disk and fetches only the rest.
+        """
+        period = timeframe_seconds(timeframe)
+        if period is None:
+            return mt5.copy_rates_range(symbol, timeframe, date_from, date_to)
+        start, end = _to_timestamp(date_from), _to_timestamp(date_to)
+        series = self._load(symbol, timeframe)
+        self._stats["requests"] += 1
+
+        served = self._stored_bars(series, start, end)
+        from_store = sum(len(part) for part in served)
+        missing = _missing_intervals(series["coverage"], start, end)
+        fetched_total = 0
+        changed = False
+        for missing_start, missing_end in missing:
+            fetched = mt5.copy_rates_range(symbol, timeframe, missing_start, missing_end)
+            if fetched is None:
+                return None
+            if series["dtype"] is not None and fetched.dtype != series["dtype"]:
+                logger.warning(f"Bar layout changed for {symbol}/{timeframe}; resetting its bar store.")
+                series.update(coverage=[], segments=[], dtype=None)
+                return self.copy_rates_range(symbol, timeframe, date_from, date_to)
+            series["dtype"] = fetched.dtype
+            fetched_total += len(fetched)
+            served.append(fetched)
+
+            # --- Persian: بازه خالی ممکن است فقط یعنی تاریخچه هنوز همگام نشده (یا از max bars ترمینال گذشته)، پس پوشش داده نمی‌شود
+            #     و دفعه بعد دوباره گرفته می‌شود. پوشش فقط از اولین تا آخرین کندل دریافتی است، مگر اینکه طرف دیگر
+            #     لبه از قبل پوشش داشته باشد (کندل در هر دو طرف، مثلاً تعطیلی آخر هفته) ---
+            # --- English: An empty range may only mean the history is still syncing (or lies past the terminal's max bars),
+            #     so it is not marked covered and is fetched again next time. Coverage only spans the first to the last
+            #     returned bar, unless the other side of an edge is already covered (bars on both sides, e.g. a weekend) ---
+            if len(fetched) == 0:
+                continue
+            covered_start = missing_start if _is_covered(series["coverage"], missing_start - 1) else int(fetched['time'][0])
+            # --- Persian: بازه‌های قدیمی کاملاً بسته شده‌اند. در بازه‌های نزدیک به حال، آخرین کندل ممکن است هنوز
+            #     در حال شکل‌گیری باشد، پس ذخیره نمی‌شود و دفعه بعد دوباره گرفته می‌شود ---
+            # --- English: Old ranges are fully settled. In recent ranges the last bar may still be forming,
+            #     so it is not stored and is fetched again next time ---
+            if missing_end + period <= time.time() - self.settle_seconds:
+                settled = fetched
+                covered_end = missing_end if _is_covered(series["coverage"], missing_end + 1) else int(fetched['time'][-1])
+            else:
+                settled, covered_end = fetched[:-1], int(fetched['time'][-1]) - 1
+            if covered_end < covered_start:
+                continue
+            if len(settled) > 0:
+                self._write_segment(series, settled)
+            series["coverage"] = _merge_intervals(series["coverage"] + [[covered_start, covered_end]])
+            changed = True
+
+        if changed:
+            os.makedirs(series["dir"], exist_ok=True)
+            self._save_index(series)
+            if len(series["segments"]) > self.max_segments:
+                self._compact(series)
+
+        if not missing:
+            self._stats["full_hits"] += 1
+        elif from_store:
+            self._stats["partial_hits"] += 1
+        else:
+            self._stats["misses"] += 1
+
+        if not served:
+            return np.empty(0, dtype=series["dtype"])
+        bars = self._dedupe(np.concatenate(served)) if len(served) > 1 else served[0]
+        self._stats["bars_served"] += len(bars)
+        self._stats["bars_from_store"] += from_store
+        self._stats["bars_fetched"] += fetched_total
+        return bars
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats["hit_ratio"] = round(stats["bars_from_store"] / stats["bars_served"], 4) if stats["bars_served"] else None
+        stats["series"] = len(self._series)
+        return stats
+
+BAR_STORE = BarStore(BAR_STORE_DIR, BAR_STORE_SETTLE_SECONDS, BAR_STORE_MAX_SEGMENTS) if BAR_STORE_ENABLED else None
+
+
+def cache_bypass_requested():
+    """
+    Persian: بررسی می‌کند که آیا کلاینت برای این درخواست کش را غیرفعال کرده است.
+    English: Checks whether the client opted out of the cache for this request.
+    """
+    if request.headers.get(CACHE_BYPASS_HEADER, "").lower() in ("1", "true", "yes"):
+        return True
+    return "no-cache" in request.headers.get("Cache-Control", "").lower()
+
+def parse_max_age(value):
+    """
+    Persian: حد عمر snapshot به ثانیه؛ مقدار نامعتبر یا خالی یعنی مقدار پیش‌فرض (None).
+    English: A snapshot age limit in seconds; an empty or invalid value means the default (None).
+    """
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def snapshot_max_age_requested():
+    return parse_max_age(request.headers.get(SNAPSHOT_MAX_AGE_HEADER))
+
 
 # --- Persian: دکوراتور برای چک کردن API Key در هدر درخواست ---
 # --- English: Decorator to check for the API Key in the request header ---
@@ -79,15 +886,221 @@ def require_api_key(f):
             return jsonify({"status": "error", "message": "Unauthorized: API Key is missing or invalid"}), 401
     return decorated_function
 
+def _health_status():
+    if not mt5.terminal_info():
+        return None
+    return mt5.account_info()
+
 @app.route('/health')
 def health_check():
     # --- Persian: وضعیت اتصال به ترمینال را برمی‌گرداند ---
     # --- English: Returns the connection status to the terminal ---
-    if mt5.terminal_info():
-        return jsonify({"status": "ok", "account": mt5.account_info().login}), 200
+    # --- Persian: با اولویت سفارش و در یک نوبت صف، تا زیر بار خواندن‌های حجیم از timeout ده ثانیه‌ای HEALTHCHECK داکر نگذرد ---
+    # --- English: At trade priority and in one queue slot, so under bulk reads it stays within the Docker HEALTHCHECK's 10s timeout ---
+    account_info = MT5_EXECUTOR.submit(_health_status, priority=PRIORITY_TRADE, coalesce_key=('health',)).result()
+    if account_info:
+        return jsonify({"status": "ok", "account": account_info.login}), 200
     else:
         return jsonify({"status": "error", "message": "MT5 connection is not active"}), 503
 
+def negotiate_response_format():
+    """
+    Persian: بهترین فرمت پاسخ را بر اساس هدر Accept انتخاب می‌کند.
+    English: Picks the best response format from the Accept header.
+    """
+    offered = [JSON_MIMETYPE, NUMPY_MIMETYPE]
+    if pa is not None:
+        offered.append(ARROW_MIMETYPE)
+    # --- Persian: چون JSON اول لیست است، هدرهای */* یا خالی همیشه JSON می‌گیرند ---
+    # --- English: JSON is listed first, so */* or a missing Accept header always gets JSON ---
+    return request.accept_mimetypes.best_match(offered, default=JSON_MIMETYPE)
+
+def array_response(array, response_format, function_name):
+    """
+    Persian: یک آرایه نامپای را بدون تبدیل به آبجکت‌های پایتون، به صورت NPY یا Arrow IPC ارسال می‌کند.
+    English: Sends a NumPy array as NPY or Arrow IPC without turning its rows into Python objects.
+    """
+    if response_format == ARROW_MIMETYPE:
+        # --- Persian: هر فیلد آرایه ساخت‌یافته یک ستون Arrow می‌شود ---
+        # --- English: Each field of the structured array becomes one Arrow column ---
+        names = array.dtype.names or ("values",)
+        columns = [pa.array(array[name]) for name in names] if array.dtype.names else [pa.array(array)]
+        table = pa.Table.from_arrays(columns, names=list(names))
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        body = sink.getvalue()
+        chunks = [memoryview(body)]
+        content_length = body.size
+    else:
+        # --- Persian: فرمت استاندارد .npy: یک هدر کوچک dtype و shape و سپس بافر خام آرایه ---
+        # --- English: Standard .npy layout: a small dtype/shape header followed by the raw array buffer ---
+        array = np.ascontiguousarray(array)
+        header = io.BytesIO()
+        np.lib.format.write_array_header_2_0(header, np.lib.format.header_data_from_array_1_0(array))
+        chunks = [header.getvalue(), memoryview(array).cast('B')]
+        content_length = len(chunks[0]) + array.nbytes
+
+    logger.info(f"Sending '{function_name}' result as {response_format} ({content_length} bytes).")
+    if metrics.ENABLED:
+        RPC_RESPONSE_BYTES.observe(content_length, (function_label(function_name),))
+    response = Response(chunks, mimetype=response_format)
+    response.headers['Content-Length'] = str(content_length)
+    response.headers['X-Function-Name'] = function_name
+    return response
+
+class PendingRpcCall:
+    """
+    Persian: یک فراخوانی RPC که یا پاسخش آماده است یا منتظر اجرای آن در ترد mt5 است.
+    English: An RPC call whose response is either ready or waiting to run on the mt5 thread.
+    """
+
+    def __init__(self, function_name, response=None, future=None, cache_key=None):
+        self.function_name = function_name
+        self.response = response
+        self.future = future
+        self.cache_key = cache_key
+        self.last_error = None
+
+    def finish(self):
+        """
+        Persian: منتظر نتیجه می‌ماند و بدنه پاسخ و کد وضعیت HTTP را برمی‌گرداند.
+        English: Waits for the result and returns the response body and its HTTP status code.
+        """
+        if self.response is not None:
+            return self.response
+        function_name = self.function_name
+        try:
+            result = self.future.result()
+            self.last_error = getattr(self.future, 'mt5_last_error', None)
+
+            # --- Persian: نتیجه فقط یک بار تبدیل می‌شود و سریال‌سازی در زمان ساخت پاسخ انجام می‌شود ---
+            # --- English: The result is converted once; serialization happens when the response is built ---
+            started = time.perf_counter() if metrics.ENABLED else None
+            data = convert_result(result)
+            if started is not None:
+                RPC_STAGE_SECONDS.observe(time.perf_counter() - started, (function_label(function_name), "convert"))
+                RPC_CALLS.inc((function_label(function_name), "success"))
+
+            # --- Persian: نتایج None (خطای mt5) کش نمی‌شوند ---
+            # --- English: None results (an mt5 failure) are never cached ---
+            if self.cache_key is not None and result is not None:
+                RESPONSE_CACHE.put(function_name, self.cache_key, data)
+            RESPONSE_CACHE.invalidate_after(function_name)
+            # --- Persian: بعد از یک معامله، پوزیشن‌ها و حساب تا خواندن بعدی استریمر زنده خوانده می‌شوند ---
+            # --- English: After a trade, positions and the account are read live until the streamer's next read ---
+            if function_name == 'order_send':
+                SNAPSHOT_STORE.invalidate()
+
+            logger.info(f"Successfully executed '{function_name}'.")
+            self.response = {
+                "status": "success",
+                "function_name": function_name,
+                "data": data
+            }, 200
+        except Exception as e:
+            last_error = getattr(e, 'mt5_last_error', None)
+            logger.error(f"An error occurred while executing '{function_name}': {e}. MT5 Last Error: {last_error}")
+            if metrics.ENABLED:
+                RPC_CALLS.inc((function_label(function_name), "error"))
+            self.response = {
+                "status": "error",
+                "function_name": function_name,
+                "message": str(e),
+                "mt5_last_error": str(last_error)
+            }, 500 # 500 Internal Server Error
+        return self.response
+
+def start_rpc_call(function_name, args=None, kwargs=None, use_cache=True, max_age=None):
+    """
+    Persian: فراخوانی را بررسی کرده و در صف ترد mt5 قرار می‌دهد، بدون اینکه منتظر نتیجه بماند.
+    English: Validates the call and queues it on the mt5 thread without waiting for the result.
+    With use_cache=False the cache is not read, but a fresh result still refreshes it.
+    max_age (seconds, SNAPSHOT_MAX_AGE by default) limits how old a streamer snapshot may be to answer the call.
+    """
+    args = args or []
+    kwargs = kwargs or {}
+
+    # --- Persian: نام تابع باید رشته باشد؛ قبل از هر جستجو در کش‌ها که به کلید hashable نیاز دارند ---
+    # --- English: The function name must be a string; checked before any cache lookup, which needs a hashable key ---
+    if not isinstance(function_name, str):
+        logger.warning(f"Rejected RPC call with a non-string function name: {function_name!r}")
+        return PendingRpcCall(function_name, response=({
+            "status": "error",
+            "function_name": function_name,
+            "message": "'function_name' must be a string."
+        }, 400)) # 400 Bad Request
+
+    # --- Persian: چک کردن اینکه آیا تابع فراخوانی شده مجاز است یا خیر ---
+    # --- English: Check if the called function is allowed ---
+    if function_name in DISALLOWED_FUNCTIONS:
+        logger.warning(f"Attempt to call disallowed function: {function_name}")
+        return PendingRpcCall(function_name, response=({
+            "status": "error",
+            "function_name": function_name,
+            "message": "Connection management functions are not allowed via RPC."
+        }, 403)) # 403 Forbidden
+
+    # --- Persian: در حالت سرویس ترکیبی، خواندن‌های حساب از آخرین وضعیت استریمر پاسخ داده می‌شوند ---
+    # --- English: In combined service mode, account reads are answered from the streamer's latest read ---
+    if use_cache:
+        hit, result, age = SNAPSHOT_STORE.get(function_name, args, kwargs,
+                                              SNAPSHOT_MAX_AGE if max_age is None else max_age)
+        if hit:
+            logger.info(f"Served '{function_name}' from the streamer snapshot ({age:.3f}s old).")
+            if metrics.ENABLED:
+                RPC_CALLS.inc((function_name, "snapshot"))
+            return PendingRpcCall(function_name, response=({
+                "status": "success",
+                "function_name": function_name,
+                "data": convert_result(result),
+                "snapshot_age": round(age, 3)
+            }, 200))
+
+    # --- Persian: پاسخ توابع فقط‌خواندنی در صورت وجود از کش برگردانده می‌شود ---
+    # --- English: Read-mostly functions are answered from the cache when possible ---
+    cache_key = None
+    if RESPONSE_CACHE.is_cacheable(function_name):
+        cache_key = ResponseCache.make_key(args, kwargs)
+        if use_cache:
+            hit, cached_data = RESPONSE_CACHE.get(function_name, cache_key)
+            if hit:
+                logger.info(f"Served '{function_name}' from cache.")
+                if metrics.ENABLED:
+                    RPC_CALLS.inc((function_name, "cache"))
+                return PendingRpcCall(function_name, response=({
+                    "status": "success",
+                    "function_name": function_name,
+                    "data": cached_data
+                }, 200))
+
+    # --- Persian: پیدا کردن تابع از کتابخانه mt5 و اجرای آن در ترد اختصاصی mt5 ---
+    # --- English: Find the function in the mt5 library and run it on the dedicated mt5 thread ---
+    try:
+        mt5_function = getattr(mt5, function_name)
+        # --- Persian: copy_rates_range از انبار محلی کندل‌ها سرویس داده می‌شود ---
+        # --- English: copy_rates_range is served through the local bar store ---
+        if function_name == 'copy_rates_range' and BAR_STORE is not None:
+            mt5_function = BAR_STORE.copy_rates_range
+    except (AttributeError, TypeError):
+        logger.error(f"Function '{function_name}' not found in MetaTrader5 library.")
+        return PendingRpcCall(function_name, response=({
+            "status": "error",
+            "function_name": function_name,
+            "message": f"Function '{function_name}' not found in MetaTrader5 library."
+        }, 404)) # 404 Not Found
+
+    future = MT5_EXECUTOR.call(function_name, mt5_function, args, kwargs)
+    return PendingRpcCall(function_name, future=future, cache_key=cache_key)
+
+def execute_rpc_call(function_name, args=None, kwargs=None, use_cache=True, max_age=None):
+    """
+    Persian: یک فراخوانی RPC را اجرا کرده و بدنه پاسخ و کد وضعیت HTTP را برمی‌گرداند.
+    English: Executes a single RPC call and returns the response body and its HTTP status code.
+    NumPy array results are left untouched so they can be sent in a binary format.
+    """
+    return start_rpc_call(function_name, args, kwargs, use_cache=use_cache, max_age=max_age).finish()
+
 @app.route('/rpc', methods=['POST'])
 @require_api_key
 def rpc_handler():
@@ -100,68 +1113,828 @@ def rpc_handler():
         kwargs = req_data.get('kwargs', {})
     except Exception as e:
         logger.error(f"Invalid JSON request: {e}")
-        return jsonify({"status": "error", "message": f"Invalid JSON request: {e}"}), 400
+        return json_response({"status": "error", "message": f"Invalid JSON request: {e}"}, 400)
 
     logger.info(f"Received RPC call for function: '{function_name}'")
 
-    # --- Persian: چک کردن اینکه آیا تابع فراخوانی شده مجاز است یا خیر ---
-    # --- English: Check if the called function is allowed ---
-    if function_name in DISALLOWED_FUNCTIONS:
-        logger.warning(f"Attempt to call disallowed function: {function_name}")
-        return jsonify({
+    # --- Persian: انتخاب فرمت پاسخ بر اساس هدر Accept؛ JSON فرمت پیش‌فرض است ---
+    # --- English: Pick the response format from the Accept header; JSON is the fallback ---
+    response_format = negotiate_response_format()
+    response_body, status_code = execute_rpc_call(function_name, args, kwargs, use_cache=not cache_bypass_requested(),
+                                                  max_age=snapshot_max_age_requested())
+    if response_format != JSON_MIMETYPE and isinstance(response_body.get("data"), np.ndarray):
+        return array_response(response_body["data"], response_format, function_name)
+    return json_response(response_body, status_code)
+
+@app.route('/rpc/batch', methods=['POST'])
+@require_api_key
+def rpc_batch_handler():
+    # --- Persian: بدنه درخواست می‌تواند یک لیست از فراخوانی‌ها یا یک آبجکت با کلید calls باشد ---
+    # --- English: The request body can be a list of calls or an object with a 'calls' key ---
+    try:
+        req_data = request.get_json()
+        calls = req_data.get('calls') if isinstance(req_data, dict) else req_data
+        if not isinstance(calls, list):
+            raise ValueError("expected a list of calls")
+    except Exception as e:
+        logger.error(f"Invalid JSON batch request: {e}")
+        return json_response({"status": "error", "message": f"Invalid JSON batch request: {e}"}, 400)
+
+    if len(calls) > MAX_BATCH_CALLS:
+        logger.warning(f"Rejected batch of {len(calls)} calls (limit is {MAX_BATCH_CALLS}).")
+        return json_response({
             "status": "error",
-            "function_name": function_name,
-            "message": "Connection management functions are not allowed via RPC."
-        }), 403 # 403 Forbidden
+            "message": f"Batch contains {len(calls)} calls, the limit is {MAX_BATCH_CALLS}."
+        }, 413) # 413 Payload Too Large
+
+    logger.info(f"Received RPC batch with {len(calls)} calls.")
+
+    # --- Persian: هر فراخوانی جداگانه اجرا می‌شود تا خطای یکی باعث شکست بقیه نشود ---
+    # --- English: Each call runs on its own so that one failing call does not fail the rest ---
+    use_cache = not cache_bypass_requested()
+    max_age = snapshot_max_age_requested()
+    results = []
+    for call in calls:
+        if not isinstance(call, dict) or not isinstance(call.get('args', []), list) \
+                or not isinstance(call.get('kwargs', {}), dict):
+            response_body, status_code = {
+                "status": "error",
+                "function_name": call.get('function_name') if isinstance(call, dict) else None,
+                "message": "Each call must be an object with 'function_name', optional 'args' list and 'kwargs' object."
+            }, 400
+        else:
+            # --- Persian: هر فراخوانی می‌تواند حد عمر snapshot خودش را با max_age تعیین کند ---
+            # --- English: Each call can set its own snapshot age limit with max_age ---
+            call_max_age = parse_max_age(call.get('max_age'))
+            response_body, status_code = execute_rpc_call(
+                call.get('function_name'), call.get('args', []), call.get('kwargs', {}), use_cache=use_cache,
+                max_age=max_age if call_max_age is None else call_max_age
+            )
+        response_body["code"] = status_code
+        results.append(response_body)
+
+    return json_response({"status": "success", "results": results})
+
+# --- Persian: انواع سفارش که در /order با نام پذیرفته می‌شوند، و کدهای بازگشتی موفق order_send ---
+# --- English: Order types accepted by name on /order, and the successful order_send return codes ---
+ORDER_TYPES = {
+    'buy': mt5.ORDER_TYPE_BUY, 'sell': mt5.ORDER_TYPE_SELL,
+    'buy_limit': mt5.ORDER_TYPE_BUY_LIMIT, 'sell_limit': mt5.ORDER_TYPE_SELL_LIMIT,
+    'buy_stop': mt5.ORDER_TYPE_BUY_STOP, 'sell_stop': mt5.ORDER_TYPE_SELL_STOP,
+}
+MARKET_ORDER_TYPES = (mt5.ORDER_TYPE_BUY, mt5.ORDER_TYPE_SELL)
+ORDER_SUCCESS_RETCODES = (mt5.TRADE_RETCODE_DONE, mt5.TRADE_RETCODE_DONE_PARTIAL, mt5.TRADE_RETCODE_PLACED)
+# --- Persian: فیلدهایی از بدنه که بدون تغییر به درخواست سفارش اضافه می‌شوند، و فیلدهای قیمتی که به digits نماد گرد می‌شوند ---
+# --- English: Body fields copied into the trade request as they are, and the price fields rounded to the symbol's digits ---
+ORDER_PASSTHROUGH_FIELDS = ('price', 'sl', 'tp', 'stoplimit', 'deviation', 'magic', 'comment', 'position',
+                            'position_by', 'type_filling', 'type_time', 'expiration')
+ORDER_PRICE_FIELDS = ('price', 'sl', 'tp', 'stoplimit')
+
+class OrderTemplates:
+    """
+    Persian: قالب درخواست سفارش هر نماد که از symbol_info ساخته و کش می‌شود تا حجم و قیمت بدون رفتن به ترمینال نرمال شوند.
+    English: A per-symbol trade request template built from a cached symbol_info, so volumes and prices are normalized without a terminal call.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._templates = {}
+        self._stats = {"hits": 0, "misses": 0}
+
+    @staticmethod
+    def build(info):
+        # --- Persian: بیت‌های filling_mode نماد: 1 = FOK و 2 = IOC؛ در غیر این صورت RETURN ---
+        # --- English: Bits of the symbol's filling_mode: 1 = FOK and 2 = IOC; RETURN otherwise ---
+        if info.filling_mode & 1:
+            filling = mt5.ORDER_FILLING_FOK
+        elif info.filling_mode & 2:
+            filling = mt5.ORDER_FILLING_IOC
+        else:
+            filling = mt5.ORDER_FILLING_RETURN
+        step = info.volume_step
+        return {
+            "request": {
+                "action": mt5.TRADE_ACTION_DEAL, "symbol": info.name, "deviation": ORDER_DEVIATION,
+                "type_time": mt5.ORDER_TIME_GTC, "type_filling": filling,
+            },
+            "digits": info.digits,
+            "volume_min": info.volume_min,
+            "volume_max": info.volume_max,
+            "volume_step": step,
+            "volume_decimals": len(f"{step:.8f}".rstrip('0').split('.')[1]),
+        }
+
+    def get(self, symbol):
+        """
+        Persian: قالب نماد یا None اگر نماد وجود نداشته باشد.
+        English: Returns the symbol's template, or None if the symbol does not exist.
+        """
+        with self._lock:
+            entry = self._templates.get(symbol)
+            if entry is not None and entry[0] > time.monotonic():
+                self._stats["hits"] += 1
+                return entry[1]
+            self._stats["misses"] += 1
+        info = MT5_EXECUTOR.submit(mt5.symbol_info, symbol, priority=PRIORITY_TRADE,
+                                   coalesce_key=('symbol_info', 'order_template', symbol)).result()
+        if info is None:
+            return None
+        template = self.build(info)
+        with self._lock:
+            self._templates[symbol] = (time.monotonic() + self.ttl, template)
+        return template
+
+    def warm(self, symbols):
+        for symbol in symbols:
+            if self.get(symbol) is None:
+                logger.warning(f"Could not build an order template for '{symbol}'.")
 
-    # --- Persian: پیدا کردن و اجرای دینامیک تابع از کتابخانه mt5 ---
-    # --- English: Dynamically find and execute the function from the mt5 library ---
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, symbols=sorted(self._templates), ttl=self.ttl)
+
+ORDER_TEMPLATES = OrderTemplates(ORDER_TEMPLATE_TTL)
+
+def normalize_volume(template, volume):
+    """
+    Persian: حجم را به پایین به مضربی از volume_step گرد می‌کند و محدوده min/max نماد را بررسی می‌کند.
+    English: Rounds the volume down to a multiple of volume_step and checks the symbol's min/max range.
+    """
+    step = template["volume_step"]
+    normalized = round(math.floor(volume / step + 1e-9) * step, template["volume_decimals"])
+    if normalized < template["volume_min"]:
+        raise ValueError(f"volume {volume} is below the symbol's minimum of {template['volume_min']}")
+    if normalized > template["volume_max"]:
+        raise ValueError(f"volume {volume} is above the symbol's maximum of {template['volume_max']}")
+    return normalized
+
+def build_order_request(order):
+    """
+    Persian: درخواست order_send را از قالب نماد و بدنه /order می‌سازد؛ ValueError برای ورودی نامعتبر و LookupError برای نماد ناموجود.
+    English: Builds the order_send request from the symbol's template and the /order body;
+    raises ValueError for invalid input and LookupError for an unknown symbol.
+    """
+    symbol = order.get('symbol')
+    if not isinstance(symbol, str) or not symbol:
+        raise ValueError("'symbol' is required")
+    order_type = order.get('type')
+    if isinstance(order_type, str):
+        order_type = ORDER_TYPES.get(order_type.lower())
+    if isinstance(order_type, bool) or order_type not in ORDER_TYPES.values():
+        raise ValueError(f"'type' must be one of: {', '.join(ORDER_TYPES)}")
+    volume = order.get('volume')
+    if not isinstance(volume, (int, float)) or isinstance(volume, bool) or volume <= 0:
+        raise ValueError("'volume' must be a positive number")
+
+    template = ORDER_TEMPLATES.get(symbol)
+    if template is None:
+        raise LookupError(f"Symbol '{symbol}' not found.")
+
+    order_request = dict(template["request"])
+    order_request.update({field: order[field] for field in ORDER_PASSTHROUGH_FIELDS if order.get(field) is not None})
+    order_request["type"] = order_type
+    order_request["volume"] = normalize_volume(template, volume)
+    if order_type not in MARKET_ORDER_TYPES:
+        order_request["action"] = mt5.TRADE_ACTION_PENDING
+        if "price" not in order_request:
+            raise ValueError("'price' is required for pending orders")
+    for field in ORDER_PRICE_FIELDS:
+        if field in order_request:
+            order_request[field] = round(float(order_request[field]), template["digits"])
+    return order_request
+
+def _execute_order(order_request, check, submitted_at):
+    """
+    Persian: روی ترد mt5 اجرا می‌شود: قیمت بازار (در صورت نیاز)، order_check اختیاری و order_send پشت سر هم و بدون بازگشت به صف.
+    English: Runs on the mt5 thread: the market price (if needed), the optional order_check and order_send back to back, without going back through the queue.
+    """
+    started = time.perf_counter()
+    timings = {"queue": started - submitted_at}
+    if "price" not in order_request:
+        tick = mt5.symbol_info_tick(order_request["symbol"])
+        if tick is None:
+            return None, None, mt5.last_error(), timings
+        order_request["price"] = tick.ask if order_request["type"] == mt5.ORDER_TYPE_BUY else tick.bid
+    check_result = None
+    if check:
+        check_result = mt5.order_check(order_request)
+        timings["check"] = time.perf_counter() - started
+        if check_result is None or check_result.retcode != 0:
+            return None, check_result, mt5.last_error(), timings
+        started = time.perf_counter()
+    result = mt5.order_send(order_request)
+    timings["terminal"] = time.perf_counter() - started
+    return result, check_result, (mt5.last_error() if result is None else None), timings
+
+def place_order(order, started):
+    """
+    Persian: یک سفارش را اجرا کرده و (بدنه پاسخ، کد وضعیت HTTP، زمان هر مرحله) را برمی‌گرداند؛
+    زمان‌ها None هستند اگر سفارش پیش از رسیدن به ترمینال رد شده باشد.
+    English: Places one order and returns (response body, HTTP status code, per-stage timings);
+    the timings are None if the order was rejected before it reached the terminal.
+    """
     try:
-        mt5_function = getattr(mt5, function_name)
-        result = mt5_function(*args, **kwargs)
+        order_request = build_order_request(order)
+        check = order.get('check', ORDER_CHECK)
+        if not isinstance(check, bool):
+            raise ValueError("'check' must be true or false")
+    except LookupError as e:
+        return {"status": "error", "function_name": "order_send", "message": str(e)}, 404, None
+    except (TypeError, ValueError) as e:
+        return {"status": "error", "function_name": "order_send", "message": f"Invalid order: {e}"}, 400, None
+    timings = {"validate": time.perf_counter() - started}
 
-        # ------------------- START: THE DEFINITIVE FIX -------------------
-        # --- Persian: اینجا به صورت دستی و پیشگیرانه نتیجه را به فرمت صحیح تبدیل می‌کنیم ---
-        # --- English: Here we manually and proactively convert the result to the correct format ---
-        
-        final_result = result
-        # --- Persian: اگر نتیجه یک آبجکت تکی با متد _asdict بود (مثل account_info) ---
-        # --- English: If the result is a single object with the _asdict method (like account_info) ---
-        if hasattr(result, '_asdict'):
-            final_result = result._asdict()
-        # --- Persian: اگر نتیجه یک لیست یا تاپل از آبجکت‌ها بود (مثل history_deals_get) ---
-        # --- English: If the result is a list or tuple of objects (like history_deals_get) ---
-        elif isinstance(result, (list, tuple)):
-            final_result = [item._asdict() if hasattr(item, '_asdict') else item for item in result]
-
-        # --- Persian: حالا json.dumps را روی نتیجه‌ای که خودمان فرمت کرده‌ایم، اجرا می‌کنیم ---
-        # --- English: Now we run json.dumps on the result that we have formatted ourselves ---
-        json_result = json.loads(json.dumps(final_result, default=custom_json_encoder))
-        # -------------------- END: THE DEFINITIVE FIX --------------------
-
-        logger.info(f"Successfully executed '{function_name}'.")
-        return jsonify({
-            "status": "success",
-            "function_name": function_name,
-            "data": json_result
-        })
+    future = MT5_EXECUTOR.submit(_execute_order, order_request, check, time.perf_counter(), priority=PRIORITY_TRADE)
+    try:
+        result, check_result, last_error, terminal_timings = future.result()
+    except Exception as e:
+        last_error = getattr(e, 'mt5_last_error', None)
+        logger.error(f"An error occurred while placing an order on '{order_request['symbol']}': {e}. MT5 Last Error: {last_error}")
+        return {"status": "error", "function_name": "order_send", "request": order_request, "message": str(e),
+                "mt5_last_error": str(last_error)}, 500, timings
+    timings.update(terminal_timings)
 
-    except AttributeError:
-        logger.error(f"Function '{function_name}' not found in MetaTrader5 library.")
-        return jsonify({
-            "status": "error",
-            "function_name": function_name,
-            "message": f"Function '{function_name}' not found in MetaTrader5 library."
-        }), 404 # 404 Not Found
+    response_body = {"status": "success", "function_name": "order_send", "request": order_request}
+    if check:
+        response_body["check"] = convert_result(check_result)
+    if "terminal" not in timings and check_result is not None:
+        logger.warning(f"Order on '{order_request['symbol']}' rejected by order_check with retcode {check_result.retcode}.")
+        response_body.update(status="rejected", message=f"Rejected by order_check: {check_result.comment}")
+        return response_body, 422, timings
+
+    # --- Persian: مانند order_send در /rpc، کش و snapshot حساب باطل می‌شوند ---
+    # --- English: As for order_send on /rpc, the cache and the account snapshot are invalidated ---
+    if "terminal" in timings:
+        RESPONSE_CACHE.invalidate_after('order_send')
+        SNAPSHOT_STORE.invalidate()
+    if result is None:
+        logger.error(f"Order on '{order_request['symbol']}' failed. MT5 Last Error: {last_error}")
+        response_body.update(status="error", message="The terminal returned no result.", mt5_last_error=str(last_error))
+        return response_body, 500, timings
+    response_body["data"] = convert_result(result)
+    if result.retcode not in ORDER_SUCCESS_RETCODES:
+        logger.warning(f"Order on '{order_request['symbol']}' rejected with retcode {result.retcode}: {result.comment}")
+        response_body["status"] = "rejected"
+        return response_body, 422, timings
+    logger.info(f"Order on '{order_request['symbol']}' executed (retcode {result.retcode}, order {result.order}).")
+    return response_body, 200, timings
+
+class IdempotencyStore:
+    """
+    Persian: نتیجه سفارش‌ها بر اساس Idempotency-Key؛ تکرار یک درخواست (مثلاً بعد از timeout) همان نتیجه اول را برمی‌گرداند
+    و سفارش دوباره ارسال نمی‌شود. تکرار همزمان منتظر اتمام درخواست اول می‌ماند.
+    English: Order results by Idempotency-Key; a retried request (for example after a timeout) gets the original result
+    and the order is not sent again. A concurrent retry waits for the first request to finish.
+    """
+
+    class Entry:
+        __slots__ = ("fingerprint", "expires_at", "done", "response")
+
+        def __init__(self, fingerprint, expires_at):
+            self.fingerprint = fingerprint
+            self.expires_at = expires_at
+            self.done = threading.Event()
+            self.response = None
+
+    class Full(Exception):
+        """
+        Persian: همه کلیدهای ذخیره‌شده مربوط به سفارش‌های در حال اجرا هستند و جایی برای کلید جدید نیست.
+        English: Every stored key belongs to an order still in progress, so there is no room for a new key.
+        """
+
+    def __init__(self, ttl, max_keys):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._stats = {"stored": 0, "replayed": 0, "conflicts": 0, "rejected": 0}
+
+    def begin(self, key, fingerprint):
+        """
+        Persian: (ورودی، True) برای یک کلید جدید و (ورودی، False) برای تکرار؛ ValueError اگر کلید با درخواست دیگری استفاده شده باشد.
+        English: Returns (entry, True) for a new key and (entry, False) for a retry;
+        raises ValueError if the key was used with a different request and Full if no key can be evicted.
+        """
+        now = time.monotonic()
+        with self._lock:
+            # --- Persian: همه کلیدها TTL یکسان دارند، پس قدیمی‌ترین‌ها اول منقضی می‌شوند ---
+            # --- English: Every key has the same TTL, so the oldest ones expire first ---
+            while self._entries and next(iter(self._entries.values())).expires_at <= now:
+                self._entries.popitem(last=False)
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.fingerprint != fingerprint:
+                    self._stats["conflicts"] += 1
+                    raise ValueError(f"{IDEMPOTENCY_HEADER} was already used with a different request.")
+                self._stats["replayed"] += 1
+                return entry, False
+            if len(self._entries) >= self.max_keys:
+                # --- Persian: فقط کلیدهای تمام‌شده حذف می‌شوند؛ حذف یک کلید در حال اجرا اجازه ارسال دوباره سفارش را می‌دهد ---
+                # --- English: Only finished keys are evicted; evicting one in progress would let its retry send the order again ---
+                excess = len(self._entries) - self.max_keys + 1
+                evicted = list(itertools.islice(
+                    (stored_key for stored_key, stored in self._entries.items() if stored.done.is_set()), excess))
+                if len(evicted) < excess:
+                    self._stats["rejected"] += 1
+                    raise self.Full(f"Too many {IDEMPOTENCY_HEADER} requests are in progress.")
+                for stored_key in evicted:
+                    del self._entries[stored_key]
+            entry = self._entries[key] = self.Entry(fingerprint, now + self.ttl)
+            return entry, True
+
+    def finish(self, key, entry, response):
+        entry.response = response
+        with self._lock:
+            self._stats["stored"] += 1
+        entry.done.set()
+
+    def abandon(self, key, entry):
+        # --- Persian: درخواستی که به ترمینال نرسیده ذخیره نمی‌شود تا تکرار آن دوباره اجرا شود ---
+        # --- English: A request that never reached the terminal is not stored, so its retry runs again ---
+        with self._lock:
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+        entry.done.set()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, keys=len(self._entries), ttl=self.ttl, max_keys=self.max_keys)
+
+IDEMPOTENCY_STORE = IdempotencyStore(IDEMPOTENCY_TTL, IDEMPOTENCY_MAX_KEYS)
+
+def server_timing(timings):
+    return ", ".join(f"{stage};dur={seconds * 1000:.3f}" for stage, seconds in timings.items())
+
+@app.route('/order', methods=['POST'])
+@require_api_key
+def order_handler():
+    # --- Persian: مسیر اختصاصی order_send: قالب آماده نماد، order_check اختیاری، Idempotency-Key و زمان هر مرحله ---
+    # --- English: Dedicated order_send path: prebuilt symbol template, optional order_check, Idempotency-Key and per-stage timings ---
+    started = time.perf_counter()
+    order = request.get_json(silent=True)
+    if not isinstance(order, dict):
+        return json_response({"status": "error", "function_name": "order_send", "message": "Invalid JSON order request."}, 400, order=True)
+
+    idempotency_key = request.headers.get(IDEMPOTENCY_HEADER)
+    entry = None
+    if idempotency_key:
+        fingerprint = json.dumps(order, sort_keys=True, default=str)
+        while entry is None:
+            try:
+                entry, is_new = IDEMPOTENCY_STORE.begin(idempotency_key, fingerprint)
+            except ValueError as e:
+                return json_response({"status": "error", "function_name": "order_send", "message": str(e)}, 422, order=True)
+            except IdempotencyStore.Full as e:
+                return json_response({"status": "error", "function_name": "order_send", "message": str(e)}, 503, order=True)
+            if is_new:
+                break
+            if not entry.done.wait(IDEMPOTENCY_WAIT_SECONDS):
+                return json_response({"status": "error", "function_name": "order_send",
+                                      "message": "The original request with this key is still in progress."}, 409, order=True)
+            if entry.response is not None:
+                logger.info(f"Replayed the result of {IDEMPOTENCY_HEADER} '{idempotency_key}'.")
+                body, status_code = entry.response
+                response = Response(body, status=status_code, mimetype=JSON_MIMETYPE)
+                response.headers['Idempotent-Replayed'] = 'true'
+                return response
+            # --- Persian: درخواست اول به ترمینال نرسید؛ این تکرار خودش اجرا می‌شود ---
+            # --- English: The first request never reached the terminal; this retry runs itself ---
+            entry = None
+
+    try:
+        response_body, status_code, timings = place_order(order, started)
+    except BaseException:
+        if entry is not None:
+            IDEMPOTENCY_STORE.abandon(idempotency_key, entry)
+        raise
+    if timings is None:
+        if entry is not None:
+            IDEMPOTENCY_STORE.abandon(idempotency_key, entry)
+        return json_response(response_body, status_code, order=True)
+
+    response_body["timings"] = {stage: round(seconds * 1000, 3) for stage, seconds in timings.items()}
+    serialize_started = time.perf_counter()
+    try:
+        body = serialize_json(response_body)
+    except TypeError as e:
+        status_code = 500
+        body = serialize_json({"status": "error", "function_name": "order_send", "message": f"Result could not be serialized: {e}"})
+    timings["serialize"] = time.perf_counter() - serialize_started
+    if metrics.ENABLED:
+        for stage, seconds in timings.items():
+            ORDER_STAGE_SECONDS.observe(seconds, (stage,))
+    if entry is not None:
+        IDEMPOTENCY_STORE.finish(idempotency_key, entry, (body, status_code))
+
+    response = Response(body, status=status_code, mimetype=JSON_MIMETYPE)
+    response.headers['Server-Timing'] = server_timing(timings)
+    return response
+
+@app.route('/order/stats')
+@require_api_key
+def order_stats():
+    # --- Persian: نمادهای دارای قالب و شمارنده‌های Idempotency-Key ---
+    # --- English: Symbols with a template and the Idempotency-Key counters ---
+    return json_response({"status": "success", "data": {
+        "templates": ORDER_TEMPLATES.stats(), "idempotency": IDEMPOTENCY_STORE.stats()
+    }})
+
+def _to_timestamp(value):
+    # --- Persian: تاریخ‌ها به صورت ثانیه از ۱۹۷۰ یا رشته ISO پذیرفته می‌شوند ---
+    # --- English: Dates are accepted as seconds since 1970 or as an ISO string ---
+    if isinstance(value, str):
+        return int(datetime.fromisoformat(value).timestamp())
+    return int(value)
+
+def _stream_windows(function_name, args, kwargs, window_seconds):
+    """
+    Persian: بازه [date_from, date_to] را به پنجره‌های پشت سر هم تقسیم کرده و آرگومان‌های هر پنجره را تولید می‌کند.
+    English: Splits [date_from, date_to] into consecutive windows and yields the arguments of each one.
+    """
+    from_index = STREAMABLE_FUNCTIONS[function_name][0]
+    args = list(args)
+    kwargs = dict(kwargs)
+    if 'date_from' in kwargs:
+        date_from, date_to = _to_timestamp(kwargs['date_from']), _to_timestamp(kwargs['date_to'])
+    else:
+        date_from, date_to = _to_timestamp(args[from_index]), _to_timestamp(args[from_index + 1])
+
+    window_start = date_from
+    while True:
+        window_end = min(window_start + window_seconds, date_to)
+        is_last = window_end >= date_to
+        if 'date_from' in kwargs:
+            kwargs['date_from'], kwargs['date_to'] = window_start, window_end
+        else:
+            args[from_index], args[from_index + 1] = window_start, window_end
+        yield window_end, is_last, list(args), dict(kwargs)
+        if is_last:
+            return
+        window_start = window_end
+
+def _drop_window_overlap(function_name, data, window_end):
+    # --- Persian: پنجره‌ها در مرز هم‌پوشانی دارند؛ رکوردهای روی مرز فقط در پنجره بعدی ارسال می‌شوند ---
+    # --- English: Windows overlap at their boundary; records on the boundary are only sent with the next window ---
+    _, time_field, time_scale, _ = STREAMABLE_FUNCTIONS[function_name]
+    limit = window_end * time_scale
+    if isinstance(data, np.ndarray):
+        return data[data[time_field] < limit]
+    return [item for item in data if item.get(time_field, 0) < limit] if isinstance(data, list) else data
+
+class _ChunkCollector:
+    """
+    Persian: مقصد نوشتن برای Arrow که بایت‌های نوشته شده را تا ارسال بعدی نگه می‌دارد.
+    English: A write target for Arrow that holds written bytes until the next chunk is sent.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def _stream_error_trailer(arrow_writer, collector, error_body):
+    """
+    Persian: خط خطای پایانی استریم را می‌سازد. در حالت Arrow ابتدا استریم بسته می‌شود تا خط خطا بعد از نشانگر پایان بیاید.
+    English: Builds the error line that ends a stream. The line is always JSON starting with '{', which cannot
+    be confused with the start of a .npy block (b'\\x93NUMPY') or of an Arrow message (b'\\xff\\xff\\xff\\xff').
+    In Arrow mode the stream is closed first, so the error line follows the end-of-stream marker.
+    """
+    trailer = b''
+    if arrow_writer is not None:
+        try:
+            arrow_writer.close()
+            trailer = collector.drain()
+        except Exception as e:
+            logger.error(f"Failed to close the Arrow stream: {e}")
+    return trailer + serialize_json(error_body) + b'\n'
+
+def stream_rpc_call(function_name, args, kwargs, window_seconds, response_format):
+    """
+    Persian: هر پنجره را جداگانه از ترمینال گرفته و به محض آماده شدن به پاسخ می‌نویسد؛ حافظه به اندازه یک پنجره محدود است.
+    English: Fetches each window from the terminal and writes it to the response as soon as it is ready;
+    memory is bounded by one window.
+    A failed window ends the stream with one JSON error line (see _stream_error_trailer).
+    """
+    collector = arrow_writer = None
+    total = 0
+    try:
+        for window_end, is_last, window_args, window_kwargs in _stream_windows(function_name, args, kwargs, window_seconds):
+            call = start_rpc_call(function_name, window_args, window_kwargs)
+            response_body, status_code = call.finish()
+            if status_code != 200:
+                yield _stream_error_trailer(arrow_writer, collector, response_body)
+                return
+            data = response_body["data"]
+            if data is None:
+                # --- Persian: None یعنی mt5 در این پنجره شکست خورده؛ رد کردن آن داده‌ها را بی‌صدا ناقص می‌کرد ---
+                # --- English: None means mt5 failed for this window; skipping it would silently leave a gap ---
+                last_error = call.last_error
+                logger.error(f"'{function_name}' returned no data for the window ending at {window_end}. MT5 Last Error: {last_error}")
+                yield _stream_error_trailer(arrow_writer, collector, {
+                    "status": "error",
+                    "function_name": function_name,
+                    "message": f"The terminal returned no data for the window ending at {window_end}.",
+                    "mt5_last_error": str(last_error)
+                })
+                return
+            if not is_last:
+                data = _drop_window_overlap(function_name, data, window_end)
+            if len(data) == 0:
+                continue
+            total += len(data)
+
+            if isinstance(data, np.ndarray) and response_format == NUMPY_MIMETYPE:
+                # --- Persian: هر پنجره یک بلوک کامل .npy است که با np.lib.format.read_array پشت سر هم خوانده می‌شود ---
+                # --- English: Each window is a complete .npy block, read back to back with np.lib.format.read_array ---
+                data = np.ascontiguousarray(data)
+                header = io.BytesIO()
+                np.lib.format.write_array_header_2_0(header, np.lib.format.header_data_from_array_1_0(data))
+                yield header.getvalue()
+                # --- Persian: در حالت chunked، waitress فقط bytes می‌پذیرد؛ tobytes یک کپی یکجای بافر است ---
+                # --- English: In chunked mode waitress only accepts bytes; tobytes is a single buffer copy ---
+                yield data.tobytes()
+            elif isinstance(data, np.ndarray) and response_format == ARROW_MIMETYPE:
+                # --- Persian: هر پنجره یک record batch در یک استریم Arrow است ---
+                # --- English: Each window is one record batch in a single Arrow stream ---
+                batch = pa.RecordBatch.from_arrays([pa.array(data[name]) for name in data.dtype.names],
+                                                   names=list(data.dtype.names))
+                if arrow_writer is None:
+                    collector = _ChunkCollector()
+                    arrow_writer = pa.ipc.new_stream(pa.PythonFile(collector, mode='w'), batch.schema)
+                arrow_writer.write_batch(batch)
+                yield collector.drain()
+            else:
+                rows = custom_json_encoder(data) if isinstance(data, np.ndarray) else data
+                yield b''.join(serialize_json(row) + b'\n' for row in rows)
+            logger.info(f"Streamed window of '{function_name}' ending at {window_end} ({len(data)} records).")
+
+        if arrow_writer is not None:
+            arrow_writer.close()
+            yield collector.drain()
+        logger.info(f"Finished streaming '{function_name}' ({total} records).")
     except Exception as e:
-        last_error = mt5.last_error()
-        logger.error(f"An error occurred while executing '{function_name}': {e}. MT5 Last Error: {last_error}")
-        return jsonify({
-            "status": "error",
-            "function_name": function_name,
-            "message": str(e),
-            "mt5_last_error": str(last_error)
-        }), 500 # 500 Internal Server Error
+        # --- Persian: هدرها ارسال شده‌اند؛ خطا به صورت آخرین خط/بلوک گزارش می‌شود ---
+        # --- English: Headers are already sent; the error is reported as the last line ---
+        logger.error(f"An error occurred while streaming '{function_name}': {e}")
+        yield _stream_error_trailer(arrow_writer, collector,
+                                    {"status": "error", "function_name": function_name, "message": str(e)})
+
+@app.route('/rpc/stream', methods=['POST'])
+@require_api_key
+def rpc_stream_handler():
+    # --- Persian: بدنه درخواست مانند /rpc است به علاوه window_seconds اختیاری ---
+    # --- English: The request body is the same as /rpc plus an optional window_seconds ---
+    try:
+        req_data = request.get_json()
+        function_name = req_data.get('function_name')
+        args = req_data.get('args', [])
+        kwargs = req_data.get('kwargs', {})
+        if function_name not in STREAMABLE_FUNCTIONS:
+            raise ValueError(f"streaming is supported for: {', '.join(STREAMABLE_FUNCTIONS)}")
+        window_seconds = max(1, int(req_data.get('window_seconds', STREAMABLE_FUNCTIONS[function_name][3])))
+        # --- Persian: بررسی اولیه تاریخ‌ها قبل از ارسال هدرها ---
+        # --- English: Validate the dates up front, before the headers are sent ---
+        next(_stream_windows(function_name, args, kwargs, window_seconds), None)
+    except Exception as e:
+        logger.error(f"Invalid stream request: {e}")
+        return json_response({"status": "error", "message": f"Invalid stream request: {e}"}, 400)
+
+    offered = [NDJSON_MIMETYPE, NUMPY_MIMETYPE] + ([ARROW_MIMETYPE] if pa is not None else [])
+    response_format = request.accept_mimetypes.best_match(offered, default=NDJSON_MIMETYPE)
+    # --- Persian: نتایج غیر آرایه‌ای (مثل معاملات) همیشه NDJSON هستند ---
+    # --- English: Non-array results (such as deals) are always NDJSON ---
+    if function_name.startswith('history_'):
+        response_format = NDJSON_MIMETYPE
+
+    logger.info(f"Received stream call for function: '{function_name}' (window {window_seconds}s, {response_format})")
+    response = Response(stream_rpc_call(function_name, args, kwargs, window_seconds, response_format),
+                        mimetype=response_format)
+    response.headers['X-Function-Name'] = function_name
+    return response
+
+@app.route('/cache/stats')
+@require_api_key
+def cache_stats():
+    # --- Persian: شمارنده‌های hit/miss هر تابع برای تنظیم TTLها ---
+    # --- English: Per-function hit/miss counters for tuning the TTLs ---
+    return json_response({"status": "success", "enabled": RESPONSE_CACHE_ENABLED, "data": RESPONSE_CACHE.stats()})
+
+@app.route('/bar_store/stats')
+@require_api_key
+def bar_store_stats():
+    # --- Persian: نسبت کندل‌های سرویس‌داده از انبار به کل، و تعداد کندل‌های گرفته شده از ترمینال ---
+    # --- English: Share of bars served from the store, and the number of bars fetched from the terminal ---
+    return json_response({
+        "status": "success",
+        "enabled": BAR_STORE is not None,
+        "data": BAR_STORE.stats() if BAR_STORE is not None else None
+    })
+
+@app.route('/executor/stats')
+@require_api_key
+def executor_stats():
+    # --- Persian: عمق صف و تعداد فراخوانی‌های اجرا شده و ادغام شده ---
+    # --- English: Queue depth and the number of executed and coalesced calls ---
+    return json_response({"status": "success", "data": MT5_EXECUTOR.stats()})
+
+@app.route('/metrics')
+def metrics_handler():
+    # --- Persian: متریک‌های این پردازه با فرمت متنی Prometheus (در حالت ترکیبی، متریک‌های استریمر هم) ---
+    # --- English: This process's metrics in the Prometheus text format (in combined mode, the streamer's too) ---
+    return Response(metrics.REGISTRY.render(), mimetype=metrics.CONTENT_TYPE)
+
+@app.route('/debug/profile')
+@require_api_key
+def profile_handler():
+    # --- Persian: پروفایلر نمونه‌بردار را برای ?seconds=N (پیش‌فرض 10) اجرا کرده و پشته‌ها را برمی‌گرداند ---
+    # --- English: Runs the sampling profiler for ?seconds=N (default 10) and returns the stacks ---
+    try:
+        seconds = float(request.args.get('seconds', 10))
+        interval = float(request.args.get('interval', metrics.PROFILE_INTERVAL))
+    except ValueError:
+        return json_response({"status": "error", "message": "'seconds' and 'interval' must be numbers."}, 400)
+    logger.info(f"Profiling for {seconds} seconds.")
+    try:
+        stacks = metrics.PROFILER.profile(seconds, interval)
+    except RuntimeError as e:
+        return json_response({"status": "error", "message": str(e)}, 409)
+    return Response(stacks, mimetype="text/plain")
+
+@app.route('/snapshot/stats')
+@require_api_key
+def snapshot_stats():
+    # --- Persian: تعداد خواندن‌های حساب که از snapshot استریمر پاسخ داده شده‌اند و عمر فعلی آن ---
+    # --- English: How many account reads were answered from the streamer snapshot, and its current age ---
+    return json_response({"status": "success", "data": SNAPSHOT_STORE.stats()})
+
+def _ws_error(request_id, message, code):
+    return serialize_json({"id": request_id, "status": "error", "code": code, "message": message}).decode('utf-8')
+
+async def _ws_rpc_call(websocket, limiter, request_id, function_name, args, kwargs, use_cache, max_age=None):
+    """
+    Persian: یک فراخوانی را اجرا کرده و پاسخ را به محض آماده شدن با همان id برمی‌گرداند.
+    English: Runs one call and sends its response, tagged with the same id, as soon as it is ready.
+    """
+    try:
+        pending = start_rpc_call(function_name, args, kwargs, use_cache=use_cache, max_age=max_age)
+        if pending.future is not None:
+            # --- Persian: حلقه رویداد منتظر ترد mt5 می‌ماند بدون اینکه مسدود شود. future ممکن است با فراخوانی‌های
+            #     یکسان دیگر (از جمله /rpc) مشترک باشد، پس قطع شدن این اتصال نباید آن را لغو کند ---
+            # --- English: The event loop waits for the mt5 thread without blocking. The future may be shared with
+            #     other identical calls (including /rpc), so this connection closing must not cancel it ---
+            await asyncio.shield(asyncio.wrap_future(pending.future))
+        response_body, status_code = pending.finish()
+        response_body["id"] = request_id
+        response_body["code"] = status_code
+        started = time.perf_counter() if metrics.ENABLED else None
+        try:
+            message = serialize_json(response_body)
+        except TypeError as e:
+            await websocket.send(_ws_error(request_id, str(e), 500))
+            return
+        if started is not None:
+            label = function_label(function_name)
+            RPC_STAGE_SECONDS.observe(time.perf_counter() - started, (label, "serialize"))
+            RPC_RESPONSE_BYTES.observe(len(message), (label,))
+        await websocket.send(message.decode('utf-8'))
+    except websockets.exceptions.ConnectionClosed:
+        pass
+    except Exception as e:
+        # --- Persian: هر درخواست باید پاسخی با id خودش بگیرد، حتی اگر اجرای آن با خطا تمام شود ---
+        # --- English: Every request must get a reply with its id, even when running it fails ---
+        logger.error(f"WebSocket RPC call '{function_name}' failed: {e}")
+        try:
+            await websocket.send(_ws_error(request_id, f"An internal error occurred: {e}", 500))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+    finally:
+        limiter.release()
+
+async def ws_rpc_handler(websocket):
+    """
+    Persian: کانال RPC دائمی: یک بار احراز هویت و سپس ارسال درخواست‌های متوالی با id؛ پاسخ‌ها به ترتیب اتمام برمی‌گردند.
+    English: Persistent RPC channel: authenticate once, then pipeline requests tagged with an id; responses arrive as calls complete.
+    """
+    # --- Persian: کلید API می‌تواند در هدر handshake یا در اولین پیام {"type": "auth"} ارسال شود ---
+    # --- English: The API key can be sent in the handshake header or in a first {"type": "auth"} message ---
+    handshake = getattr(websocket, 'request', None)
+    headers = handshake.headers if handshake is not None else getattr(websocket, 'request_headers', {})
+    if headers.get('X-API-KEY') != API_KEY:
+        try:
+            auth = json.loads(await websocket.recv())
+        except (ValueError, websockets.exceptions.ConnectionClosed):
+            auth = {}
+        if not isinstance(auth, dict) or auth.get('type') != 'auth' or auth.get('api_key') != API_KEY:
+            logger.warning("Unauthorized WebSocket RPC access attempt detected.")
+            await websocket.close(1008, "Unauthorized: API Key is missing or invalid")
+            return
+        await websocket.send(serialize_json({"type": "auth", "status": "success"}).decode('utf-8'))
+
+    logger.info(f"WebSocket RPC client connected from {websocket.remote_address[0]}.")
+    limiter = asyncio.Semaphore(WS_RPC_MAX_INFLIGHT)
+    tasks = set()
+    try:
+        async for message in websocket:
+            try:
+                req_data = json.loads(message)
+                request_id = req_data.get('id')
+                function_name = req_data.get('function_name')
+                args = req_data.get('args', [])
+                kwargs = req_data.get('kwargs', {})
+                if not isinstance(args, list) or not isinstance(kwargs, dict):
+                    raise ValueError("'args' must be a list and 'kwargs' an object")
+            except Exception as e:
+                await websocket.send(_ws_error(None, f"Invalid JSON request: {e}", 400))
+                continue
+
+            # --- Persian: تعداد فراخوانی‌های همزمان هر اتصال محدود است ---
+            # --- English: The number of concurrent calls per connection is bounded ---
+            await limiter.acquire()
+            task = asyncio.create_task(_ws_rpc_call(
+                websocket, limiter, request_id, function_name, args, kwargs,
+                use_cache=not req_data.get('no_cache', False), max_age=parse_max_age(req_data.get('max_age'))
+            ))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    except websockets.exceptions.ConnectionClosed:
+        pass
+    finally:
+        logger.info(f"WebSocket RPC client from {websocket.remote_address[0]} disconnected.")
+        for task in tasks:
+            task.cancel()
+
+async def serve_ws_rpc(host='0.0.0.0', port=WS_RPC_PORT):
+    async with websockets.serve(ws_rpc_handler, host, port):
+        logger.info(f"WebSocket RPC channel is running on ws://{host}:{port}")
+        await asyncio.Future()
+
+def start_ws_rpc_server(host='0.0.0.0', port=WS_RPC_PORT):
+    """
+    Persian: سرور RPC وب‌سوکت را در یک ترد جداگانه با حلقه رویداد خودش اجرا می‌کند.
+    English: Runs the WebSocket RPC server in a separate thread with its own event loop.
+    """
+    thread = threading.Thread(target=asyncio.run, args=(serve_ws_rpc(host, port),), name="ws-rpc", daemon=True)
+    thread.start()
+    return thread
+
+def initialize_mt5():
+    """
+    Persian: اتصال اولیه و دائمی به متاتریدر در ترد اختصاصی mt5؛ تا آماده شدن ترمینال دوباره تلاش می‌کند.
+    English: Initial and persistent connection to MetaTrader on the dedicated mt5 thread; retries until the terminal is ready.
+    """
+    MT5_EXECUTOR.start()
+    for attempt in range(1, MT5_INIT_ATTEMPTS + 1):
+        if MT5_EXECUTOR.submit(mt5.initialize, path=MT5_PATH, portable=True, login=MT5_ACCOUNT,
+                               password=MT5_PASSWORD, server=MT5_SERVER).result():
+            logger.info(f"Successfully connected to MT5 account {MT5_ACCOUNT}.")
+            return True
+        logger.error(f"MT5 initialize() failed ({attempt}/{MT5_INIT_ATTEMPTS}), "
+                     f"error code: {MT5_EXECUTOR.submit(mt5.last_error).result()}.")
+        MT5_EXECUTOR.submit(mt5.shutdown).result()
+        if attempt < MT5_INIT_ATTEMPTS:
+            time.sleep(MT5_INIT_RETRY_SECONDS)
+    return False
+
+def run_gateway():
+    """
+    Persian: کانال RPC وب‌سوکت و وب سرور را تا زمان توقف اجرا کرده و سپس نشست mt5 را می‌بندد.
+    English: Runs the WebSocket RPC channel and the web server until stopped, then closes the mt5 session.
+    """
+    logger.info(f"API Gateway is running. Waiting for HTTP requests on port {API_PORT}...")
+
+    # --- Persian: کانال RPC وب‌سوکت در کنار /rpc ---
+    # --- English: The WebSocket RPC channel next to /rpc ---
+    start_ws_rpc_server()
+
+    # --- Persian: قالب سفارش نمادهای ORDER_SYMBOLS از قبل ساخته می‌شود تا اولین سفارش منتظر symbol_info نماند ---
+    # --- English: Order templates for ORDER_SYMBOLS are built up front, so the first order does not wait for symbol_info ---
+    ORDER_TEMPLATES.warm(ORDER_SYMBOLS)
+
+    try:
+        # --- Persian: اجرای وب سرور با Waitress که برای پروداکشن مناسب‌تر است ---
+        # --- English: Running the web server with Waitress, which is more suitable for production ---
+        serve(app, host='0.0.0.0', port=API_PORT, threads=WAITRESS_THREADS)
+    except KeyboardInterrupt:
+        logger.info("API Gateway stopped by user.")
+    finally:
+        logger.info("Shutting down MT5 connection.")
+        MT5_EXECUTOR.submit(mt5.shutdown).result()
+        MT5_EXECUTOR.stop()
 
 if __name__ == "__main__":
     logger.info("API Gateway starting up...")
@@ -171,23 +1944,10 @@ if __name__ == "__main__":
     if not API_KEY:
         logger.critical("CRITICAL: API_KEY environment variable is not set. Exiting.")
         sys.exit(1)
-    
-    # --- Persian: اتصال اولیه و دائمی به متاتریدر ---
-    # --- English: Initial and persistent connection to MetaTrader ---
-    if not mt5.initialize(path=MT5_PATH, portable=True, login=MT5_ACCOUNT, password=MT5_PASSWORD, server=MT5_SERVER):
-        logger.critical(f"MT5 initialize() failed, error code: {mt5.last_error()}. Exiting.")
-        mt5.shutdown()
+
+    if not initialize_mt5():
+        logger.critical("Could not initialize MT5. Exiting.")
+        MT5_EXECUTOR.stop()
         sys.exit(1)
-    
-    logger.info(f"Successfully connected to MT5 account {MT5_ACCOUNT}.")
-    logger.info("API Gateway is running. Waiting for HTTP requests on port 8080...")
-    
-    try:
-        # --- Persian: اجرای وب سرور با Waitress که برای پروداکشن مناسب‌تر است ---
-        # --- English: Running the web server with Waitress, which is more suitable for production ---
-        serve(app, host='0.0.0.0', port=8080)
-    except KeyboardInterrupt:
-        logger.info("API Gateway stopped by user.")
-    finally:
-        logger.info("Shutting down MT5 connection.")
-        mt5.shutdown()
\ No newline at end of file
+
+    run_gateway()
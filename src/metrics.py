@@ -0,0 +1,262 @@
+# metrics.py
+# --- Persian: یک ماژول مشترک برای گیت‌وی، استریمر و هاب؛ هاب آن را از همین پوشه src/ می‌خواند ---
+# --- English: One module shared by the gateway, the streamer and the hub; the hub imports it from this src/ folder ---
+
+import os
+import sys
+import time
+import bisect
+import threading
+from collections import Counter as _Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# --- Persian: ابزارگذاری با METRICS_ENABLED=0 خاموش می‌شود؛ در این حالت هر نقطه اندازه‌گیری فقط یک بررسی ENABLED هزینه دارد ---
+# --- English: METRICS_ENABLED=0 turns instrumentation off; each measuring point then costs a single ENABLED check ---
+ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+
+# --- Persian: بازه‌های پیش‌فرض هیستوگرام‌ها: زمان به ثانیه و اندازه به بایت ---
+# --- English: Default histogram buckets: durations in seconds and sizes in bytes ---
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (128, 512, 2048, 8192, 32768, 131072, 524288, 2097152, 8388608)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# --- Persian: حداکثر مدت یک نوبت پروفایل و فاصله پیش‌فرض نمونه‌برداری به ثانیه ---
+# --- English: Maximum length of one profiling run and the default sampling interval, in seconds ---
+PROFILE_MAX_SECONDS = 300
+PROFILE_INTERVAL = 0.005
+
+
+class Registry:
+    """
+    Persian: مجموعه متریک‌های یک پردازه که با فرمت متنی Prometheus نمایش داده می‌شوند.
+    English: The metrics of one process, exposed in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def collect(self):
+        """
+        Persian: لیستی از (نام، نوع، توضیح، نمونه‌ها)؛ هر نمونه (پسوند، برچسب‌ها، مقدار) است.
+        English: A list of (name, type, help, samples); each sample is (suffix, labels, value).
+        """
+        return [(metric.name, metric.kind, metric.help, metric.samples()) for metric in self.metrics]
+
+    def render(self):
+        return render(self.collect())
+
+REGISTRY = Registry()
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labelnames=(), callback=None, registry=REGISTRY):
+        """
+        Persian: با callback، مقادیر هنگام خواندن متریک از آن گرفته می‌شوند: یک عدد، یا دیکشنری {برچسب‌ها: مقدار}.
+        English: With a callback, the values are taken from it when the metric is read: a number, or a {labels: value} dict.
+        """
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+        self._lock = threading.Lock()
+        self._values = {}
+        registry.register(self)
+
+    def _values_snapshot(self):
+        if self.callback is not None:
+            values = self.callback()
+            return values if isinstance(values, dict) else {(): values}
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self):
+        return [("", list(zip(self.labelnames, labels)), value) for labels, value in self._values_snapshot().items()]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, labels=()):
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, labels=(), amount=1):
+        self.inc(labels, -amount)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS, registry=REGISTRY):
+        super().__init__(name, help_text, labelnames, registry=registry)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, labels=()):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # --- Persian: [تعداد هر بازه (آخری +Inf)، مجموع] ---
+                # --- English: [count per bucket (the last one is +Inf), sum] ---
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def samples(self):
+        with self._lock:
+            values = [(labels, list(counts), total) for labels, (counts, total) in self._values.items()]
+        samples = []
+        for labels, counts, total in values:
+            labels = list(zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                samples.append(("_bucket", labels + [("le", _format_value(float(bound)))], cumulative))
+            samples.append(("_sum", labels, total))
+            samples.append(("_count", labels, cumulative))
+        return samples
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value):
+    if isinstance(value, float):
+        if value == float("inf"):
+            return "+Inf"
+        if value.is_integer():
+            return str(int(value)) if abs(value) < 1e15 else repr(value)
+        return repr(value)
+    return str(value)
+
+def render(*collections):
+    """
+    Persian: یک یا چند خروجی collect() را با فرمت متنی Prometheus ترکیب می‌کند؛ نمونه‌های هم‌نام زیر یک خانواده قرار می‌گیرند.
+    English: Renders one or more collect() results in the Prometheus text format; samples of the same name share one family.
+    """
+    families = {}
+    for collection in collections:
+        for name, kind, help_text, samples in collection:
+            families.setdefault(name, (kind, help_text, []))[2].extend(samples)
+    lines = []
+    for name, (kind, help_text, samples) in families.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for suffix, labels, value in samples:
+            label_text = ",".join(f'{key}="{_escape(label)}"' for key, label in labels)
+            lines.append(f"{name}{suffix}{{{label_text}}} {_format_value(value)}" if label_text
+                         else f"{name}{suffix} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+class SamplingProfiler:
+    """
+    Persian: پروفایلر نمونه‌بردار: ترد فراخواننده در هر بازه پشته پایتون همه تردهای دیگر را می‌خواند.
+    فقط وقتی در حال اجراست هزینه دارد؛ خروجی با فرمت collapsed stacks (برای flamegraph.pl یا speedscope) است.
+    English: A sampling profiler: the calling thread reads every other thread's Python stack at each interval.
+    It only costs anything while running; the output is in the collapsed stacks format (for flamegraph.pl or speedscope).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._running = False
+
+    @property
+    def running(self):
+        return self._running
+
+    def profile(self, seconds, interval=PROFILE_INTERVAL):
+        """
+        Persian: به مدت seconds نمونه‌برداری کرده و پشته‌ها را برمی‌گرداند؛ RuntimeError اگر نوبت دیگری در حال اجرا باشد.
+        English: Samples for `seconds` and returns the stacks; raises RuntimeError if another run is in progress.
+        """
+        interval = max(interval, 0.001)
+        with self._lock:
+            if self._running:
+                raise RuntimeError("A profiling run is already in progress.")
+            self._running = True
+        try:
+            stacks = _Counter()
+            samples = 0
+            own_thread = threading.get_ident()
+            deadline = time.monotonic() + min(max(seconds, 0.0), PROFILE_MAX_SECONDS)
+            while time.monotonic() < deadline:
+                thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_thread:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)})")
+                        frame = frame.f_back
+                    stack.append(thread_names.get(thread_id, str(thread_id)))
+                    stacks[";".join(reversed(stack))] += 1
+                samples += 1
+                time.sleep(interval)
+        finally:
+            self._running = False
+        lines = [f"# {samples} samples every {interval * 1000:g} ms, pid {os.getpid()}"]
+        lines.extend(f"{stack} {count}" for stack, count in stacks.most_common())
+        return "\n".join(lines) + "\n"
+
+PROFILER = SamplingProfiler()
+
+
+def start_http_server(port, host="0.0.0.0", profiler_enabled=False):
+    """
+    Persian: یک سرور HTTP کوچک در یک ترد جداگانه برای سرویس‌هایی که وب سرور ندارند: /metrics و در صورت فعال بودن /debug/profile.
+    English: A small HTTP server in a separate thread for services without a web server: /metrics and, if enabled, /debug/profile.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/metrics":
+                self._send(200, REGISTRY.render(), CONTENT_TYPE)
+            elif url.path == "/debug/profile" and profiler_enabled:
+                query = parse_qs(url.query)
+                try:
+                    seconds = float(query.get("seconds", ["10"])[0])
+                    interval = float(query.get("interval", [str(PROFILE_INTERVAL)])[0])
+                    self._send(200, PROFILER.profile(seconds, interval), "text/plain; charset=utf-8")
+                except ValueError:
+                    self._send(400, "seconds and interval must be numbers\n", "text/plain; charset=utf-8")
+                except RuntimeError as e:
+                    self._send(409, f"{e}\n", "text/plain; charset=utf-8")
+            else:
+                self._send(404, "Not found\n", "text/plain; charset=utf-8")
+
+        def _send(self, status, text, content_type):
+            body = text.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
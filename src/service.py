@@ -0,0 +1,76 @@
+# service.py
+
+import sys
+import asyncio
+import logging
+import threading
+
+import api_gateway
+import streamer
+
+# --- Persian: سرویس ترکیبی: گیت‌وی API و استریمر در یک پردازه با یک نشست mt5 مشترک.
+#     همه فراخوانی‌های mt5 (از جمله خواندن‌های استریمر) در ترد اختصاصی MT5_EXECUTOR اجرا می‌شوند
+#     و آخرین خواندن حساب استریمر، account_info و positions_get و positions_total را در /rpc پاسخ می‌دهد ---
+# --- English: Combined service: the API gateway and the streamer in one process sharing one mt5 session.
+#     Every mt5 call (the streamer's reads included) runs on the dedicated MT5_EXECUTOR thread,
+#     and the streamer's latest account read answers account_info, positions_get and positions_total on /rpc ---
+
+# --- Persian: راه‌اندازی سیستم لاگینگ ---
+# --- English: Setting up the logging system ---
+log_formatter = logging.Formatter('%(asctime)s - SERVICE - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+if not logger.handlers:
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(log_formatter)
+    logger.addHandler(console_handler)
+
+async def run_on_mt5_thread(func, *args):
+    """
+    Persian: اجرای یک تابع استریمر در ترد mt5؛ حلقه رویداد استریمر در این مدت مسدود نمی‌شود
+    و این فراخوانی‌ها جلوتر از فراخوانی‌های عادی و حجیم /rpc اجرا می‌شوند.
+    English: Runs one streamer function on the mt5 thread without blocking the streamer's event loop;
+    these calls run ahead of regular and bulk /rpc calls.
+    """
+    return await asyncio.wrap_future(
+        api_gateway.MT5_EXECUTOR.submit(func, *args, priority=api_gateway.PRIORITY_STREAMER))
+
+def start_streamer():
+    """
+    Persian: استریمر را با حلقه رویداد خودش در یک ترد جداگانه اجرا می‌کند.
+    English: Runs the streamer in a separate thread with its own event loop.
+    """
+    streamer.MT5_RUNNER = run_on_mt5_thread
+    # --- Persian: خواندن حساب در همان ترد mt5 ذخیره می‌شود، پس یک order_send بعدی همیشه بعد از آن snapshot را باطل می‌کند ---
+    # --- English: The account read is stored on the mt5 thread itself, so a later order_send always invalidates it afterwards ---
+    streamer.ACCOUNT_LISTENERS.append(api_gateway.SNAPSHOT_STORE.update)
+    thread = threading.Thread(target=asyncio.run, args=(streamer.stream_data_handler(),), name="streamer", daemon=True)
+    thread.start()
+    return thread
+
+if __name__ == "__main__":
+    logger.info("Combined service starting up...")
+
+    # --- Persian: بررسی تنظیمات هر دو سرویس قبل از راه‌اندازی ---
+    # --- English: Check the settings of both services before starting ---
+    if not api_gateway.API_KEY:
+        logger.critical("CRITICAL: API_KEY environment variable is not set. Exiting.")
+        sys.exit(1)
+    if not all([streamer.MT5_ACCOUNT, streamer.MT5_PASSWORD, streamer.MT5_SERVER]):
+        logger.critical("CRITICAL: MT5 environment variables not set. Exiting.")
+        sys.exit(1)
+    if streamer.STREAM_ENCODING not in ("json", "msgpack") or \
+            (streamer.STREAM_ENCODING == "msgpack" and streamer.msgpack is None):
+        logger.critical(f"CRITICAL: STREAM_ENCODING '{streamer.STREAM_ENCODING}' is not supported. Exiting.")
+        sys.exit(1)
+
+    # --- Persian: یک initialize برای هر دو سرویس؛ به محض آماده شدن ترمینال ادامه می‌دهد ---
+    # --- English: One initialize for both services; continues as soon as the terminal is ready ---
+    if not api_gateway.initialize_mt5():
+        logger.critical("Could not initialize MT5. Exiting.")
+        api_gateway.MT5_EXECUTOR.stop()
+        sys.exit(1)
+
+    start_streamer()
+    streamer.mark_ready()
+    api_gateway.run_gateway()
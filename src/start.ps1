@@ -3,27 +3,57 @@
 # --- Persian: توضیح: این اسکریپت مسئول اجرای هر دو سرویس استریمر و گیت‌وی API است ---
 # --- English: Description: This script is responsible for running both the streamer and API gateway services ---
 
-Write-Host "Supervisor: Starting Streamer Bot..."
-$StreamerJob = Start-Job -ScriptBlock { & "C:\Program Files\Python311\python.exe" "C:\app\streamer.py" }
+# --- Persian: SERVICE_MODE=combined هر دو سرویس را در یک پردازه با یک نشست mt5 اجرا می‌کند (service.py)؛
+#     separate (پیش‌فرض) دو پردازه جداگانه اجرا می‌کند ---
+# --- English: SERVICE_MODE=combined runs both services in one process with one mt5 session (service.py);
+#     separate (the default) runs two separate processes ---
+$ServiceMode = if ($env:SERVICE_MODE) { $env:SERVICE_MODE } else { "separate" }
+$ReadyTimeoutSeconds = if ($env:READY_TIMEOUT_SECONDS) { [int]$env:READY_TIMEOUT_SECONDS } else { 120 }
 
-# --- Persian: کمی صبر می‌کنیم تا متاتریدر توسط یکی از اسکریپت‌ها راه‌اندازی شود ---
-# --- English: We wait a bit for MetaTrader to be launched by one of the scripts ---
-Write-Host "Supervisor: Waiting 15 seconds for MetaTrader terminal to initialize..."
-Start-Sleep -Seconds 15
+# --- Persian: استریمر بعد از یک initialize موفق این فایل را می‌سازد ---
+# --- English: The streamer creates this file after a successful initialize ---
+$env:STREAMER_READY_FILE = "C:\app\streamer.ready"
+Remove-Item -Path $env:STREAMER_READY_FILE -ErrorAction SilentlyContinue
 
-Write-Host "Supervisor: Starting API Gateway Bot..."
-$ApiGatewayJob = Start-Job -ScriptBlock { & "C:\Program Files\Python311\python.exe" "C:\app\api_gateway.py" } # <-- تغییر نام فایل
+if ($ServiceMode -eq "combined") {
+    Write-Host "Supervisor: Starting combined service (API Gateway + Streamer)..."
+    $Jobs = @(Start-Job -ScriptBlock { & "C:\Program Files\Python311\python.exe" "C:\app\service.py" })
+}
+else {
+    Write-Host "Supervisor: Starting Streamer Bot..."
+    $StreamerJob = Start-Job -ScriptBlock { & "C:\Program Files\Python311\python.exe" "C:\app\streamer.py" }
+
+    # --- Persian: به جای یک تاخیر ثابت، تا آماده شدن متاتریدر (فایل آمادگی استریمر) صبر می‌کنیم ---
+    # --- English: Instead of a fixed delay, we wait until MetaTrader is ready (the streamer's readiness file) ---
+    Write-Host "Supervisor: Waiting for MetaTrader terminal to initialize (up to $ReadyTimeoutSeconds seconds)..."
+    $Deadline = (Get-Date).AddSeconds($ReadyTimeoutSeconds)
+    while (-not (Test-Path $env:STREAMER_READY_FILE) -and $StreamerJob.State -eq 'Running' -and (Get-Date) -lt $Deadline) {
+        Receive-Job -Job $StreamerJob
+        Start-Sleep -Milliseconds 250
+    }
+    if (Test-Path $env:STREAMER_READY_FILE) {
+        Write-Host "Supervisor: MetaTrader terminal is ready."
+    }
+    else {
+        Write-Host "Supervisor: Streamer did not report ready; starting the API Gateway anyway."
+    }
+
+    Write-Host "Supervisor: Starting API Gateway Bot..."
+    $ApiGatewayJob = Start-Job -ScriptBlock { & "C:\Program Files\Python311\python.exe" "C:\app\api_gateway.py" } # <-- تغییر نام فایل
+    $Jobs = @($StreamerJob, $ApiGatewayJob)
+}
 
 Write-Host "Supervisor: All jobs started. Monitoring..."
 # --- Persian: حلقه اصلی برای نمایش مداوم لاگ‌ها و زنده نگه داشتن کانتینر ---
 # --- English: Main loop to continuously display logs and keep the container alive ---
 while ($true) {
-    Receive-Job -Job $StreamerJob
-    Receive-Job -Job $ApiGatewayJob # <-- تغییر نام متغیر
+    foreach ($Job in $Jobs) {
+        Receive-Job -Job $Job
+    }
     
-    if ($StreamerJob.State -eq 'Failed' -or $ApiGatewayJob.State -eq 'Failed') {
+    if ($Jobs | Where-Object { $_.State -eq 'Failed' }) {
         Write-Host "Supervisor: One of the jobs has failed. Check logs above for errors."
     }
     
     Start-Sleep -Seconds 2
-}
\ No newline at end of file
+}
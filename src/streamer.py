@@ -7,6 +7,12 @@ import logging
 import sys
 import MetaTrader5 as mt5
 import websockets
+import metrics
+
+try:
+    import msgpack
+except ImportError:  # فقط برای STREAM_ENCODING=msgpack لازم است
+    msgpack = None
 
 # --- تنظیمات اولیه ---
 MT5_ACCOUNT = int(os.environ.get("MT5_ACCOUNT", 0))
@@ -14,8 +20,34 @@ MT5_PASSWORD = os.environ.get("MT5_PASSWORD", "")
 MT5_SERVER = os.environ.get("MT5_SERVER", "")
 MT5_PATH = os.environ.get("MT5_PATH", r"C:\Program Files\meta\terminal64.exe")
 WEBSOCKET_URI = os.environ.get("WEBSOCKET_URI", "ws://localhost:8765")
-SEND_INTERVAL_SECONDS = 1
+SEND_INTERVAL_SECONDS = float(os.environ.get("SEND_INTERVAL_SECONDS", 1))
 RECONNECT_DELAY_SECONDS = 10
+# حالت ارسال: full (کل وضعیت در هر بار) یا delta (فقط تغییرات، با کی‌فریم دوره‌ای)
+STREAM_MODE = os.environ.get("STREAM_MODE", "full")
+KEYFRAME_INTERVAL = int(os.environ.get("KEYFRAME_INTERVAL", 30))
+# استریم قیمت: نمادهای WATCHLIST (با کاما جدا شده) در هر چرخه بررسی و فقط در صورت تغییر ارسال می‌شوند
+WATCHLIST = [s.strip() for s in os.environ.get("WATCHLIST", "").split(",") if s.strip()]
+MARKET_DATA_INTERVAL_SECONDS = float(os.environ.get("MARKET_DATA_INTERVAL_SECONDS", 0.25))
+MARKET_TICKS = os.environ.get("MARKET_TICKS", "1").lower() in ("1", "true", "yes")
+MARKET_DEPTH = os.environ.get("MARKET_DEPTH", "0").lower() in ("1", "true", "yes")
+MAX_TICKS_PER_POLL = int(os.environ.get("MAX_TICKS_PER_POLL", 1000))
+# کدگذاری پیام‌ها به هاب: json (فریم متنی) یا msgpack (فریم باینری)؛ و فشرده‌سازی permessage-deflate
+# (auto: فقط برای json، چون msgpack بدتر فشرده می‌شود؛ deflate یا none)
+STREAM_ENCODING = os.environ.get("STREAM_ENCODING", "json")
+STREAM_COMPRESSION = os.environ.get("STREAM_COMPRESSION", "auto")
+# آماده‌سازی: به جای تاخیر ثابت، initialize تا MT5_INIT_ATTEMPTS بار تکرار می‌شود و پس از موفقیت فایل STREAMER_READY_FILE ساخته می‌شود
+MT5_INIT_ATTEMPTS = int(os.environ.get("MT5_INIT_ATTEMPTS", 10))
+MT5_INIT_RETRY_SECONDS = float(os.environ.get("MT5_INIT_RETRY_SECONDS", 3))
+STREAMER_READY_FILE = os.environ.get("STREAMER_READY_FILE", "")
+
+# حالت سرویس ترکیبی (service.py): فراخوانی‌های mt5 در ترد مالک نشست اجرا می‌شوند (MT5_RUNNER یک تابع async است)
+# و هر خواندن حساب به ACCOUNT_LISTENERS هم داده می‌شود
+MT5_RUNNER = None
+ACCOUNT_LISTENERS = []
+# متریک‌ها روی http://<host>:STREAMER_METRICS_PORT/metrics (صفر یعنی خاموش؛ در حالت سرویس ترکیبی روی /metrics گیت‌وی)
+# و پروفایلر نمونه‌بردار روی /debug/profile?seconds=N در صورت STREAMER_PROFILER=1
+STREAMER_METRICS_PORT = int(os.environ.get("STREAMER_METRICS_PORT", 9101))
+STREAMER_PROFILER = os.environ.get("STREAMER_PROFILER", "0") == "1"
 
 # --- راه‌اندازی سیستم لاگینگ ---
 log_formatter = logging.Formatter('%(asctime)s - STREAMER - %(levelname)s - %(message)s')
@@ -26,81 +58,298 @@ if not logger.handlers:
     console_handler.setFormatter(log_formatter)
     logger.addHandler(console_handler)
 
+# --- متریک‌ها ---
+POLL_SECONDS = metrics.Histogram(
+    "streamer_poll_seconds", "Time to read from the terminal, by kind (account, market_data).", ("kind",))
+SEND_LAG_SECONDS = metrics.Histogram(
+    "streamer_send_lag_seconds", "Time from the end of a terminal read until its message was handed to the connection.",
+    ("type",))
+MESSAGES_SENT = metrics.Counter("streamer_messages_total", "Messages sent to the hub, by type.", ("type",))
+BYTES_SENT = metrics.Counter("streamer_sent_bytes_total", "Size of the messages sent to the hub, by type.", ("type",))
+RECONNECTS = metrics.Counter("streamer_reconnects_total", "Lost or failed connections to the hub, by reason.", ("reason",))
+CONNECTED = metrics.Gauge("streamer_connected", "1 while connected to the hub.")
+
+def record_sent(message_type, message, polled_at):
+    SEND_LAG_SECONDS.observe(time.perf_counter() - polled_at, (message_type,))
+    MESSAGES_SENT.inc((message_type,))
+    BYTES_SENT.inc((message_type,), len(message))
+
 # --- توابع متاتریدر ---
-def initialize_mt5():
-    logger.info("Attempting to initialize MetaTrader 5...")
-    if not mt5.initialize(path=MT5_PATH, portable=True, login=MT5_ACCOUNT, password=MT5_PASSWORD, server=MT5_SERVER):
+def initialize_mt5(attempts=MT5_INIT_ATTEMPTS):
+    for attempt in range(1, attempts + 1):
+        logger.info(f"Attempting to initialize MetaTrader 5 ({attempt}/{attempts})...")
+        if mt5.initialize(path=MT5_PATH, portable=True, login=MT5_ACCOUNT, password=MT5_PASSWORD, server=MT5_SERVER):
+            logger.info(f"Successfully initialized MT5 for account {MT5_ACCOUNT}")
+            return True
         logger.error(f"MT5 initialize() failed, error code: {mt5.last_error()}")
         mt5.shutdown()
-        return False
-    logger.info(f"Successfully initialized MT5 for account {MT5_ACCOUNT}")
-    return True
+        # ترمینال ممکن است هنوز در حال اجرا شدن باشد
+        if attempt < attempts:
+            time.sleep(MT5_INIT_RETRY_SECONDS)
+    return False
+
+def mark_ready():
+    if STREAMER_READY_FILE:
+        with open(STREAMER_READY_FILE, "w") as ready_file:
+            ready_file.write(str(os.getpid()))
 
-def get_realtime_data():
+async def run_mt5(func, *args):
+    # در حالت ترکیبی MT5_RUNNER یک coroutine است و حلقه رویداد تا آماده شدن نتیجه آزاد می‌ماند
+    if MT5_RUNNER is None:
+        return func(*args)
+    return await MT5_RUNNER(func, *args)
+
+def read_account():
+    # account_info و positions_get با هم خوانده می‌شوند تا یک وضعیت سازگار باشند
+    account_info = mt5.account_info()
+    positions = mt5.positions_get() if account_info else None
+    for listener in ACCOUNT_LISTENERS:
+        listener(account_info, positions)
+    return account_info, positions
+
+def build_account_update(account_info, positions):
+    open_trades = []
+    if positions is not None:
+        open_trades = [
+            {"ticket": p.ticket, "symbol": p.symbol, "type": "BUY" if p.type == mt5.ORDER_TYPE_BUY else "SELL",
+             "volume": p.volume, "price_open": p.price_open, "price_current": p.price_current,
+             "profit": p.profit, "swap": p.swap, "time_open": p.time} for p in positions
+        ]
+
+    return {
+        "type": "account_update", "account_number": account_info.login, "timestamp": int(time.time()),
+        "data": {
+            "balance": account_info.balance, "equity": account_info.equity, "profit": account_info.profit,
+            "margin": account_info.margin, "margin_free": account_info.margin_free,
+            "margin_level": account_info.margin_level, "open_trades_count": len(open_trades),
+            "open_trades": open_trades
+        }
+    }
+
+async def get_realtime_data():
     try:
-        account_info = mt5.account_info()
+        started = time.perf_counter()
+        account_info, positions = await run_mt5(read_account)
+        if metrics.ENABLED:
+            POLL_SECONDS.observe(time.perf_counter() - started, ("account",))
         if not account_info:
             logger.warning("Could not get account info.")
             return None
-
-        positions = mt5.positions_get()
-        open_trades = []
-        if positions is not None:
-            open_trades = [
-                {"ticket": p.ticket, "symbol": p.symbol, "type": "BUY" if p.type == mt5.ORDER_TYPE_BUY else "SELL",
-                 "volume": p.volume, "price_open": p.price_open, "price_current": p.price_current,
-                 "profit": p.profit, "swap": p.swap, "time_open": p.time} for p in positions
-            ]
-
-        data = {
-            "type": "account_update", "account_number": account_info.login, "timestamp": int(time.time()),
-            "data": {
-                "balance": account_info.balance, "equity": account_info.equity, "profit": account_info.profit,
-                "margin": account_info.margin, "margin_free": account_info.margin_free,
-                "margin_level": account_info.margin_level, "open_trades_count": len(open_trades),
-                "open_trades": open_trades
-            }
-        }
-        return data
+        return build_account_update(account_info, positions)
     except Exception as e:
         logger.error(f"Exception in get_realtime_data: {e}")
         return None
 
+# --- کدگذاری تغییرات (delta) ---
+class DeltaEncoder:
+    # برای هر اتصال یک نمونه ساخته می‌شود؛ اولین پیام همیشه snapshot کامل است
+    def __init__(self, keyframe_interval=KEYFRAME_INTERVAL):
+        self.keyframe_interval = keyframe_interval
+        self.seq = 0
+        self.last_fields = None
+        self.last_positions = None
+        self.cycles_since_keyframe = 0
+
+    def encode(self, snapshot):
+        fields = {k: v for k, v in snapshot["data"].items() if k != "open_trades"}
+        positions = {p["ticket"]: p for p in snapshot["data"]["open_trades"]}
+        self.cycles_since_keyframe += 1
+
+        # کی‌فریم: اولین پیام یا هر keyframe_interval چرخه
+        if self.last_fields is None or self.cycles_since_keyframe >= self.keyframe_interval:
+            self.last_fields, self.last_positions = fields, positions
+            self.cycles_since_keyframe = 0
+            self.seq += 1
+            return dict(snapshot, seq=self.seq, keyframe=True)
+
+        changed = {k: v for k, v in fields.items() if self.last_fields.get(k) != v}
+        added = [p for ticket, p in positions.items() if ticket not in self.last_positions]
+        removed = [ticket for ticket in self.last_positions if ticket not in positions]
+        positions_changed = []
+        for ticket, p in positions.items():
+            old = self.last_positions.get(ticket)
+            if old is not None and old != p:
+                diff = {k: v for k, v in p.items() if old.get(k) != v}
+                diff["ticket"] = ticket
+                positions_changed.append(diff)
+
+        self.last_fields, self.last_positions = fields, positions
+        if not (changed or added or removed or positions_changed):
+            return None
+
+        self.seq += 1
+        data = {}
+        if changed:
+            data["changed"] = changed
+        if positions_changed:
+            data["positions_changed"] = positions_changed
+        if added:
+            data["positions_added"] = added
+        if removed:
+            data["positions_removed"] = removed
+        return {
+            "type": "account_delta", "account_number": snapshot["account_number"],
+            "timestamp": snapshot["timestamp"], "seq": self.seq, "base_seq": self.seq - 1, "data": data
+        }
+
+# --- داده‌های بازار (قیمت‌ها و عمق بازار) ---
+class MarketDataCollector:
+    # برای هر اتصال یک نمونه ساخته می‌شود؛ اولین فریم همه نمادها را دارد
+    def __init__(self, symbols, with_ticks=MARKET_TICKS, with_depth=MARKET_DEPTH):
+        self.with_ticks = with_ticks
+        self.with_depth = with_depth
+        self.symbols = []
+        for symbol in symbols:
+            # symbol_info_tick فقط برای نمادهای موجود در Market Watch کار می‌کند
+            if not mt5.symbol_select(symbol, True):
+                logger.warning(f"Symbol {symbol} could not be selected, error code: {mt5.last_error()}")
+                continue
+            if with_depth and not mt5.market_book_add(symbol):
+                logger.warning(f"market_book_add({symbol}) failed, error code: {mt5.last_error()}")
+            self.symbols.append(symbol)
+        self.last_quotes = {}
+        self.last_time_msc = {}
+        self.last_books = {}
+
+    def close(self):
+        if self.with_depth:
+            for symbol in self.symbols:
+                mt5.market_book_release(symbol)
+
+    def ticks_since(self, symbol, time_msc):
+        # تیک‌هایی که بین دو بررسی رخ داده‌اند: [time_msc, bid, ask, last, volume_real, flags]
+        ticks = mt5.copy_ticks_from(symbol, time_msc // 1000, MAX_TICKS_PER_POLL, mt5.COPY_TICKS_ALL)
+        if ticks is None or len(ticks) == 0:
+            return []
+        ticks = ticks[ticks["time_msc"] > time_msc]
+        return ticks[["time_msc", "bid", "ask", "last", "volume_real", "flags"]].tolist()
+
+    def collect(self):
+        updates = {}
+        for symbol in self.symbols:
+            update = {}
+            tick = mt5.symbol_info_tick(symbol)
+            if tick is not None:
+                quote = (tick.time_msc, tick.bid, tick.ask, tick.last)
+                # فقط برای تیک جدید؛ قیمتی که بین دو بررسی رفته و برگشته هم با time_msc جدید فرستاده می‌شود
+                if self.last_quotes.get(symbol) != quote:
+                    update = {"bid": tick.bid, "ask": tick.ask, "last": tick.last,
+                              "volume": tick.volume_real, "time_msc": tick.time_msc}
+                    previous_msc = self.last_time_msc.get(symbol)
+                    if self.with_ticks and previous_msc is not None:
+                        ticks = self.ticks_since(symbol, previous_msc)
+                        if ticks:
+                            update["ticks"] = ticks
+                    self.last_quotes[symbol] = quote
+                    self.last_time_msc[symbol] = tick.time_msc
+
+            if self.with_depth:
+                book = mt5.market_book_get(symbol)
+                if book is not None:
+                    book = [[b.type, b.price, b.volume_dbl] for b in book]
+                    if self.last_books.get(symbol) != book:
+                        update["book"] = book
+                        self.last_books[symbol] = book
+
+            if update:
+                updates[symbol] = update
+
+        if not updates:
+            return None
+        # همه نمادهای تغییر کرده در یک فریم
+        return {"type": "market_data", "account_number": MT5_ACCOUNT, "timestamp": int(time.time()), "data": updates}
+
+async def stream_market_data(websocket):
+    collector = await run_mt5(MarketDataCollector, WATCHLIST)
+    logger.info(f"Streaming market data for {len(collector.symbols)} symbols: {', '.join(collector.symbols)}")
+    try:
+        while True:
+            started = time.perf_counter()
+            frame = await run_mt5(collector.collect)
+            polled_at = time.perf_counter()
+            if metrics.ENABLED:
+                POLL_SECONDS.observe(polled_at - started, ("market_data",))
+            if frame:
+                message = encode_message(frame)
+                await websocket.send(message)
+                if metrics.ENABLED:
+                    record_sent("market_data", message, polled_at)
+            await asyncio.sleep(MARKET_DATA_INTERVAL_SECONDS)
+    finally:
+        await run_mt5(collector.close)
+
+def encode_message(data):
+    if STREAM_ENCODING == "msgpack":
+        return msgpack.packb(data, use_bin_type=True)
+    return json.dumps(data)
+
 # --- منطق اصلی ---
 async def stream_data_handler():
     while True:
         try:
-            async with websockets.connect(WEBSOCKET_URI) as websocket:
+            compress = STREAM_COMPRESSION == "deflate" or (STREAM_COMPRESSION == "auto" and STREAM_ENCODING == "json")
+            compression = "deflate" if compress else None
+            async with websockets.connect(WEBSOCKET_URI, compression=compression) as websocket:
                 logger.info(f"Connected to WebSocket server: {WEBSOCKET_URI}")
+                CONNECTED.set(1)
                 
-                # معرفی خود به عنوان یک استریمر
+                # معرفی خود به عنوان یک استریمر (پیام معرفی همیشه JSON است)
                 await websocket.send(json.dumps({
                     "type": "streamer_hello",
-                    "account_number": MT5_ACCOUNT
+                    "account_number": MT5_ACCOUNT,
+                    "encoding": STREAM_ENCODING
                 }))
 
-                while True:
-                    realtime_data = get_realtime_data()
-                    if realtime_data:
-                        await websocket.send(json.dumps(realtime_data))
-                        logger.debug(f"Sent update for account {MT5_ACCOUNT}")
-                    await asyncio.sleep(SEND_INTERVAL_SECONDS)
+                # در حالت delta، هر اتصال جدید با یک snapshot کامل شروع می‌شود
+                encoder = DeltaEncoder() if STREAM_MODE == "delta" else None
+
+                # داده‌های بازار با بازه زمانی خودش، در کنار وضعیت حساب ارسال می‌شود
+                market_data_task = asyncio.create_task(stream_market_data(websocket)) if WATCHLIST else None
+                try:
+                    while True:
+                        if market_data_task is not None and market_data_task.done():
+                            market_data_task.result()  # خطای استریم قیمت باعث اتصال مجدد می‌شود
+                        realtime_data = await get_realtime_data()
+                        polled_at = time.perf_counter()
+                        if realtime_data and encoder is not None:
+                            realtime_data = encoder.encode(realtime_data)
+                        if realtime_data:
+                            message = encode_message(realtime_data)
+                            await websocket.send(message)
+                            if metrics.ENABLED:
+                                record_sent(realtime_data["type"], message, polled_at)
+                            logger.debug(f"Sent update for account {MT5_ACCOUNT}")
+                        await asyncio.sleep(SEND_INTERVAL_SECONDS)
+                finally:
+                    if market_data_task is not None:
+                        market_data_task.cancel()
         except (websockets.exceptions.ConnectionClosed, ConnectionRefusedError) as e:
             logger.warning(f"WebSocket connection lost: {e}. Reconnecting in {RECONNECT_DELAY_SECONDS} seconds...")
+            RECONNECTS.inc(("connection_lost",))
         except Exception as e:
             logger.error(f"An unexpected error occurred: {e}. Reconnecting...")
+            RECONNECTS.inc(("error",))
         
+        CONNECTED.set(0)
         await asyncio.sleep(RECONNECT_DELAY_SECONDS)
 
 if __name__ == "__main__":
     logger.info("Streamer bot starting up...")
-    time.sleep(5)  # تاخیر اولیه
+    if STREAMER_READY_FILE and os.path.exists(STREAMER_READY_FILE):
+        os.remove(STREAMER_READY_FILE)
 
     if not all([MT5_ACCOUNT, MT5_PASSWORD, MT5_SERVER]):
         logger.critical("CRITICAL: MT5 environment variables not set. Exiting.")
         sys.exit(1)
 
+    if STREAM_ENCODING not in ("json", "msgpack") or (STREAM_ENCODING == "msgpack" and msgpack is None):
+        logger.critical(f"CRITICAL: STREAM_ENCODING '{STREAM_ENCODING}' is not supported (msgpack needs the msgpack package). Exiting.")
+        sys.exit(1)
+
     if initialize_mt5():
+        mark_ready()
+        if STREAMER_METRICS_PORT:
+            metrics.start_http_server(STREAMER_METRICS_PORT, profiler_enabled=STREAMER_PROFILER)
         try:
             asyncio.run(stream_data_handler())
         except KeyboardInterrupt:
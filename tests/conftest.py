@@ -0,0 +1,14 @@
+# tests/conftest.py
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# --- Persian: تست‌های واحد ماژول‌های گیت‌وی، استریمر و هاب را مستقیم import می‌کنند؛ ترمینال ساختگی جای MetaTrader5 را می‌گیرد ---
+# --- English: The unit tests import the gateway, streamer and hub modules directly; the fake terminal stands in for MetaTrader5 ---
+for path in ("src", "websocket_hub", os.path.join("tests", "fake_mt5")):
+    sys.path.insert(0, os.path.join(ROOT, path))
+
+os.environ.setdefault("FAKE_MT5_LATENCY", "0")
+os.environ.setdefault("API_KEY", "test-key")
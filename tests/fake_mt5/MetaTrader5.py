@@ -0,0 +1,596 @@
+# tests/fake_mt5/MetaTrader5.py
+
+import os
+import math
+import time
+import random
+import threading
+from datetime import datetime
+from collections import namedtuple
+
+import numpy as np
+
+# --- Persian: یک MetaTrader5 ساختگی برای اجرا روی لینوکس و CI: کافی است این پوشه در PYTHONPATH قبل از بقیه باشد.
+#     چیدمان namedtuple ها و آرایه‌های نامپای مطابق کتابخانه واقعی است و قیمت‌ها از روی ساعت ساخته می‌شوند،
+#     پس دو فراخوانی هم‌زمان (مثلاً symbol_info_tick و copy_ticks_from) با هم سازگارند ---
+# --- English: A fake MetaTrader5 for running on Linux and CI: put this folder first on PYTHONPATH.
+#     Namedtuple and NumPy array layouts match the real library, and prices are derived from the clock,
+#     so concurrent calls (e.g. symbol_info_tick and copy_ticks_from) agree with each other ---
+
+# --- Persian: تاخیر هر فراخوانی ترمینال به ثانیه: مقدار ثابت، به‌علاوه یک مقدار تصادفی تا JITTER، به‌علاوه PER_ITEM برای هر ردیف خروجی ---
+# --- English: Latency of each terminal call in seconds: a fixed part, plus a random part up to JITTER, plus PER_ITEM per returned row ---
+LATENCY = float(os.environ.get("FAKE_MT5_LATENCY", 0.0005))
+LATENCY_JITTER = float(os.environ.get("FAKE_MT5_LATENCY_JITTER", 0.0))
+LATENCY_PER_ITEM = float(os.environ.get("FAKE_MT5_LATENCY_PER_ITEM", 0.0))
+# --- Persian: اندازه داده‌ها: تعداد نمادها، پوزیشن‌های باز، فاصله تیک‌ها (میلی‌ثانیه) و فاصله معاملات تاریخچه (ثانیه) ---
+# --- English: Data sizes: number of symbols, open positions, the tick spacing (ms) and the history deal spacing (seconds) ---
+SYMBOL_COUNT = int(os.environ.get("FAKE_MT5_SYMBOLS", 8))
+POSITION_COUNT = int(os.environ.get("FAKE_MT5_POSITIONS", 20))
+TICK_INTERVAL_MS = int(os.environ.get("FAKE_MT5_TICK_INTERVAL_MS", 250))
+DEAL_INTERVAL_SECONDS = int(os.environ.get("FAKE_MT5_DEAL_INTERVAL", 3600))
+# --- Persian: تعداد initialize های ناموفق اول، برای آزمودن تلاش مجدد در راه‌اندازی ---
+# --- English: Number of initial initialize() failures, to exercise the start-up retries ---
+INIT_FAILURES = int(os.environ.get("FAKE_MT5_INIT_FAILURES", 0))
+
+__version__ = "5.0.45"
+
+# --- Persian: ثابت‌ها با همان مقادیر کتابخانه واقعی ---
+# --- English: Constants with the same values as the real library ---
+TIMEFRAME_M1, TIMEFRAME_M2, TIMEFRAME_M3, TIMEFRAME_M4, TIMEFRAME_M5, TIMEFRAME_M6 = 1, 2, 3, 4, 5, 6
+TIMEFRAME_M10, TIMEFRAME_M12, TIMEFRAME_M15, TIMEFRAME_M20, TIMEFRAME_M30 = 10, 12, 15, 20, 30
+TIMEFRAME_H1, TIMEFRAME_H2, TIMEFRAME_H3, TIMEFRAME_H4 = 0x4001, 0x4002, 0x4003, 0x4004
+TIMEFRAME_H6, TIMEFRAME_H8, TIMEFRAME_H12, TIMEFRAME_D1 = 0x4006, 0x4008, 0x400C, 0x4018
+TIMEFRAME_W1, TIMEFRAME_MN1 = 0x8001, 0xC001
+
+COPY_TICKS_ALL, COPY_TICKS_INFO, COPY_TICKS_TRADE = -1, 1, 2
+TICK_FLAG_BID, TICK_FLAG_ASK, TICK_FLAG_LAST, TICK_FLAG_VOLUME, TICK_FLAG_BUY, TICK_FLAG_SELL = 2, 4, 8, 16, 32, 64
+
+ORDER_TYPE_BUY, ORDER_TYPE_SELL = 0, 1
+ORDER_TYPE_BUY_LIMIT, ORDER_TYPE_SELL_LIMIT, ORDER_TYPE_BUY_STOP, ORDER_TYPE_SELL_STOP = 2, 3, 4, 5
+ORDER_TYPE_BUY_STOP_LIMIT, ORDER_TYPE_SELL_STOP_LIMIT, ORDER_TYPE_CLOSE_BY = 6, 7, 8
+ORDER_FILLING_FOK, ORDER_FILLING_IOC, ORDER_FILLING_RETURN, ORDER_FILLING_BOC = 0, 1, 2, 3
+ORDER_TIME_GTC, ORDER_TIME_DAY, ORDER_TIME_SPECIFIED, ORDER_TIME_SPECIFIED_DAY = 0, 1, 2, 3
+POSITION_TYPE_BUY, POSITION_TYPE_SELL = 0, 1
+DEAL_TYPE_BUY, DEAL_TYPE_SELL = 0, 1
+DEAL_ENTRY_IN, DEAL_ENTRY_OUT = 0, 1
+BOOK_TYPE_SELL, BOOK_TYPE_BUY = 1, 2
+SYMBOL_FILLING_FOK, SYMBOL_FILLING_IOC = 1, 2
+
+TRADE_ACTION_DEAL, TRADE_ACTION_PENDING, TRADE_ACTION_SLTP = 1, 5, 6
+TRADE_ACTION_MODIFY, TRADE_ACTION_REMOVE, TRADE_ACTION_CLOSE_BY = 7, 8, 10
+
+TRADE_RETCODE_PLACED, TRADE_RETCODE_DONE, TRADE_RETCODE_DONE_PARTIAL = 10008, 10009, 10010
+TRADE_RETCODE_ERROR, TRADE_RETCODE_INVALID, TRADE_RETCODE_INVALID_VOLUME = 10011, 10013, 10014
+TRADE_RETCODE_INVALID_PRICE, TRADE_RETCODE_INVALID_STOPS, TRADE_RETCODE_NO_MONEY = 10015, 10016, 10019
+
+RES_S_OK, RES_E_FAIL, RES_E_INVALID_PARAMS, RES_E_NOT_FOUND = 1, -1, -2, -4
+RES_E_INTERNAL_FAIL_INIT = -10005
+RES_E_NO_IPC_CONNECTION = -10004
+
+# --- Persian: چیدمان فیلدها مطابق خروجی‌های واقعی MetaTrader5 است ---
+# --- English: Field layouts match the real MetaTrader5 result types ---
+TerminalInfo = namedtuple("TerminalInfo", [
+    "community_account", "community_connection", "connected", "dlls_allowed", "trade_allowed",
+    "tradeapi_disabled", "email_enabled", "ftp_enabled", "notifications_enabled", "mqid", "build", "maxbars",
+    "codepage", "ping_last", "community_balance", "retransmission", "company", "name", "language", "path",
+    "data_path", "commondata_path",
+])
+AccountInfo = namedtuple("AccountInfo", [
+    "login", "trade_mode", "leverage", "limit_orders", "margin_so_mode", "trade_allowed", "trade_expert",
+    "margin_mode", "currency_digits", "fifo_close", "balance", "credit", "profit", "equity", "margin",
+    "margin_free", "margin_level", "margin_so_call", "margin_so_so", "margin_initial", "margin_maintenance",
+    "assets", "liabilities", "commission_blocked", "name", "server", "currency", "company",
+])
+SymbolInfo = namedtuple("SymbolInfo", [
+    "custom", "chart_mode", "select", "visible", "session_deals", "session_buy_orders",
+    "session_sell_orders", "volume", "volumehigh", "volumelow", "time", "digits", "spread",
+    "spread_float", "ticks_bookdepth", "trade_calc_mode", "trade_mode", "start_time",
+    "expiration_time", "trade_stops_level", "trade_freeze_level", "trade_exemode", "swap_mode",
+    "swap_rollover3days", "margin_hedged_use_leg", "expiration_mode", "filling_mode", "order_mode",
+    "order_gtc_mode", "option_mode", "option_right", "bid", "bidhigh", "bidlow", "ask", "askhigh",
+    "asklow", "last", "lasthigh", "lastlow", "volume_real", "volumehigh_real", "volumelow_real",
+    "option_strike", "point", "trade_tick_value", "trade_tick_value_profit", "trade_tick_value_loss",
+    "trade_tick_size", "trade_contract_size", "trade_accrued_interest", "trade_face_value",
+    "trade_liquidity_rate", "volume_min", "volume_max", "volume_step", "volume_limit", "swap_long",
+    "swap_short", "margin_initial", "margin_maintenance", "session_volume", "session_turnover",
+    "session_interest", "session_buy_orders_volume", "session_sell_orders_volume", "session_open",
+    "session_close", "session_aw", "session_price_settlement", "session_price_limit_min",
+    "session_price_limit_max", "margin_hedged", "price_change", "price_volatility",
+    "price_theoretical", "price_greeks_delta", "price_greeks_theta", "price_greeks_gamma",
+    "price_greeks_vega", "price_greeks_rho", "price_greeks_omega", "price_sensitivity", "basis",
+    "category", "currency_base", "currency_profit", "currency_margin", "bank", "description",
+    "exchange", "formula", "isin", "name", "page", "path",
+])
+Tick = namedtuple("Tick", ["time", "bid", "ask", "last", "volume", "time_msc", "flags", "volume_real"])
+BookInfo = namedtuple("BookInfo", ["type", "price", "volume", "volume_dbl"])
+TradePosition = namedtuple("TradePosition", [
+    "ticket", "time", "time_msc", "time_update", "time_update_msc", "type", "magic", "identifier", "reason",
+    "volume", "price_open", "sl", "tp", "price_current", "swap", "profit", "symbol", "comment", "external_id",
+])
+TradeOrder = namedtuple("TradeOrder", [
+    "ticket", "time_setup", "time_setup_msc", "time_done", "time_done_msc", "time_expiration", "type",
+    "type_time", "type_filling", "state", "magic", "position_id", "position_by_id", "reason", "volume_initial",
+    "volume_current", "price_open", "sl", "tp", "price_current", "price_stoplimit", "symbol", "comment",
+    "external_id",
+])
+TradeDeal = namedtuple("TradeDeal", [
+    "ticket", "order", "time", "time_msc", "type", "entry", "magic", "position_id", "reason",
+    "volume", "price", "commission", "swap", "profit", "fee", "symbol", "comment", "external_id",
+])
+TradeRequest = namedtuple("TradeRequest", [
+    "action", "magic", "order", "symbol", "volume", "price", "stoplimit", "sl", "tp", "deviation", "type",
+    "type_filling", "type_time", "expiration", "comment", "position", "position_by",
+])
+OrderSendResult = namedtuple("OrderSendResult", [
+    "retcode", "deal", "order", "volume", "price", "bid", "ask", "comment", "request_id", "retcode_external",
+    "request",
+])
+OrderCheckResult = namedtuple("OrderCheckResult", [
+    "retcode", "balance", "equity", "profit", "margin", "margin_free", "margin_level", "comment", "request",
+])
+
+RATES_DTYPE = np.dtype([
+    ("time", "<i8"), ("open", "<f8"), ("high", "<f8"), ("low", "<f8"), ("close", "<f8"),
+    ("tick_volume", "<u8"), ("spread", "<i4"), ("real_volume", "<u8"),
+])
+TICKS_DTYPE = np.dtype([
+    ("time", "<i8"), ("bid", "<f8"), ("ask", "<f8"), ("last", "<f8"), ("volume", "<u8"),
+    ("time_msc", "<i8"), ("flags", "<u4"), ("volume_real", "<f8"),
+])
+
+# --- Persian: نمادهای اول با قیمت پایه، رقم اعشار و اندازه قرارداد واقعی؛ بقیه SYM00008 و ... هستند ---
+# --- English: The first symbols have a realistic base price, digits and contract size; the rest are SYM00008 and so on ---
+_KNOWN_SYMBOLS = [
+    ("EURUSD", 1.085, 5, 100000), ("GBPUSD", 1.27, 5, 100000), ("USDJPY", 149.5, 3, 100000),
+    ("XAUUSD", 2350.0, 2, 100), ("US30", 39000.0, 1, 1), ("BTCUSD", 64000.0, 2, 1),
+    ("AUDUSD", 0.66, 5, 100000), ("USDCHF", 0.9, 5, 100000),
+]
+_ACCOUNT_LOGIN = 12345678
+_BALANCE = 100000.0
+_LEVERAGE = 100
+
+_state = {"initialized": False, "init_failures": INIT_FAILURES, "last_error": (RES_S_OK, "Success"),
+          "next_ticket": 900000000, "books": set()}
+# --- Persian: ترمینال واقعی فراخوانی‌ها را یکی‌یکی پاسخ می‌دهد؛ قفل همین صف را شبیه‌سازی می‌کند ---
+# --- English: The real terminal answers calls one at a time; the lock reproduces that queue ---
+_CALL_LOCK = threading.Lock()
+_random = random.Random()
+
+
+def _terminal_call(needs_connection=True):
+    """
+    Persian: تاخیر پیکربندی‌شده را اعمال می‌کند و مثل کتابخانه واقعی بدون initialize مقدار None برمی‌گرداند.
+    English: Applies the configured latency and, like the real library, returns None before initialize().
+    """
+    def decorator(func):
+        def wrapper(*args, **kwargs):
+            with _CALL_LOCK:
+                if needs_connection and not _state["initialized"]:
+                    _state["last_error"] = (RES_E_NO_IPC_CONNECTION, "No IPC connection")
+                    return None
+                result = func(*args, **kwargs)
+                delay = LATENCY
+                if LATENCY_JITTER:
+                    delay += _random.uniform(0, LATENCY_JITTER)
+                if LATENCY_PER_ITEM and isinstance(result, (tuple, np.ndarray)):
+                    delay += LATENCY_PER_ITEM * len(result)
+                if delay > 0:
+                    time.sleep(delay)
+                # --- Persian: خطای ثبت شده توسط _fail نباید با Success بازنویسی شود ---
+                # --- English: An error recorded by _fail must not be overwritten with Success ---
+                if result is not None:
+                    _state["last_error"] = (RES_S_OK, "Success")
+                return result
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+        return wrapper
+    return decorator
+
+def _fail(code, message):
+    _state["last_error"] = (code, message)
+    return None
+
+def _timestamp(value):
+    if isinstance(value, datetime):
+        return int(value.timestamp())
+    return int(value)
+
+def _now_msc():
+    return int(time.time() * 1000)
+
+
+# --- Persian: نمادها و قیمت‌ها ---
+# --- English: Symbols and prices ---
+_SYMBOLS = {}
+
+def _symbols():
+    if len(_SYMBOLS) != SYMBOL_COUNT:
+        _SYMBOLS.clear()
+        for index in range(SYMBOL_COUNT):
+            if index < len(_KNOWN_SYMBOLS):
+                name, base, digits, contract_size = _KNOWN_SYMBOLS[index]
+            else:
+                name, base, digits, contract_size = f"SYM{index:05d}", 10.0 + index % 90, 4, 1000
+            _SYMBOLS[name] = {"index": index, "base": base, "digits": digits, "point": 10.0 ** -digits,
+                              "contract_size": contract_size}
+    return _SYMBOLS
+
+def _mid_prices(symbol, time_msc):
+    """
+    Persian: قیمت میانی یک نماد در زمان‌های داده‌شده (آرایه میلی‌ثانیه): یک موج آرام به‌علاوه نویز ثابت برای هر تیک.
+    English: A symbol's mid price at the given times (an array of ms): a slow wave plus fixed per-tick noise.
+    """
+    info = _symbols()[symbol]
+    tick_number = time_msc // TICK_INTERVAL_MS
+    noise = np.modf(np.abs(np.sin(tick_number * 12.9898 + info["index"] * 78.233)) * 43758.5453)[0] - 0.5
+    wave = np.sin(time_msc / 3.6e6 * 2 * math.pi + info["index"])
+    return np.round(info["base"] * (1 + 0.002 * wave + 0.0002 * noise), info["digits"])
+
+def _mid_price(symbol, time_msc):
+    # --- Persian: همان _mid_prices برای یک زمان، بدون هزینه ساختن آرایه ---
+    # --- English: The same as _mid_prices for a single time, without the cost of building an array ---
+    info = _symbols()[symbol]
+    tick_number = time_msc // TICK_INTERVAL_MS
+    noise = math.modf(abs(math.sin(tick_number * 12.9898 + info["index"] * 78.233)) * 43758.5453)[0] - 0.5
+    wave = math.sin(time_msc / 3.6e6 * 2 * math.pi + info["index"])
+    return round(info["base"] * (1 + 0.002 * wave + 0.0002 * noise), info["digits"])
+
+def _spread(symbol):
+    info = _symbols()[symbol]
+    return round(10 * info["point"], info["digits"])
+
+def _tick_times(start_msc, end_msc):
+    first = -(-start_msc // TICK_INTERVAL_MS) * TICK_INTERVAL_MS
+    return np.arange(first, end_msc + 1, TICK_INTERVAL_MS, dtype="<i8")
+
+def _tick_array(symbol, times):
+    ticks = np.zeros(len(times), dtype=TICKS_DTYPE)
+    bids = _mid_prices(symbol, times)
+    ticks["time_msc"] = times
+    ticks["time"] = times // 1000
+    ticks["bid"] = bids
+    ticks["ask"] = bids + _spread(symbol)
+    ticks["volume"] = 1 + times // TICK_INTERVAL_MS % 5
+    ticks["volume_real"] = ticks["volume"]
+    ticks["flags"] = TICK_FLAG_BID | TICK_FLAG_ASK
+    return ticks
+
+def _last_tick(symbol):
+    time_msc = _now_msc() // TICK_INTERVAL_MS * TICK_INTERVAL_MS
+    bid = _mid_price(symbol, time_msc)
+    ask = round(bid + _spread(symbol), _symbols()[symbol]["digits"])
+    return Tick(time_msc // 1000, bid, ask, 0.0, 1, time_msc, TICK_FLAG_BID | TICK_FLAG_ASK, 1.0)
+
+def _symbol_info(symbol):
+    info = _symbols()[symbol]
+    tick = _last_tick(symbol)
+    values = dict.fromkeys(SymbolInfo._fields, 0)
+    values.update(
+        custom=False, select=True, visible=True, spread_float=True, time=tick.time, digits=info["digits"],
+        spread=10, ticks_bookdepth=10, trade_mode=4, trade_exemode=2, filling_mode=SYMBOL_FILLING_FOK | SYMBOL_FILLING_IOC,
+        expiration_mode=15, order_mode=127, bid=tick.bid, bidhigh=tick.bid, bidlow=tick.bid, ask=tick.ask,
+        askhigh=tick.ask, asklow=tick.ask, last=0.0, lasthigh=0.0, lastlow=0.0, volume_real=0.0, volumehigh_real=0.0,
+        volumelow_real=0.0, option_strike=0.0, point=info["point"], trade_tick_value=1.0,
+        trade_tick_value_profit=1.0, trade_tick_value_loss=1.0, trade_tick_size=info["point"],
+        trade_contract_size=float(info["contract_size"]), trade_accrued_interest=0.0, trade_face_value=0.0,
+        trade_liquidity_rate=0.0, volume_min=0.01, volume_max=100.0, volume_step=0.01, volume_limit=0.0,
+        swap_long=-6.5, swap_short=1.2, margin_initial=0.0, margin_maintenance=0.0, session_volume=0.0,
+        session_turnover=0.0, session_interest=0.0, session_buy_orders_volume=0.0, session_sell_orders_volume=0.0,
+        session_open=tick.bid, session_close=tick.bid, session_aw=0.0, session_price_settlement=0.0,
+        session_price_limit_min=0.0, session_price_limit_max=0.0, margin_hedged=float(info["contract_size"]) / 2,
+        price_change=0.0, price_volatility=0.0, price_theoretical=0.0, price_greeks_delta=0.0,
+        price_greeks_theta=0.0, price_greeks_gamma=0.0, price_greeks_vega=0.0, price_greeks_rho=0.0,
+        price_greeks_omega=0.0, price_sensitivity=0.0, basis="", category="", currency_base=symbol[:3],
+        currency_profit=symbol[3:6] or "USD", currency_margin=symbol[:3], bank="", description=f"{symbol} (fake)",
+        exchange="", formula="", isin="", name=symbol, page="", path=f"Fake\\{symbol}",
+    )
+    return SymbolInfo(**values)
+
+
+# --- Persian: حساب و پوزیشن‌ها؛ پوزیشن‌ها ثابت‌اند و فقط قیمت و سودشان با بازار تغییر می‌کند.
+#     مثل trade_tick_value در symbol_info، هر point برای یک لات یک دلار و مارجین هر لات 1000 دلار است ---
+# --- English: Account and positions; the positions are fixed and only their price and profit follow the market.
+#     As with trade_tick_value in symbol_info, one point is worth one dollar per lot, and each lot takes 1000 dollars of margin ---
+_MARGIN_PER_LOT = 1000.0
+
+def _positions():
+    symbols = list(_symbols())[:POSITION_COUNT]
+    ticks = {symbol: _last_tick(symbol) for symbol in symbols}
+    opened = 1757000000
+    positions = []
+    for k in range(POSITION_COUNT):
+        symbol = symbols[k % len(symbols)]
+        info = _symbols()[symbol]
+        tick = ticks[symbol]
+        position_type = POSITION_TYPE_BUY if k % 2 == 0 else POSITION_TYPE_SELL
+        volume = (0.01, 0.1, 0.5, 1.0)[k % 4]
+        price_open = round(info["base"] * (1 + (k % 7 - 3) * 0.0005), info["digits"])
+        price_current = tick.bid if position_type == POSITION_TYPE_BUY else tick.ask
+        direction = 1 if position_type == POSITION_TYPE_BUY else -1
+        profit = round((price_current - price_open) / info["point"] * direction * volume, 2)
+        positions.append(TradePosition(
+            ticket=700000000 + k, time=opened - k * 60, time_msc=(opened - k * 60) * 1000, time_update=tick.time,
+            time_update_msc=tick.time_msc, type=position_type, magic=123456, identifier=700000000 + k, reason=3,
+            volume=volume, price_open=price_open, sl=0.0, tp=0.0, price_current=price_current, swap=-0.35,
+            profit=profit, symbol=symbol, comment="Sent via API Gateway", external_id="",
+        ))
+    return positions
+
+def _account(positions):
+    profit = round(sum(p.profit for p in positions), 2)
+    margin = round(sum(p.volume for p in positions) * _MARGIN_PER_LOT, 2)
+    equity = round(_BALANCE + profit, 2)
+    return AccountInfo(
+        login=_ACCOUNT_LOGIN, trade_mode=0, leverage=_LEVERAGE, limit_orders=200, margin_so_mode=0,
+        trade_allowed=True, trade_expert=True, margin_mode=2, currency_digits=2, fifo_close=False,
+        balance=_BALANCE, credit=0.0, profit=profit, equity=equity, margin=margin,
+        margin_free=round(equity - margin, 2), margin_level=round(equity / margin * 100, 2) if margin else 0.0,
+        margin_so_call=50.0, margin_so_so=30.0, margin_initial=0.0, margin_maintenance=0.0, assets=0.0,
+        liabilities=0.0, commission_blocked=0.0, name="Fake Account", server="Fake-Server", currency="USD",
+        company="Fake Broker Ltd",
+    )
+
+
+# --- Persian: مدیریت اتصال ---
+# --- English: Connection management ---
+def initialize(path=None, login=None, password=None, server=None, timeout=None, portable=False):
+    with _CALL_LOCK:
+        if _state["init_failures"] > 0:
+            _state["init_failures"] -= 1
+            _fail(RES_E_INTERNAL_FAIL_INIT, "Terminal: Call failed")
+            return False
+        _state["initialized"] = True
+        _state["last_error"] = (RES_S_OK, "Success")
+        return True
+
+def login(login, password=None, server=None, timeout=None):
+    return initialize()
+
+def shutdown():
+    _state["initialized"] = False
+    return True
+
+def last_error():
+    return _state["last_error"]
+
+def version():
+    return (500, 4620, "20 Sep 2024")
+
+@_terminal_call()
+def terminal_info():
+    return TerminalInfo(
+        community_account=False, community_connection=False, connected=True, dlls_allowed=False,
+        trade_allowed=True, tradeapi_disabled=False, email_enabled=False, ftp_enabled=False,
+        notifications_enabled=False, mqid=False, build=4620, maxbars=100000, codepage=0, ping_last=35000,
+        community_balance=0.0, retransmission=0.0, company="Fake Broker Ltd", name="MetaTrader 5",
+        language="English", path="C:\\Program Files\\meta", data_path="C:\\Program Files\\meta",
+        commondata_path="C:\\Users\\Public\\MetaQuotes\\Terminal\\Common",
+    )
+
+@_terminal_call()
+def account_info():
+    return _account(_positions())
+
+
+# --- Persian: نمادها ---
+# --- English: Symbols ---
+@_terminal_call()
+def symbols_total():
+    return len(_symbols())
+
+@_terminal_call()
+def symbols_get(group=None):
+    return tuple(_symbol_info(symbol) for symbol in _symbols())
+
+@_terminal_call()
+def symbol_info(symbol):
+    if symbol not in _symbols():
+        return _fail(RES_E_NOT_FOUND, "Terminal: Not found")
+    return _symbol_info(symbol)
+
+@_terminal_call()
+def symbol_info_tick(symbol):
+    if symbol not in _symbols():
+        return _fail(RES_E_NOT_FOUND, "Terminal: Not found")
+    return _last_tick(symbol)
+
+@_terminal_call()
+def symbol_select(symbol, enable=True):
+    return symbol in _symbols()
+
+@_terminal_call()
+def market_book_add(symbol):
+    if symbol not in _symbols():
+        return False
+    _state["books"].add(symbol)
+    return True
+
+@_terminal_call()
+def market_book_release(symbol):
+    _state["books"].discard(symbol)
+    return True
+
+@_terminal_call()
+def market_book_get(symbol):
+    if symbol not in _state["books"]:
+        return _fail(RES_E_FAIL, "Terminal: Call failed")
+    tick = _last_tick(symbol)
+    point = _symbols()[symbol]["point"]
+    digits = _symbols()[symbol]["digits"]
+    sells = [BookInfo(BOOK_TYPE_SELL, round(tick.ask + level * point, digits), 5 + level, 5.0 + level)
+             for level in range(4, -1, -1)]
+    buys = [BookInfo(BOOK_TYPE_BUY, round(tick.bid - level * point, digits), 5 + level, 5.0 + level)
+            for level in range(5)]
+    return tuple(sells + buys)
+
+
+# --- Persian: کندل‌ها و تیک‌ها به صورت آرایه ساخت‌یافته نامپای ---
+# --- English: Bars and ticks as NumPy structured arrays ---
+def _bar_seconds(timeframe):
+    if timeframe < 0x4000:
+        return timeframe * 60
+    if timeframe & 0xC000 == 0x4000:
+        return (timeframe & 0x3FFF) * 3600
+    if timeframe == TIMEFRAME_W1:
+        return 7 * 86400
+    return 30 * 86400
+
+def _rates(symbol, timeframe, bar_times):
+    bar_seconds = _bar_seconds(timeframe)
+    opens = _mid_prices(symbol, bar_times * 1000)
+    closes = _mid_prices(symbol, (bar_times + bar_seconds) * 1000 - TICK_INTERVAL_MS)
+    info = _symbols()[symbol]
+    swing = info["base"] * 0.0004
+    rates = np.zeros(len(bar_times), dtype=RATES_DTYPE)
+    rates["time"] = bar_times
+    rates["open"] = opens
+    rates["close"] = closes
+    rates["high"] = np.round(np.maximum(opens, closes) + swing, info["digits"])
+    rates["low"] = np.round(np.minimum(opens, closes) - swing, info["digits"])
+    rates["tick_volume"] = bar_seconds * 1000 // TICK_INTERVAL_MS
+    rates["spread"] = 10
+    return rates
+
+@_terminal_call()
+def copy_rates_range(symbol, timeframe, date_from, date_to):
+    if symbol not in _symbols():
+        return _fail(RES_E_INVALID_PARAMS, "Terminal: Invalid params")
+    bar_seconds = _bar_seconds(timeframe)
+    start = -(-_timestamp(date_from) // bar_seconds) * bar_seconds
+    end = min(_timestamp(date_to), int(time.time()))
+    return _rates(symbol, timeframe, np.arange(start, end + 1, bar_seconds, dtype="<i8"))
+
+@_terminal_call()
+def copy_rates_from(symbol, timeframe, date_from, count):
+    if symbol not in _symbols():
+        return _fail(RES_E_INVALID_PARAMS, "Terminal: Invalid params")
+    bar_seconds = _bar_seconds(timeframe)
+    last = min(_timestamp(date_from), int(time.time())) // bar_seconds * bar_seconds
+    return _rates(symbol, timeframe, np.arange(last - (count - 1) * bar_seconds, last + 1, bar_seconds, dtype="<i8"))
+
+@_terminal_call()
+def copy_rates_from_pos(symbol, timeframe, start_pos, count):
+    if symbol not in _symbols():
+        return _fail(RES_E_INVALID_PARAMS, "Terminal: Invalid params")
+    bar_seconds = _bar_seconds(timeframe)
+    last = int(time.time()) // bar_seconds * bar_seconds - start_pos * bar_seconds
+    return _rates(symbol, timeframe, np.arange(last - (count - 1) * bar_seconds, last + 1, bar_seconds, dtype="<i8"))
+
+@_terminal_call()
+def copy_ticks_from(symbol, date_from, count, flags):
+    if symbol not in _symbols():
+        return _fail(RES_E_INVALID_PARAMS, "Terminal: Invalid params")
+    return _tick_array(symbol, _tick_times(_timestamp(date_from) * 1000, _now_msc())[:count])
+
+@_terminal_call()
+def copy_ticks_range(symbol, date_from, date_to, flags):
+    if symbol not in _symbols():
+        return _fail(RES_E_INVALID_PARAMS, "Terminal: Invalid params")
+    return _tick_array(symbol, _tick_times(_timestamp(date_from) * 1000, min(_timestamp(date_to) * 1000, _now_msc())))
+
+
+# --- Persian: پوزیشن‌ها، سفارش‌ها و تاریخچه ---
+# --- English: Positions, orders and history ---
+@_terminal_call()
+def positions_total():
+    return POSITION_COUNT
+
+@_terminal_call()
+def positions_get(symbol=None, group=None, ticket=None):
+    positions = _positions()
+    if symbol is not None:
+        positions = [p for p in positions if p.symbol == symbol]
+    if ticket is not None:
+        positions = [p for p in positions if p.ticket == ticket]
+    return tuple(positions)
+
+@_terminal_call()
+def orders_total():
+    return 0
+
+@_terminal_call()
+def orders_get(symbol=None, group=None, ticket=None):
+    return ()
+
+@_terminal_call()
+def history_orders_total(date_from, date_to):
+    return 0
+
+@_terminal_call()
+def history_orders_get(date_from=None, date_to=None, group=None, ticket=None, position=None):
+    return ()
+
+def _deal_times(date_from, date_to):
+    start = -(-_timestamp(date_from) // DEAL_INTERVAL_SECONDS) * DEAL_INTERVAL_SECONDS
+    return range(start, min(_timestamp(date_to), int(time.time())) + 1, DEAL_INTERVAL_SECONDS)
+
+@_terminal_call()
+def history_deals_total(date_from, date_to):
+    return len(_deal_times(date_from, date_to))
+
+@_terminal_call()
+def history_deals_get(date_from=None, date_to=None, group=None, ticket=None, position=None):
+    if date_from is None or date_to is None:
+        return ()
+    symbols = list(_symbols())
+    deals = []
+    for deal_time in _deal_times(date_from, date_to):
+        number = deal_time // DEAL_INTERVAL_SECONDS
+        symbol = symbols[number % len(symbols)]
+        entry = number % 2
+        deals.append(TradeDeal(
+            ticket=number, order=number + 1, time=deal_time, time_msc=deal_time * 1000, type=number // 2 % 2,
+            entry=entry, magic=123456, position_id=number - entry, reason=3, volume=(0.01, 0.1, 0.5, 1.0)[number % 4],
+            price=_mid_price(symbol, deal_time * 1000), commission=-0.7, swap=0.0,
+            profit=round((number * 7919 % 20001 - 10000) / 100, 2) if entry == DEAL_ENTRY_OUT else 0.0, fee=0.0,
+            symbol=symbol, comment="Sent via API Gateway", external_id="",
+        ))
+    return tuple(deals)
+
+
+# --- Persian: معاملات: سفارش‌ها بر اساس قیمت لحظه‌ای پذیرفته می‌شوند ولی وضعیت حساب را تغییر نمی‌دهند ---
+# --- English: Trading: orders are accepted at the current price but do not change the account state ---
+def _trade_request(request):
+    values = dict.fromkeys(TradeRequest._fields, 0)
+    values.update(symbol="", price=0.0, stoplimit=0.0, sl=0.0, tp=0.0, volume=0.0, comment="")
+    values.update((key, value) for key, value in request.items() if key in values)
+    return TradeRequest(**values)
+
+def _check(request):
+    symbol = request.get("symbol")
+    if symbol not in _symbols():
+        return TRADE_RETCODE_INVALID, "Invalid request"
+    volume = request.get("volume", 0)
+    if not 0.01 <= volume <= 100.0:
+        return TRADE_RETCODE_INVALID_VOLUME, "Invalid volume"
+    return 0, "Done"
+
+@_terminal_call()
+def order_check(request):
+    retcode, comment = _check(request)
+    account = _account(_positions())
+    margin = 0.0
+    if retcode == 0:
+        margin = round(request["volume"] * _MARGIN_PER_LOT, 2)
+        if margin > account.margin_free:
+            retcode, comment = TRADE_RETCODE_NO_MONEY, "No money"
+    return OrderCheckResult(
+        retcode=retcode, balance=account.balance, equity=account.equity, profit=account.profit,
+        margin=round(account.margin + margin, 2), margin_free=round(account.margin_free - margin, 2),
+        margin_level=account.margin_level, comment=comment, request=_trade_request(request),
+    )
+
+@_terminal_call()
+def order_send(request):
+    retcode, comment = _check(request)
+    if retcode != 0:
+        return OrderSendResult(retcode, 0, 0, 0.0, 0.0, 0.0, 0.0, comment, 0, 0, _trade_request(request))
+    tick = _last_tick(request["symbol"])
+    _state["next_ticket"] += 1
+    ticket = _state["next_ticket"]
+    if request.get("action") == TRADE_ACTION_PENDING:
+        return OrderSendResult(TRADE_RETCODE_PLACED, 0, ticket, request["volume"], 0.0, tick.bid, tick.ask,
+                               "Request executed", ticket, 0, _trade_request(request))
+    price = tick.ask if request.get("type") == ORDER_TYPE_BUY else tick.bid
+    return OrderSendResult(TRADE_RETCODE_DONE, ticket, ticket, request["volume"], price, tick.bid, tick.ask,
+                           "Request executed", ticket, 0, _trade_request(request))
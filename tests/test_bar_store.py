@@ -0,0 +1,120 @@
+# tests/test_bar_store.py
+
+import numpy as np
+import pytest
+
+import MetaTrader5 as mt5
+import api_gateway
+from api_gateway import BarStore, _merge_intervals, _missing_intervals
+
+# --- Persian: یک بازه قدیمی (کاملاً بسته شده) از کندل‌های یک ساعته ---
+# --- English: An old (fully settled) range of hourly bars ---
+SYMBOL = "EURUSD"
+HOUR = 3600
+START = 1700000000 // HOUR * HOUR
+END = START + 48 * HOUR
+
+@pytest.fixture(autouse=True)
+def terminal():
+    mt5.initialize()
+    yield
+    mt5.shutdown()
+
+@pytest.fixture
+def store(tmp_path):
+    return BarStore(str(tmp_path), settle_seconds=0, max_segments=64)
+
+def test_merge_intervals_joins_overlapping_and_adjacent_ranges():
+    assert _merge_intervals([[10, 20], [0, 5], [6, 8], [15, 30], [40, 50]]) == [[0, 8], [10, 30], [40, 50]]
+
+def test_missing_intervals_returns_the_gaps_in_the_coverage():
+    coverage = [[0, 9], [20, 29]]
+    assert _missing_intervals(coverage, 0, 29) == [(10, 19)]
+    assert _missing_intervals(coverage, 5, 40) == [(10, 19), (30, 40)]
+    assert _missing_intervals(coverage, 21, 25) == []
+    assert _missing_intervals([], 3, 7) == [(3, 7)]
+
+def test_dedupe_keeps_the_last_copy_of_each_bar():
+    bars = np.zeros(4, dtype=[("time", "<i8"), ("close", "<f8")])
+    bars["time"] = [30, 10, 20, 10]
+    bars["close"] = [3.0, 1.0, 2.0, 1.5]
+    deduped = BarStore._dedupe(bars)
+    assert deduped["time"].tolist() == [10, 20, 30]
+    assert deduped["close"].tolist() == [1.5, 2.0, 3.0]
+
+def test_second_request_is_served_from_the_store(store):
+    first = store.copy_rates_range(SYMBOL, mt5.TIMEFRAME_H1, START, END)
+    second = store.copy_rates_range(SYMBOL, mt5.TIMEFRAME_H1, START, END)
+    assert np.array_equal(first, mt5.copy_rates_range(SYMBOL, mt5.TIMEFRAME_H1, START, END))
+    assert np.array_equal(first, second)
+    stats = store.stats()
+    assert (stats["misses"], stats["full_hits"]) == (1, 1)
+    assert stats["bars_fetched"] == len(first)
+
+def test_overlapping_requests_merge_coverage_without_duplicating_boundary_bars(store):
+    store.copy_rates_range(SYMBOL, mt5.TIMEFRAME_H1, START, START + 24 * HOUR)
+    # --- Persian: کندل روی مرز START + 24h در هر دو درخواست است ---
+    # --- English: The bar at the START + 24h boundary is part of both requests ---
+    store.copy_rates_range(SYMBOL, mt5.TIMEFRAME_H1, START + 24 * HOUR, END)
+    series = store._series[(SYMBOL, mt5.TIMEFRAME_H1)]
+    assert series["coverage"] == [[START, END]]
+
+    bars = store.copy_rates_range(SYMBOL, mt5.TIMEFRAME_H1, START, END)
+    assert store.stats()["partial_hits"] == 1
+    assert store.stats()["full_hits"] == 1
+    assert len(np.unique(bars["time"])) == len(bars)
+    assert np.array_equal(bars, mt5.copy_rates_range(SYMBOL, mt5.TIMEFRAME_H1, START, END))
+
+def test_gap_between_stored_ranges_is_fetched_alone(store, monkeypatch):
+    store.copy_rates_range(SYMBOL, mt5.TIMEFRAME_H1, START, START + 10 * HOUR)
+    store.copy_rates_range(SYMBOL, mt5.TIMEFRAME_H1, START + 20 * HOUR, END)
+
+    fetched = []
+    real_copy_rates_range = mt5.copy_rates_range
+    def recording_copy_rates_range(symbol, timeframe, date_from, date_to):
+        fetched.append((date_from, date_to))
+        return real_copy_rates_range(symbol, timeframe, date_from, date_to)
+    monkeypatch.setattr(api_gateway.mt5, "copy_rates_range", recording_copy_rates_range)
+
+    bars = store.copy_rates_range(SYMBOL, mt5.TIMEFRAME_H1, START, END)
+    assert fetched == [(START + 10 * HOUR + 1, START + 20 * HOUR - 1)]
+    assert np.array_equal(bars, real_copy_rates_range(SYMBOL, mt5.TIMEFRAME_H1, START, END))
+
+def test_compaction_merges_segments_and_survives_a_reload(tmp_path):
+    store = BarStore(str(tmp_path), settle_seconds=0, max_segments=2)
+    for day in range(4):
+        store.copy_rates_range(SYMBOL, mt5.TIMEFRAME_H1, START + day * 12 * HOUR, START + (day + 1) * 12 * HOUR)
+    series = store._series[(SYMBOL, mt5.TIMEFRAME_H1)]
+    assert len(series["segments"]) <= 2
+
+    reloaded = BarStore(str(tmp_path), settle_seconds=0, max_segments=2)
+    bars = reloaded.copy_rates_range(SYMBOL, mt5.TIMEFRAME_H1, START, END)
+    assert reloaded.stats()["full_hits"] == 1
+    assert np.array_equal(bars, mt5.copy_rates_range(SYMBOL, mt5.TIMEFRAME_H1, START, END))
+
+def test_empty_range_is_fetched_again_once_the_terminal_has_the_history(store, monkeypatch):
+    real_copy_rates_range = mt5.copy_rates_range
+    # --- Persian: ترمینال در حال همگام‌سازی تاریخچه است و هنوز کندلی برنمی‌گرداند ---
+    # --- English: The terminal is still syncing its history and returns no bars yet ---
+    monkeypatch.setattr(api_gateway.mt5, "copy_rates_range",
+                        lambda symbol, timeframe, date_from, date_to: real_copy_rates_range(symbol, timeframe, 0, -1))
+    assert len(store.copy_rates_range(SYMBOL, mt5.TIMEFRAME_H1, START, END)) == 0
+    assert store._series[(SYMBOL, mt5.TIMEFRAME_H1)]["coverage"] == []
+
+    monkeypatch.setattr(api_gateway.mt5, "copy_rates_range", real_copy_rates_range)
+    bars = store.copy_rates_range(SYMBOL, mt5.TIMEFRAME_H1, START, END)
+    assert np.array_equal(bars, real_copy_rates_range(SYMBOL, mt5.TIMEFRAME_H1, START, END))
+
+def test_partial_history_is_only_covered_from_the_first_returned_bar(store, monkeypatch):
+    real_copy_rates_range = mt5.copy_rates_range
+    synced_from = START + 30 * HOUR
+    monkeypatch.setattr(api_gateway.mt5, "copy_rates_range",
+                        lambda symbol, timeframe, date_from, date_to:
+                        real_copy_rates_range(symbol, timeframe, max(date_from, synced_from), date_to))
+    store.copy_rates_range(SYMBOL, mt5.TIMEFRAME_H1, START, END)
+    assert store._series[(SYMBOL, mt5.TIMEFRAME_H1)]["coverage"] == [[synced_from, END]]
+
+    monkeypatch.setattr(api_gateway.mt5, "copy_rates_range", real_copy_rates_range)
+    bars = store.copy_rates_range(SYMBOL, mt5.TIMEFRAME_H1, START, END)
+    assert np.array_equal(bars, real_copy_rates_range(SYMBOL, mt5.TIMEFRAME_H1, START, END))
+    assert store._series[(SYMBOL, mt5.TIMEFRAME_H1)]["coverage"] == [[START, END]]
@@ -0,0 +1,86 @@
+# tests/test_delta_encoding.py
+
+import copy
+
+import pytest
+
+from streamer import DeltaEncoder
+from account_state import AccountState, AccountStateBook
+
+def snapshot(balance=1000.0, positions=None, timestamp=1):
+    positions = [{"ticket": 1, "symbol": "EURUSD", "volume": 0.1, "profit": 1.0}] if positions is None else positions
+    return {
+        "type": "account_update", "account_number": 42, "timestamp": timestamp,
+        "data": {"balance": balance, "equity": balance, "open_trades_count": len(positions),
+                 "open_trades": copy.deepcopy(positions)}
+    }
+
+def test_first_message_is_a_keyframe_and_unchanged_cycles_send_nothing():
+    encoder = DeltaEncoder(keyframe_interval=30)
+    first = encoder.encode(snapshot())
+    assert first["keyframe"] and first["seq"] == 1
+    assert encoder.encode(snapshot()) is None
+
+def test_keyframes_repeat_every_interval():
+    encoder = DeltaEncoder(keyframe_interval=3)
+    messages = [encoder.encode(snapshot(balance=1000.0 + i)) for i in range(7)]
+    assert [bool(m.get("keyframe")) for m in messages] == [True, False, False, True, False, False, True]
+    assert [m["seq"] for m in messages] == list(range(1, 8))
+
+def test_deltas_rebuild_the_streamer_state():
+    encoder = DeltaEncoder(keyframe_interval=100)
+    state = AccountState(42)
+    snapshots = [
+        snapshot(),
+        snapshot(balance=1010.0),
+        snapshot(balance=1010.0, positions=[{"ticket": 1, "symbol": "EURUSD", "volume": 0.1, "profit": 2.5}]),
+        snapshot(balance=1010.0, positions=[{"ticket": 1, "symbol": "EURUSD", "volume": 0.1, "profit": 2.5},
+                                            {"ticket": 2, "symbol": "GBPUSD", "volume": 0.3, "profit": 0.0}]),
+        snapshot(balance=1020.0, positions=[{"ticket": 2, "symbol": "GBPUSD", "volume": 0.3, "profit": -1.0}]),
+    ]
+    for current in snapshots:
+        message = encoder.encode(current)
+        assert state.apply(message)
+        assert state.data == current["data"]
+        assert not state.stale
+    assert state.seq == len(snapshots)
+
+def test_a_sequence_gap_makes_the_state_stale_until_the_next_keyframe():
+    encoder = DeltaEncoder(keyframe_interval=4)
+    state = AccountState(42)
+    assert state.apply(encoder.encode(snapshot(balance=1.0)))
+    encoder.encode(snapshot(balance=2.0))  # --- Persian: این پیام گم می‌شود --- | --- English: This message is lost
+    assert not state.apply(encoder.encode(snapshot(balance=3.0)))
+    assert state.stale
+    # --- Persian: delta بعدی هم روی وضعیت stale اعمال نمی‌شود ---
+    # --- English: The next delta is not applied on top of a stale state either ---
+    assert not state.apply(encoder.encode(snapshot(balance=4.0)))
+    assert state.fields["balance"] == 1.0
+
+    keyframe = encoder.encode(snapshot(balance=5.0))
+    assert keyframe["keyframe"]
+    assert state.apply(keyframe)
+    assert not state.stale and state.fields["balance"] == 5.0
+
+def test_a_change_to_an_unknown_position_makes_the_state_stale():
+    state = AccountState(42)
+    state.apply(dict(snapshot(), seq=1))
+    assert not state.apply({"type": "account_delta", "account_number": 42, "seq": 2, "base_seq": 1,
+                            "data": {"positions_changed": [{"ticket": 99, "profit": 1.0}]}})
+    assert state.stale
+
+@pytest.mark.parametrize("message", [
+    {"type": "account_update", "account_number": 42, "data": None},
+    {"type": "account_update", "account_number": 42, "data": {"open_trades": [{"symbol": "EURUSD"}]}},
+    {"type": "account_delta", "account_number": 42, "seq": 2, "base_seq": 1, "data": {"changed": []}},
+    {"type": "account_delta", "account_number": 42, "seq": 2, "base_seq": 1, "data": {"positions_added": "x"}},
+    {"type": "account_update", "account_number": [42], "data": {}},
+])
+def test_malformed_messages_raise_and_leave_the_state_unchanged(message):
+    book = AccountStateBook()
+    book.apply(dict(snapshot(), seq=1))
+    before = book.accounts[42].snapshot()
+    with pytest.raises(ValueError):
+        book.apply(message)
+    assert book.accounts[42].snapshot() == before
+    assert not book.accounts[42].stale
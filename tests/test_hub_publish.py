@@ -0,0 +1,24 @@
+# tests/test_hub_publish.py
+
+import json
+
+import pytest
+
+import websocket_hub as hub
+
+def malformed(account, outcome):
+    return hub.MALFORMED_MESSAGES._values.get((account, outcome), 0)
+
+@pytest.mark.parametrize("message", ["not json", "[1, 2]", '"account_update"', "null"])
+def test_undecodable_or_non_object_messages_are_dropped_and_counted(message):
+    before, buffered = malformed("900", "dropped"), len(hub.REPLAY_BUFFER)
+    hub.publish("900", message)
+    assert malformed("900", "dropped") == before + 1
+    assert len(hub.REPLAY_BUFFER) == buffered
+
+def test_malformed_account_update_is_forwarded_but_not_cached():
+    before = malformed("901", "not_cached")
+    hub.publish("901", json.dumps({"type": "account_update", "account_number": 901, "data": None}))
+    assert malformed("901", "not_cached") == before + 1
+    assert hub.REPLAY_BUFFER[-1][1:3] == ("901", "account_update")
+    assert "901" not in hub.ACCOUNT_NUMBERS
@@ -0,0 +1,102 @@
+# tests/test_idempotency.py
+
+import time
+
+import pytest
+
+import MetaTrader5 as mt5
+import api_gateway
+from api_gateway import IdempotencyStore, IDEMPOTENCY_HEADER
+
+@pytest.fixture
+def client(monkeypatch):
+    mt5.initialize()
+    monkeypatch.setattr(api_gateway, "IDEMPOTENCY_STORE", IdempotencyStore(ttl=60, max_keys=100))
+    yield api_gateway.app.test_client()
+    mt5.shutdown()
+
+def post_order(client, order, key):
+    return client.post("/order", json=order, headers={"X-API-KEY": api_gateway.API_KEY, IDEMPOTENCY_HEADER: key})
+
+def test_retry_gets_the_same_entry():
+    store = IdempotencyStore(ttl=60, max_keys=10)
+    entry, is_new = store.begin("key-1", "order-a")
+    assert is_new
+    store.finish("key-1", entry, (b'{"status":"success"}', 200))
+
+    replayed, is_new = store.begin("key-1", "order-a")
+    assert not is_new
+    assert replayed is entry
+    assert replayed.done.is_set() and replayed.response == (b'{"status":"success"}', 200)
+    assert store.stats()["replayed"] == 1
+
+def test_key_reused_with_another_request_is_rejected():
+    store = IdempotencyStore(ttl=60, max_keys=10)
+    store.begin("key-1", "order-a")
+    with pytest.raises(ValueError):
+        store.begin("key-1", "order-b")
+    assert store.stats()["conflicts"] == 1
+
+def test_abandoned_request_runs_again_on_retry():
+    store = IdempotencyStore(ttl=60, max_keys=10)
+    entry, _ = store.begin("key-1", "order-a")
+    store.abandon("key-1", entry)
+    assert entry.done.is_set() and entry.response is None
+    _, is_new = store.begin("key-1", "order-a")
+    assert is_new
+
+def test_keys_expire_and_are_bounded():
+    store = IdempotencyStore(ttl=0.05, max_keys=2)
+    for key in ("a", "b", "c"):
+        entry, _ = store.begin(key, key)
+        store.finish(key, entry, (b"{}", 200))
+    assert store.stats()["keys"] == 2
+    _, is_new = store.begin("a", "a")
+    assert is_new
+    time.sleep(0.1)
+    _, is_new = store.begin("b", "b")
+    assert is_new
+    assert store.stats()["keys"] == 1
+
+def test_keys_in_progress_are_never_evicted():
+    store = IdempotencyStore(ttl=60, max_keys=2)
+    in_progress, _ = store.begin("a", "a")
+    finished, _ = store.begin("b", "b")
+    store.finish("b", finished, (b"{}", 200))
+    store.begin("c", "c")
+    # --- Persian: کلید تمام‌شده b جای خود را به c داد و a هنوز در حال اجراست ---
+    # --- English: The finished key b made room for c, and a is still in progress ---
+    assert store.begin("a", "a") == (in_progress, False)
+    with pytest.raises(IdempotencyStore.Full):
+        store.begin("d", "d")
+    assert store.stats()["rejected"] == 1
+
+def test_retried_order_is_replayed_without_a_second_order_send(client, monkeypatch):
+    sent = []
+    real_order_send = mt5.order_send
+    def counting_order_send(request):
+        sent.append(request)
+        return real_order_send(request)
+    monkeypatch.setattr(api_gateway.mt5, "order_send", counting_order_send)
+
+    order = {"symbol": "EURUSD", "type": "buy", "volume": 0.1}
+    first = post_order(client, order, "retry-1")
+    second = post_order(client, order, "retry-1")
+    assert first.status_code == second.status_code == 200
+    assert len(sent) == 1
+    assert second.headers.get("Idempotent-Replayed") == "true"
+    assert second.get_data() == first.get_data()
+
+    conflict = post_order(client, dict(order, volume=0.2), "retry-1")
+    assert conflict.status_code == 422
+    assert len(sent) == 1
+
+@pytest.mark.parametrize("check", ["false", 0, None])
+def test_non_boolean_check_is_rejected_before_the_terminal(client, check):
+    order = {"symbol": "EURUSD", "type": "buy", "volume": 0.1, "check": check}
+    response = post_order(client, order, f"check-{check!r}")
+    assert response.status_code == 400
+    assert "'check'" in response.get_json()["message"]
+    # --- Persian: درخواست رد شده ذخیره نمی‌شود ---
+    # --- English: The rejected request is not stored ---
+    assert api_gateway.IDEMPOTENCY_STORE.stats()["keys"] == 0
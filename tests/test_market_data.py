@@ -0,0 +1,25 @@
+# tests/test_market_data.py
+
+from types import SimpleNamespace
+
+import MetaTrader5 as mt5
+import streamer
+from streamer import MarketDataCollector
+
+def test_a_quote_that_moves_away_and_back_is_sent_again(monkeypatch):
+    mt5.initialize()
+    collector = MarketDataCollector(["EURUSD"], with_ticks=False, with_depth=False)
+    mt5.shutdown()
+    ticks = iter([(1000, 1.1), (1000, 1.1), (3000, 1.1)])
+    def symbol_info_tick(symbol):
+        time_msc, bid = next(ticks)
+        return SimpleNamespace(time_msc=time_msc, bid=bid, ask=bid + 0.0001, last=0.0, volume_real=1.0)
+    monkeypatch.setattr(streamer.mt5, "symbol_info_tick", symbol_info_tick)
+
+    assert collector.collect()["data"]["EURUSD"]["time_msc"] == 1000
+    # --- Persian: همان تیک در بررسی بعدی دوباره فرستاده نمی‌شود ---
+    # --- English: The same tick is not sent again on the next poll ---
+    assert collector.collect() is None
+    # --- Persian: قیمت بین دو بررسی تغییر کرده و برگشته؛ تیک جدید است ---
+    # --- English: The price moved and came back between polls; it is a new tick ---
+    assert collector.collect()["data"]["EURUSD"]["time_msc"] == 3000
@@ -0,0 +1,52 @@
+# tests/test_metrics.py
+
+import metrics
+
+def test_counter_renders_one_sample_per_label_set():
+    registry = metrics.Registry()
+    calls = metrics.Counter("calls_total", "Calls by function.", ("function",), registry=registry)
+    calls.inc(("account_info",))
+    calls.inc(("account_info",), amount=2)
+    calls.inc(("symbol_info_tick",))
+    assert registry.render() == (
+        "# HELP calls_total Calls by function.\n"
+        "# TYPE calls_total counter\n"
+        'calls_total{function="account_info"} 3\n'
+        'calls_total{function="symbol_info_tick"} 1\n'
+    )
+
+def test_histogram_buckets_are_cumulative_with_sum_and_count():
+    registry = metrics.Registry()
+    latency = metrics.Histogram("latency_seconds", "Latency.", buckets=(0.1, 1), registry=registry)
+    for value in (0.05, 0.1, 0.5, 2.0):
+        latency.observe(value)
+    lines = registry.render().splitlines()
+    assert lines[1] == "# TYPE latency_seconds histogram"
+    # --- Persian: مرز هر بازه شامل خودش است (le) ---
+    # --- English: Each bucket includes its own bound (le) ---
+    assert lines[2:] == [
+        'latency_seconds_bucket{le="0.1"} 2',
+        'latency_seconds_bucket{le="1"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+        "latency_seconds_sum 2.65",
+        "latency_seconds_count 4",
+    ]
+
+def test_gauge_callback_and_label_escaping():
+    registry = metrics.Registry()
+    metrics.Gauge("queue_depth", "Queue depth.", callback=lambda: 7, registry=registry)
+    status = metrics.Gauge("status", "Status.", ("reason",), registry=registry)
+    status.set(1, ('say "hi"\nnow',))
+    status.dec(('say "hi"\nnow',))
+    text = registry.render()
+    assert "queue_depth 7\n" in text
+    assert 'status{reason="say \\"hi\\"\\nnow"} 0\n' in text
+
+def test_render_merges_samples_of_the_same_family_from_several_workers():
+    first, second = metrics.Registry(), metrics.Registry()
+    metrics.Counter("messages_total", "Messages.", ("worker",), registry=first).inc(("1",))
+    metrics.Counter("messages_total", "Messages.", ("worker",), registry=second).inc(("2",), amount=5)
+    text = metrics.render(first.collect(), second.collect())
+    assert text.count("# TYPE messages_total counter") == 1
+    assert 'messages_total{worker="1"} 1\n' in text
+    assert 'messages_total{worker="2"} 5\n' in text
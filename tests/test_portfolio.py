@@ -0,0 +1,94 @@
+# tests/test_portfolio.py
+
+import pytest
+
+from portfolio import PortfolioAggregator
+
+def fields(balance=1000.0, margin=100.0):
+    # --- Persian: مانند MT5، سطح مارجین از equity و margin به دست می‌آید ---
+    # --- English: As in MT5, the margin level follows from equity and margin ---
+    return {"balance": balance, "equity": balance, "profit": 0.0, "margin": margin,
+            "margin_free": balance - margin, "margin_level": balance / margin * 100 if margin else 0.0}
+
+def position(symbol="EURUSD", side="BUY", volume=1.0):
+    return {"symbol": symbol, "type": side, "volume": volume}
+
+def test_totals_and_exposure_follow_each_account_update():
+    portfolio = PortfolioAggregator()
+    portfolio.update("1", 1, fields(balance=1000.0), [position(volume=1.0)])
+    portfolio.update("2", 2, fields(balance=500.0), [position(side="SELL", volume=0.4)])
+    portfolio.update("1", 1, fields(balance=1200.0), [position(volume=2.0), position("GBPUSD")])
+
+    snapshot = portfolio.snapshot()
+    assert snapshot["accounts"] == 2
+    assert snapshot["balance"] == 1700.0
+    assert snapshot["exposure"]["EURUSD"] == {"long": 2.0, "short": 0.4, "net": 1.6, "positions": 2}
+    assert snapshot["exposure"]["GBPUSD"]["positions"] == 1
+
+def test_remove_takes_the_account_out_of_the_totals():
+    portfolio = PortfolioAggregator()
+    portfolio.update("1", 1, fields(balance=1000.0), [position("GBPUSD")])
+    portfolio.update("2", 2, fields(balance=500.0), [position()])
+    portfolio.dirty = False
+
+    portfolio.remove("1")
+    snapshot = portfolio.snapshot()
+    assert portfolio.dirty
+    assert snapshot["accounts"] == 1
+    assert snapshot["balance"] == 500.0
+    assert list(snapshot["exposure"]) == ["EURUSD"]
+    assert snapshot["worst_margin_level"]["account_number"] == 2
+
+    # --- Persian: حذف دوباره یا حذف حساب ناشناخته کاری نمی‌کند ---
+    # --- English: Removing it again, or an unknown account, does nothing ---
+    portfolio.dirty = False
+    portfolio.remove("1")
+    portfolio.remove("unknown")
+    assert not portfolio.dirty
+
+def test_unchanged_update_does_not_mark_the_aggregate_dirty():
+    portfolio = PortfolioAggregator()
+    portfolio.update("1", 1, fields(), [position()])
+    portfolio.dirty = False
+    portfolio.update("1", 1, fields(), [position()])
+    assert not portfolio.dirty
+
+def test_worst_margin_level_skips_outdated_heap_entries():
+    portfolio = PortfolioAggregator()
+    portfolio.update("1", 1, fields(balance=150.0), [])
+    portfolio.update("2", 2, fields(balance=300.0), [])
+    assert portfolio.worst_margin_level() == ("1", 150.0)
+
+    # --- Persian: ورودی قدیمی حساب ۱ هنوز در heap است اما دیگر جاری نیست ---
+    # --- English: Account 1's old entry is still in the heap, but no longer current ---
+    portfolio.update("1", 1, fields(balance=500.0), [])
+    assert portfolio.worst_margin_level() == ("2", 300.0)
+
+    portfolio.remove("2")
+    assert portfolio.worst_margin_level() == ("1", 500.0)
+
+    # --- Persian: حساب بدون مارجین مصرف‌شده در خطر نیست و شمرده نمی‌شود ---
+    # --- English: An account without used margin is not at risk and is not counted ---
+    portfolio.update("1", 1, fields(margin=0.0), [])
+    assert portfolio.worst_margin_level() is None
+
+def test_heap_stays_bounded_under_many_updates():
+    portfolio = PortfolioAggregator()
+    for i in range(10000):
+        account = str(i % 5)
+        portfolio.update(account, int(account), fields(balance=100.0 + i), [])
+    assert len(portfolio._margin_levels) <= 2 * len(portfolio.contributions) + 64 + 1
+    assert portfolio.worst_margin_level() == ("0", 100.0 + 9995)
+
+@pytest.mark.parametrize("updates", [1, 3])
+def test_totals_do_not_drift_after_removing_every_account(updates):
+    portfolio = PortfolioAggregator()
+    for account in range(3):
+        for i in range(updates):
+            portfolio.update(str(account), account, fields(balance=0.1 * (account + i)), [position(volume=0.1)])
+    for account in range(3):
+        portfolio.remove(str(account))
+    snapshot = portfolio.snapshot()
+    assert snapshot["accounts"] == 0
+    assert snapshot["balance"] == 0.0
+    assert snapshot["exposure"] == {}
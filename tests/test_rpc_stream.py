@@ -0,0 +1,25 @@
+# tests/test_rpc_stream.py
+
+import json
+
+import MetaTrader5 as mt5
+import api_gateway
+
+def test_failed_window_reports_the_error_of_its_own_call(monkeypatch):
+    mt5.initialize()
+    def failing_copy_ticks_range(symbol, date_from, date_to, flags):
+        mt5._state["last_error"] = (mt5.RES_E_INVALID_PARAMS, "Invalid params")
+        # --- Persian: یک سفارش در صف، پیش از هر خواندن جداگانه، خطای آخر را عوض می‌کند ---
+        # --- English: A queued trade changes the last error before any separate read could run ---
+        api_gateway.MT5_EXECUTOR.submit(mt5._state.__setitem__, "last_error", (mt5.RES_S_OK, "Success"),
+                                        priority=api_gateway.PRIORITY_TRADE)
+        return None
+    monkeypatch.setattr(api_gateway.mt5, "copy_ticks_range", failing_copy_ticks_range)
+
+    client = api_gateway.app.test_client()
+    response = client.post("/rpc/stream", headers={"X-API-KEY": api_gateway.API_KEY}, json={
+        "function_name": "copy_ticks_range", "args": ["EURUSD", 1700000000, 1700003600, mt5.COPY_TICKS_ALL]})
+    trailer = json.loads(response.get_data().splitlines()[-1])
+    mt5.shutdown()
+    assert trailer["status"] == "error"
+    assert trailer["mt5_last_error"] == str((mt5.RES_E_INVALID_PARAMS, "Invalid params"))
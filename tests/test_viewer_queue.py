@@ -0,0 +1,104 @@
+# tests/test_viewer_queue.py
+
+import asyncio
+
+import pytest
+
+from viewer_queue import ViewerQueue
+
+class SlowViewer:
+    """
+    Persian: جایگزین اتصال یک بیننده کند: بافر نوشتن همیشه پر است و send تا باز شدن دریچه منتظر می‌ماند.
+    English: Stands in for a slow viewer's connection: its write buffer is always full and send waits until the gate opens.
+    """
+
+    def __init__(self):
+        self.transport = self
+        self.sent = []
+        self.closed_with = None
+        self.gate = asyncio.Event()
+
+    def get_write_buffer_size(self):
+        return 1 << 30
+
+    async def send(self, message):
+        await self.gate.wait()
+        self.sent.append(message)
+
+    async def close(self, code=1000, reason=""):
+        self.closed_with = code
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+def test_conflate_keeps_only_the_newest_message_per_key():
+    async def scenario():
+        viewer = SlowViewer()
+        queue = ViewerQueue(viewer, policy="conflate", max_pending=10)
+        for i in range(5):
+            queue.push(("1", "account_update"), f"update-{i}")
+        queue.push(("1", "market_data"), "tick")
+        queue.push(("1", "account_update"), "update-5")
+        assert list(queue.pending.values()) == ["update-5", "tick"]
+        assert queue.counters["conflated"] == 5
+
+        viewer.gate.set()
+        await asyncio.sleep(0.01)
+        queue.close()
+        return viewer.sent
+    assert run(scenario()) == ["update-5", "tick"]
+
+def test_conflated_value_replaces_a_pending_delta():
+    async def scenario():
+        queue = ViewerQueue(SlowViewer(), policy="conflate", max_pending=10)
+        queue.push(("1", "account_delta"), "delta-1")
+        queue.push(("1", "account_delta"), "delta-2", conflated="snapshot")
+        pending = list(queue.pending.values())
+        queue.close()
+        return pending
+    assert run(scenario()) == ["snapshot"]
+
+def test_conflate_drops_the_oldest_key_when_full():
+    async def scenario():
+        queue = ViewerQueue(SlowViewer(), policy="conflate", max_pending=2)
+        for account in ("1", "2", "3"):
+            queue.push((account, "account_update"), account)
+        pending = list(queue.pending.values())
+        dropped = queue.counters["dropped"]
+        queue.close()
+        return pending, dropped
+    assert run(scenario()) == (["2", "3"], 1)
+
+def test_drop_policy_rejects_new_messages_while_full():
+    async def scenario():
+        queue = ViewerQueue(SlowViewer(), policy="drop", max_pending=2)
+        results = [queue.push(("1", "account_update"), str(i)) for i in range(4)]
+        pending = list(queue.pending.values())
+        queue.close()
+        return results, pending
+    assert run(scenario()) == ([True, True, False, False], ["0", "1"])
+
+def test_disconnect_policy_closes_the_viewer_when_full():
+    async def scenario():
+        viewer = SlowViewer()
+        queue = ViewerQueue(viewer, policy="disconnect", max_pending=1)
+        queue.push(("1", "account_update"), "0")
+        assert not queue.push(("1", "account_update"), "1")
+        await asyncio.sleep(0)
+        return queue.closed, viewer.closed_with
+    assert run(scenario()) == (True, 1013)
+
+def test_callables_are_rendered_with_the_viewer_encoding_when_sent():
+    async def scenario():
+        viewer = SlowViewer()
+        queue = ViewerQueue(viewer, policy="conflate", max_pending=10, encoding="msgpack")
+        queue.push(("1", "account_update"), lambda encoding: f"rendered-{encoding}")
+        viewer.gate.set()
+        await asyncio.sleep(0.01)
+        queue.close()
+        return viewer.sent
+    assert run(scenario()) == ["rendered-msgpack"]
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        ViewerQueue(SlowViewer(), policy="block")
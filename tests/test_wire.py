@@ -0,0 +1,32 @@
+# tests/test_wire.py
+
+import json
+
+import pytest
+
+import wire
+
+@pytest.mark.parametrize("raw", ['{"type": "account_update", "seq": 3}', "{}", "{ }", ' {\n}', '{"a": {"b": 1}}'])
+@pytest.mark.parametrize("as_bytes", [False, True])
+def test_json_messages_get_a_leading_hub_seq(raw, as_bytes):
+    raw = raw.encode() if as_bytes else raw
+    tagged = wire.with_hub_seq(wire.ENCODING_JSON, raw, 7)
+    assert type(tagged) is type(raw)
+    assert json.loads(tagged) == dict(json.loads(raw), hub_seq=7)
+
+@pytest.mark.parametrize("raw", ['{"hub_seq": 1, "type": "x"}', '{"type": "x", "hub_seq": 1}', b'{"hub_seq":1}'])
+def test_an_existing_hub_seq_is_replaced_not_duplicated(raw):
+    tagged = wire.with_hub_seq(wire.ENCODING_JSON, raw, 7)
+    assert type(tagged) is type(raw)
+    assert json.loads(tagged)["hub_seq"] == 7
+    assert tagged.count('"hub_seq"' if isinstance(tagged, str) else b'"hub_seq"') == 1
+
+@pytest.mark.skipif(wire.msgpack is None, reason="msgpack is not installed")
+@pytest.mark.parametrize("payload", [{}, {"type": "x"}, {str(i): i for i in range(15)}, {"hub_seq": 1, "type": "x"}])
+def test_msgpack_maps_get_a_hub_seq(payload):
+    tagged = wire.with_hub_seq(wire.ENCODING_MSGPACK, wire.encode(wire.ENCODING_MSGPACK, payload), 7)
+    assert wire.decode(wire.ENCODING_MSGPACK, tagged) == dict(payload, hub_seq=7)
+
+@pytest.mark.parametrize("raw", ["[1, 2]", '"hub_seq"', '{"hub_seq": '])
+def test_other_messages_are_left_as_they_are(raw):
+    assert wire.with_hub_seq(wire.ENCODING_JSON, raw, 7) == raw
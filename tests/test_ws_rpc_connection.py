@@ -0,0 +1,68 @@
+# tests/test_ws_rpc_connection.py
+
+import os
+import sys
+import json
+import asyncio
+import websockets
+
+# --- Persian: تنظیمات تست از متغیرهای محیطی خوانده می‌شود ---
+# --- English: Test settings are read from environment variables ---
+WS_RPC_URL = os.environ.get("WS_RPC_URL", "ws://localhost:8081")
+API_KEY = os.environ.get("API_KEY", "") # --- Persian: کلید API باید ست شود --- | --- English: API Key must be set
+
+async def run_ws_rpc_test():
+    """
+    Persian: یک تست ساده برای اطمینان از صحت عملکرد کانال RPC وب‌سوکت.
+    English: A simple test to ensure the WebSocket RPC channel is functioning correctly.
+    """
+    print(f"🧪 --- Running WebSocket RPC test against: {WS_RPC_URL} ---")
+
+    if not API_KEY:
+        print("❌ ERROR: API_KEY environment variable is not set. Cannot run test.")
+        sys.exit(1)
+
+    try:
+        async with websockets.connect(WS_RPC_URL) as websocket:
+            # --- Persian: یک بار احراز هویت برای کل اتصال ---
+            # --- English: Authenticate once for the whole connection ---
+            await websocket.send(json.dumps({"type": "auth", "api_key": API_KEY}))
+            auth_response = json.loads(await websocket.recv())
+            assert auth_response.get("status") == "success", "Authentication failed"
+
+            # --- Persian: چند درخواست پشت سر هم بدون انتظار برای پاسخ ارسال می‌شود ---
+            # --- English: Several requests are sent back to back without waiting for responses ---
+            calls = {
+                1: {"function_name": "account_info"},
+                2: {"function_name": "positions_get"},
+                3: {"function_name": "login"},
+            }
+            for request_id, call in calls.items():
+                await websocket.send(json.dumps(dict(call, id=request_id)))
+
+            responses = {}
+            while len(responses) < len(calls):
+                response = json.loads(await asyncio.wait_for(websocket.recv(), timeout=10))
+                responses[response["id"]] = response
+
+            assert responses[1].get("status") == "success", "account_info did not succeed"
+            assert "login" in responses[1]["data"], "Account data is missing 'login' field"
+            assert responses[2].get("code") == 200, "positions_get did not succeed"
+            assert responses[3].get("code") == 403, "Disallowed function was not rejected"
+
+        print("✅ --- TEST PASSED ---")
+        print(f"Pipelined {len(calls)} calls for login: {responses[1]['data']['login']}")
+
+    except (OSError, websockets.exceptions.InvalidHandshake) as e:
+        print(f"❌ TEST FAILED: Could not connect to the WebSocket RPC channel at {WS_RPC_URL}.")
+        print(f"   Error: {e}")
+        print("   Is the Docker container running and the port correctly mapped?")
+        sys.exit(1)
+    except Exception as e:
+        print(f"❌ TEST FAILED: An unexpected error occurred.")
+        print(f"   Error: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(run_ws_rpc_test())
@@ -0,0 +1,126 @@
+#
+# Account State (viewer library)
+# Rebuilds the full account state from the streamer's delta stream
+# (account_update keyframes + account_delta patches).
+#
+
+def _is_position_list(value):
+    return isinstance(value, list) and all(isinstance(p, dict) and "ticket" in p for p in value)
+
+def validate(message):
+    """
+    Raises ValueError if an account_update or account_delta message does not have the expected shape.
+    It is checked before anything is applied, so a malformed message never leaves a half-updated state.
+    """
+    data = message.get("data")
+    if not isinstance(data, dict):
+        raise ValueError(f"{message.get('type')} has no 'data' object")
+    if message.get("type") == "account_update":
+        if not _is_position_list(data.get("open_trades", [])):
+            raise ValueError("'open_trades' must be a list of positions with a 'ticket'")
+        return
+    if not isinstance(data.get("changed", {}), dict) or not isinstance(data.get("positions_removed", []), list):
+        raise ValueError("'changed' must be an object and 'positions_removed' a list")
+    for key in ("positions_added", "positions_changed"):
+        if not _is_position_list(data.get(key, [])):
+            raise ValueError(f"'{key}' must be a list of positions with a 'ticket'")
+
+
+class AccountState:
+    """
+    The latest known state of one account.
+    `data` has the same shape as the `data` field of a full account_update message.
+    """
+
+    def __init__(self, account_number):
+        self.account_number = account_number
+        self.seq = None
+        self.timestamp = None
+        self.fields = {}
+        self.positions = {}
+        # True while a gap was detected and we are waiting for the next keyframe
+        self.stale = True
+
+    @property
+    def data(self):
+        data = dict(self.fields)
+        data["open_trades"] = list(self.positions.values())
+        return data
+
+    def snapshot(self):
+        """Returns the current state as a full account_update message."""
+        message = {
+            "type": "account_update", "account_number": self.account_number,
+            "timestamp": self.timestamp, "data": self.data
+        }
+        if self.seq is not None:
+            message["seq"] = self.seq
+        return message
+
+    def apply(self, message):
+        """
+        Applies an account_update or account_delta message.
+        Returns True if the state is now current, False if the message could not be applied
+        because of a sequence gap (the state stays stale until the next keyframe).
+        Raises ValueError for a malformed message; the state is then left unchanged.
+        """
+        message_type = message.get("type")
+        if message_type in ("account_update", "account_delta"):
+            validate(message)
+        if message_type == "account_update":
+            data = message["data"]
+            self.fields = {k: v for k, v in data.items() if k != "open_trades"}
+            self.positions = {p["ticket"]: dict(p) for p in data.get("open_trades", [])}
+            self.seq = message.get("seq")
+            self.timestamp = message.get("timestamp")
+            self.stale = False
+            return True
+
+        if message_type != "account_delta":
+            return not self.stale
+
+        # A patch only applies on top of the message it was computed against
+        if self.stale or message.get("base_seq") != self.seq:
+            self.stale = True
+            return False
+
+        data = message["data"]
+        self.fields.update(data.get("changed", {}))
+        for ticket in data.get("positions_removed", []):
+            self.positions.pop(ticket, None)
+        for position in data.get("positions_added", []):
+            self.positions[position["ticket"]] = dict(position)
+        for diff in data.get("positions_changed", []):
+            position = self.positions.get(diff["ticket"])
+            if position is None:
+                self.stale = True
+                return False
+            position.update(diff)
+        self.seq = message.get("seq")
+        self.timestamp = message.get("timestamp")
+        return True
+
+
+class AccountStateBook:
+    """
+    Keeps an AccountState per account for a viewer that receives many accounts.
+    """
+
+    def __init__(self):
+        self.accounts = {}
+
+    def apply(self, message):
+        """
+        Applies a message to its account; returns the AccountState, or None for unrelated messages.
+        Raises ValueError for a malformed message.
+        """
+        account_number = message.get("account_number")
+        if account_number is None or message.get("type") not in ("account_update", "account_delta"):
+            return None
+        if not isinstance(account_number, (int, str)):
+            raise ValueError("'account_number' must be a number or a string")
+        state = self.accounts.get(account_number)
+        if state is None:
+            state = self.accounts[account_number] = AccountState(account_number)
+        state.apply(message)
+        return state
@@ -0,0 +1,195 @@
+#
+# Hub Bus
+# The local IPC bus of the multi-process hub. The parent process relays every frame
+# a worker publishes to all workers over Unix sockets, and assigns the global hub_seq,
+# so every worker keeps the same last-value cache and replay buffer.
+#
+# Frames are length-prefixed: 4-byte big-endian length, 1-byte kind, payload.
+#
+
+import json
+import time
+import uuid
+import struct
+import asyncio
+import logging
+
+import wire
+
+HEADER = struct.Struct(">IB")
+SEQ = struct.Struct(">Q")
+
+ENCODING_CODES = {wire.ENCODING_JSON: b"j", wire.ENCODING_MSGPACK: b"m"}
+CODE_ENCODINGS = {code[0]: encoding for encoding, code in ENCODING_CODES.items()}
+
+# Worker -> bus: encoding (1 byte) account_key \0 message
+FRAME_PUBLISH = 1
+# Bus -> workers: hub_seq (8 bytes) encoding (1 byte) account_key \0 message (already tagged with hub_seq)
+FRAME_MESSAGE = 2
+# Both directions: {"account": account_key, "token": token}
+FRAME_REGISTER = 3
+# Both directions: {"worker": pid, "metrics": [...]}, a worker's metrics (see metrics.Registry.collect)
+FRAME_METRICS = 4
+# Both directions: {"account": account_key}, the account's streamer disconnected from its worker
+FRAME_UNREGISTER = 5
+
+
+def encode_frame(kind, payload):
+    return HEADER.pack(len(payload), kind) + payload
+
+async def read_frame(reader):
+    length, kind = HEADER.unpack(await reader.readexactly(HEADER.size))
+    return kind, await reader.readexactly(length)
+
+
+class HubBus:
+    """
+    The relay, run in the parent process.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.seq = 0
+        self.workers = set()
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_unix_server(self._handle_worker, path=self.path)
+        logging.info(f"Hub bus listening on {self.path}")
+
+    async def _handle_worker(self, reader, writer):
+        self.workers.add(writer)
+        try:
+            while True:
+                kind, payload = await read_frame(reader)
+                if kind == FRAME_PUBLISH:
+                    # The bus tags each message once for all workers
+                    self.seq += 1
+                    account_key, _, message = payload[1:].partition(b"\0")
+                    message = wire.with_hub_seq(CODE_ENCODINGS[payload[0]], message, self.seq)
+                    frame = encode_frame(
+                        FRAME_MESSAGE, SEQ.pack(self.seq) + payload[:1] + account_key + b"\0" + message
+                    )
+                elif kind in (FRAME_REGISTER, FRAME_METRICS, FRAME_UNREGISTER):
+                    frame = encode_frame(kind, payload)
+                else:
+                    logging.warning(f"Hub bus ignoring unknown frame kind {kind}.")
+                    continue
+                for worker in list(self.workers):
+                    worker.write(frame)
+                # Wait for slow workers, which in turn slows down the publishing streamer
+                for worker in list(self.workers):
+                    await worker.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.workers.discard(writer)
+            writer.close()
+
+
+class BusClient:
+    """
+    A worker's connection to the bus.
+    `on_message(account_key, message, hub_seq, encoding)` is called for every message published by any worker,
+    and `on_unregister(account_key)` whenever a streamer disconnects from any worker.
+
+    It also keeps streamer registrations consistent across workers: registering an account
+    closes its connection on any other worker, exactly like a duplicate on the same worker.
+    The bus orders registrations, so the latest one always wins.
+    """
+
+    def __init__(self, reader, writer, on_message, on_unregister=None):
+        self.reader = reader
+        self.writer = writer
+        self.on_message = on_message
+        self.on_unregister = on_unregister
+        # Structure: { account_key: {"token": str, "websocket": connection, "confirmed": bool} }
+        self.registrations = {}
+        # The latest metrics of every worker. Structure: { pid: (received_at, metrics) }
+        self.worker_metrics = {}
+        self.task = None
+
+    @classmethod
+    async def connect(cls, path, on_message, on_unregister=None):
+        reader, writer = await asyncio.open_unix_connection(path)
+        client = cls(reader, writer, on_message, on_unregister)
+        client.task = asyncio.create_task(client._run())
+        return client
+
+    async def publish(self, account_key, message):
+        encoding = wire.frame_encoding(message)
+        if isinstance(message, str):
+            message = message.encode()
+        self.writer.write(encode_frame(
+            FRAME_PUBLISH, ENCODING_CODES[encoding] + account_key.encode() + b"\0" + bytes(message)
+        ))
+        await self.writer.drain()
+
+    async def register_streamer(self, account_key, websocket):
+        token = uuid.uuid4().hex
+        self.registrations[account_key] = {"token": token, "websocket": websocket, "confirmed": False}
+        self.writer.write(encode_frame(FRAME_REGISTER, json.dumps({"account": account_key, "token": token}).encode()))
+        await self.writer.drain()
+
+    async def publish_metrics(self, worker, collection):
+        self.writer.write(encode_frame(FRAME_METRICS, json.dumps({"worker": worker, "metrics": collection}).encode()))
+        await self.writer.drain()
+
+    def peer_metrics(self, worker, max_age):
+        """The latest metrics of the other workers, skipping workers that stopped sending them."""
+        now = time.monotonic()
+        return [
+            collection for pid, (received_at, collection) in self.worker_metrics.items()
+            if pid != worker and now - received_at <= max_age
+        ]
+
+    def unregister_streamer(self, account_key, websocket):
+        registration = self.registrations.get(account_key)
+        if registration is not None and registration["websocket"] is websocket:
+            del self.registrations[account_key]
+            # Not sent when another worker took the account over; its streamer is still live there
+            self.writer.write(encode_frame(FRAME_UNREGISTER, json.dumps({"account": account_key}).encode()))
+
+    def _on_register(self, account_key, token):
+        registration = self.registrations.get(account_key)
+        if registration is None:
+            return
+        if registration["token"] == token:
+            registration["confirmed"] = True
+        elif registration["confirmed"]:
+            # Another worker registered the account after us
+            logging.warning(f"Closing existing connection for account {account_key} (registered on another worker).")
+            del self.registrations[account_key]
+            asyncio.ensure_future(registration["websocket"].close(1012, "New connection established."))
+        # Otherwise our own registration is still on its way through the bus, so it is the newer one
+
+    def _dispatch(self, kind, payload):
+        if kind == FRAME_MESSAGE:
+            hub_seq = SEQ.unpack_from(payload)[0]
+            encoding = CODE_ENCODINGS[payload[SEQ.size]]
+            account_key, _, message = payload[SEQ.size + 1:].partition(b"\0")
+            if encoding == wire.ENCODING_JSON:
+                message = message.decode()  # JSON is forwarded to viewers as text frames
+            self.on_message(account_key.decode(), message, hub_seq, encoding)
+        elif kind == FRAME_REGISTER:
+            data = json.loads(payload)
+            self._on_register(data["account"], data["token"])
+        elif kind == FRAME_METRICS:
+            data = json.loads(payload)
+            self.worker_metrics[data["worker"]] = (time.monotonic(), data["metrics"])
+        elif kind == FRAME_UNREGISTER:
+            if self.on_unregister is not None:
+                self.on_unregister(json.loads(payload)["account"])
+
+    async def _run(self):
+        try:
+            while True:
+                kind, payload = await read_frame(self.reader)
+                try:
+                    self._dispatch(kind, payload)
+                except Exception:
+                    # A bad frame (e.g. a malformed streamer message) must not stop the worker
+                    logging.exception(f"Failed to handle a bus frame of kind {kind}; skipping it.")
+        except (asyncio.IncompleteReadError, ConnectionError):
+            # The worker stops when the task ends
+            logging.error("Lost the connection to the hub bus.")
@@ -0,0 +1,126 @@
+#
+# Portfolio Aggregator
+# Keeps portfolio-wide totals across all accounts up to date incrementally:
+# each account update replaces only that account's contribution.
+#
+
+import heapq
+
+SUMMED_FIELDS = ("balance", "equity", "profit", "margin", "margin_free")
+
+
+class PortfolioAggregator:
+    """
+    Totals across accounts: balance, equity, floating profit, margin, free margin,
+    net exposure per symbol and the account with the worst margin level.
+
+    `update()` costs O(positions of that account), independent of the number of accounts.
+    """
+
+    def __init__(self):
+        self.contributions = {}
+        self.totals = dict.fromkeys(SUMMED_FIELDS, 0.0)
+        # Structure: { symbol: {"long": volume, "short": volume, "positions": count} }
+        self.exposure = {}
+        # Min-heap of (margin_level, version, account_key); entries of older versions are skipped lazily
+        self._margin_levels = []
+        self._versions = {}
+        self.dirty = False
+
+    def update(self, account_key, account_number, fields, positions):
+        """
+        Replaces an account's contribution with its current fields and open positions.
+        """
+        old = self.contributions.get(account_key)
+        new = {
+            "account_number": account_number,
+            "fields": {name: fields.get(name) or 0.0 for name in SUMMED_FIELDS},
+            "exposure": self._exposure_of(positions),
+        }
+        if old is not None and old["fields"] == new["fields"] and old["exposure"] == new["exposure"]:
+            return
+
+        for name in SUMMED_FIELDS:
+            self.totals[name] += new["fields"][name] - (old["fields"][name] if old else 0.0)
+        if old is not None:
+            self._apply_exposure(old["exposure"], -1)
+        self._apply_exposure(new["exposure"], 1)
+        self.contributions[account_key] = new
+
+        version = self._versions.get(account_key, 0) + 1
+        self._versions[account_key] = version
+        # MT5 reports a margin level of 0 when there is no margin used; such accounts are not at risk
+        if new["fields"]["margin"] > 0 and fields.get("margin_level") is not None:
+            heapq.heappush(self._margin_levels, (fields["margin_level"], version, account_key))
+            if len(self._margin_levels) > 2 * len(self.contributions) + 64:
+                self._compact()
+        self.dirty = True
+
+    def remove(self, account_key):
+        old = self.contributions.pop(account_key, None)
+        if old is None:
+            return
+        for name in SUMMED_FIELDS:
+            self.totals[name] -= old["fields"][name]
+        self._apply_exposure(old["exposure"], -1)
+        self._versions.pop(account_key, None)
+        self.dirty = True
+
+    @staticmethod
+    def _exposure_of(positions):
+        exposure = {}
+        for position in positions:
+            symbol = position.get("symbol")
+            long_volume, short_volume, count = exposure.get(symbol, (0.0, 0.0, 0))
+            volume = position.get("volume") or 0.0
+            if position.get("type") == "SELL":
+                short_volume += volume
+            else:
+                long_volume += volume
+            exposure[symbol] = (long_volume, short_volume, count + 1)
+        return exposure
+
+    def _apply_exposure(self, exposure, sign):
+        for symbol, (long_volume, short_volume, count) in exposure.items():
+            totals = self.exposure.setdefault(symbol, {"long": 0.0, "short": 0.0, "positions": 0})
+            totals["long"] += sign * long_volume
+            totals["short"] += sign * short_volume
+            totals["positions"] += sign * count
+            if totals["positions"] <= 0:
+                del self.exposure[symbol]
+
+    def _is_current(self, entry):
+        _, version, account_key = entry
+        return self._versions.get(account_key) == version and account_key in self.contributions
+
+    def _compact(self):
+        self._margin_levels = [entry for entry in self._margin_levels if self._is_current(entry)]
+        heapq.heapify(self._margin_levels)
+
+    def worst_margin_level(self):
+        """Returns (account_key, margin_level) of the account closest to a margin call, or None."""
+        while self._margin_levels and not self._is_current(self._margin_levels[0]):
+            heapq.heappop(self._margin_levels)
+        if not self._margin_levels:
+            return None
+        margin_level, _, account_key = self._margin_levels[0]
+        return account_key, margin_level
+
+    def snapshot(self):
+        """The aggregate as the `data` of a portfolio_aggregate message."""
+        data = {name: round(value, 2) for name, value in self.totals.items()}
+        data["accounts"] = len(self.contributions)
+        data["margin_level"] = round(self.totals["equity"] / self.totals["margin"] * 100, 2) \
+            if self.totals["margin"] > 0 else None
+        worst = self.worst_margin_level()
+        data["worst_margin_level"] = None if worst is None else {
+            "account_number": self.contributions[worst[0]]["account_number"], "margin_level": worst[1]
+        }
+        data["exposure"] = {
+            symbol: {
+                "long": round(totals["long"], 8), "short": round(totals["short"], 8),
+                "net": round(totals["long"] - totals["short"], 8), "positions": totals["positions"],
+            }
+            for symbol, totals in sorted(self.exposure.items())
+        }
+        return data
@@ -0,0 +1,131 @@
+#
+# Viewer Queue
+# A bounded outbound queue per viewer, so one slow viewer can never make the hub buffer
+# without limit. Pending messages are keyed, and a newer message for the same key
+# replaces the pending one (conflation).
+#
+
+import asyncio
+import logging
+from collections import OrderedDict
+
+import websockets
+from websockets.exceptions import ConnectionClosed
+
+POLICY_DROP = "drop"
+POLICY_CONFLATE = "conflate"
+POLICY_DISCONNECT = "disconnect"
+POLICIES = (POLICY_DROP, POLICY_CONFLATE, POLICY_DISCONNECT)
+
+
+class ViewerQueue:
+    """
+    The outbound queue of one viewer.
+
+    While the viewer keeps up, messages are written straight to its connection.
+    Once its write buffer is above `write_limit` bytes, messages wait in `pending`
+    (at most `max_pending` entries) and a sender task writes them as the viewer drains.
+
+    Policies for a viewer that falls behind:
+      - "conflate": a new message replaces the pending one with the same key;
+        when the queue is full of distinct keys, the oldest pending message is dropped.
+      - "drop": no conflation; new messages are dropped while the queue is full.
+      - "disconnect": no conflation; the viewer is closed once the queue is full.
+
+    A pending value may be an encoded message or a callable returning one; callables are called
+    with the viewer's encoding only when the message is actually written. `push(..., conflated=...)` gives the value
+    to keep when a message replaces a pending one, for messages that cannot simply
+    replace their predecessor (e.g. deltas, which are conflated into a snapshot).
+    """
+
+    def __init__(self, websocket, policy=POLICY_CONFLATE, max_pending=1024, write_limit=256 * 1024, encoding="json"):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown slow viewer policy '{policy}'")
+        self.websocket = websocket
+        self.policy = policy
+        self.max_pending = max_pending
+        self.write_limit = write_limit
+        self.encoding = encoding
+        self.pending = OrderedDict()
+        self.counters = {"sent": 0, "queued": 0, "conflated": 0, "dropped": 0}
+        self.closed = False
+        self._unique = 0
+        self._wakeup = asyncio.Event()
+        self._sender = None
+
+    def write_buffer_size(self):
+        transport = getattr(self.websocket, "transport", None)
+        return transport.get_write_buffer_size() if transport is not None else 0
+
+    def push(self, key, message, conflated=None):
+        """
+        Queues a message for the viewer. Returns False if it was dropped.
+        """
+        if self.closed:
+            return False
+
+        # Fast path: nothing is waiting and the connection keeps up
+        if not self.pending and self.write_buffer_size() < self.write_limit:
+            websockets.broadcast([self.websocket], message(self.encoding) if callable(message) else message)
+            self.counters["sent"] += 1
+            return True
+
+        if self.policy == POLICY_CONFLATE:
+            if key in self.pending:
+                self.pending[key] = message if conflated is None else conflated
+                self.counters["conflated"] += 1
+                return True
+        else:
+            self._unique += 1
+            key = (key, self._unique)
+
+        if len(self.pending) >= self.max_pending:
+            if self.policy == POLICY_DROP:
+                self.counters["dropped"] += 1
+                return False
+            if self.policy == POLICY_DISCONNECT:
+                self.counters["dropped"] += 1
+                self.close(1013, "Viewer is too slow.")
+                return False
+            self.pending.popitem(last=False)
+            self.counters["dropped"] += 1
+
+        self.pending[key] = message
+        self.counters["queued"] += 1
+        self._wakeup.set()
+        if self._sender is None:
+            self._sender = asyncio.create_task(self._run())
+        return True
+
+    def close(self, code=1000, reason=""):
+        if self.closed:
+            return
+        self.closed = True
+        self.pending.clear()
+        if self._sender is not None:
+            self._sender.cancel()
+        asyncio.ensure_future(self.websocket.close(code, reason))
+
+    def stats(self):
+        return dict(self.counters, depth=len(self.pending), policy=self.policy, encoding=self.encoding,
+                    write_buffer=self.write_buffer_size())
+
+    async def _run(self):
+        try:
+            while not self.closed:
+                if not self.pending:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                _, message = self.pending.popitem(last=False)
+                # send() waits for the write buffer to drain, which is what holds the queue back
+                await self.websocket.send(message(self.encoding) if callable(message) else message)
+                self.counters["sent"] += 1
+        except ConnectionClosed:
+            self.closed = True
+            self.pending.clear()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logging.error(f"Viewer sender failed: {e}")
+            self.close(1011, "Internal server error")
@@ -3,10 +3,35 @@
 # This server acts as a central hub to receive data from MT5 streamers
 # and broadcast it to any connected viewers.
 #
+import os
+import sys
+import time
+import uuid
+import socket
 import asyncio
+import argparse
+import tempfile
+import multiprocessing
 import websockets
 import json
 import logging
+from collections import deque
+from http import HTTPStatus
+from urllib.parse import urlparse, parse_qs
+from websockets.extensions.permessage_deflate import ServerPerMessageDeflateFactory
+import wire
+from wire import WireMessage
+from account_state import AccountStateBook
+from viewer_queue import ViewerQueue
+from hub_bus import HubBus, BusClient
+from portfolio import PortfolioAggregator
+try:
+    import metrics
+except ImportError:
+    # metrics.py is one module shared with the gateway and the streamer, kept in src/.
+    # A hub deployed without the repo can ship it next to this file instead.
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "src"))
+    import metrics
 
 # Setup logging
 logging.basicConfig(
@@ -21,37 +46,469 @@ STREAMERS = {}
 # A set to hold the data consumers (dashboards, viewers, etc.)
 VIEWERS = set()
 
+# Subscriber index, so fan-out only touches interested viewers
+# Structure: { account_id: set_of_viewer_connections }
+SUBSCRIBERS = {}
+
+# Viewers subscribed to every account
+WILDCARD_SUBSCRIBERS = set()
+
+# Last-value cache: the latest full state of every account (rebuilt from keyframes and deltas),
+# plus the last message of every other type per account
+ACCOUNT_STATES = AccountStateBook()
+LAST_VALUES = {}
+# Maps an account key to the account number its messages carry
+ACCOUNT_NUMBERS = {}
+
+# Derived topics computed by the hub across all accounts. Their messages use this account key,
+# and reach every viewer subscribed to their message type whatever its account subscriptions.
+DERIVED_ACCOUNT = "*"
+PORTFOLIO = PortfolioAggregator()
+PORTFOLIO_INTERVAL = float(os.environ.get("PORTFOLIO_INTERVAL", 1.0))
+
+# Replay ring buffer for reconnecting viewers, bounded by message count and total bytes
+# Structure: deque of (hub_seq, account_key, message_type, message)
+REPLAY_BUFFER_SIZE = int(os.environ.get("REPLAY_BUFFER_SIZE", 10000))
+REPLAY_BUFFER_BYTES = int(os.environ.get("REPLAY_BUFFER_BYTES", 64 * 1024 * 1024))
+REPLAY_BUFFER = deque()
+REPLAY_STATE = {"bytes": 0, "seq": 0}
+
+# Identifies this hub instance, so sequence numbers from a previous run are never replayed
+HUB_EPOCH = uuid.uuid4().hex[:12]
+
+# The connection to the IPC bus when running as one of several worker processes (see hub_bus.py),
+# None in single-process mode
+BUS = None
+
+# Each viewer's bounded outbound queue, and what to do with viewers that fall behind
+# (see viewer_queue.py: "conflate", "drop" or "disconnect")
+# Structure: { websocket_connection: ViewerQueue }
+SLOW_VIEWER_POLICY = os.environ.get("SLOW_VIEWER_POLICY", "conflate")
+VIEWER_QUEUE_SIZE = int(os.environ.get("VIEWER_QUEUE_SIZE", 1024))
+VIEWER_WRITE_LIMIT = int(os.environ.get("VIEWER_WRITE_LIMIT", 256 * 1024))
+VIEWER_STATS_INTERVAL = int(os.environ.get("VIEWER_STATS_INTERVAL", 60))
+VIEWER_QUEUES = {}
+
+# permessage-deflate: "auto", "deflate" (all connections) or "none". Compression costs CPU for every viewer,
+# since each connection compresses on its own, and MessagePack compresses worse than JSON (see
+# benchmarks/bench_wire_encoding.py). With "auto", connections that ask for MessagePack in the handshake
+# URL (?encoding=msgpack) are not compressed; all others are.
+HUB_COMPRESSION = os.environ.get("HUB_COMPRESSION", "auto")
+HUB_DEFLATE_WINDOW_BITS = int(os.environ.get("HUB_DEFLATE_WINDOW_BITS", 12))
+HUB_DEFLATE_MEM_LEVEL = int(os.environ.get("HUB_DEFLATE_MEM_LEVEL", 5))
+HUB_DEFLATE_LEVEL = int(os.environ.get("HUB_DEFLATE_LEVEL", 6))
+
+# Metrics on GET /metrics of the hub port (see metrics.py). In multi-process mode each worker sends its
+# metrics to the others over the bus every HUB_METRICS_PUSH_INTERVAL seconds, so any worker can answer for all.
+# With HUB_PROFILER=1, GET /debug/profile?seconds=N profiles the worker that answers.
+HUB_METRICS_PUSH_INTERVAL = float(os.environ.get("HUB_METRICS_PUSH_INTERVAL", 2.0))
+HUB_PROFILER = os.environ.get("HUB_PROFILER", "0") == "1"
+MESSAGES_RECEIVED = metrics.Counter(
+    "hub_messages_total", "Messages received from streamers, by account.", ("account",))
+BYTES_RECEIVED = metrics.Counter(
+    "hub_received_bytes_total", "Size of the messages received from streamers, by account.", ("account",))
+MALFORMED_MESSAGES = metrics.Counter(
+    "hub_malformed_messages_total",
+    "Malformed messages from streamers, by account and outcome (dropped, or forwarded but not cached).",
+    ("account", "outcome"))
+FANOUT_SECONDS = metrics.Histogram(
+    "hub_fanout_seconds", "Time to queue one message for all the viewers subscribed to it.")
+metrics.Gauge("hub_viewers", "Connected viewers.", callback=lambda: len(VIEWERS))
+metrics.Gauge("hub_streamers", "Connected streamers.", callback=lambda: len(STREAMERS))
+metrics.Gauge("hub_replay_buffer_messages", "Messages in the replay buffer.", callback=lambda: len(REPLAY_BUFFER))
+
+# Each viewer's subscriptions
+# Structure: { websocket_connection: {"accounts": set, "all_accounts": bool, "types": set, "all_types": bool} }
+VIEWER_SUBSCRIPTIONS = {}
+
+def _account_key(account_id):
+    # Account ids may arrive as numbers or strings; index them the same way
+    return str(account_id)
+
+def _as_list(value):
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+def subscribe(websocket, accounts=None, types=None):
+    """
+    Adds accounts and/or message types to a viewer's subscriptions. "*" means all.
+    """
+    subscription = VIEWER_SUBSCRIPTIONS[websocket]
+    for account_id in _as_list(accounts):
+        if account_id == "*":
+            subscription["all_accounts"] = True
+            WILDCARD_SUBSCRIBERS.add(websocket)
+        else:
+            key = _account_key(account_id)
+            subscription["accounts"].add(key)
+            SUBSCRIBERS.setdefault(key, set()).add(websocket)
+    for message_type in _as_list(types):
+        if message_type == "*":
+            subscription["all_types"] = True
+        else:
+            subscription["types"].add(message_type)
+
+def unsubscribe(websocket, accounts=None, types=None):
+    """
+    Removes accounts and/or message types from a viewer's subscriptions. "*" clears everything.
+    """
+    subscription = VIEWER_SUBSCRIPTIONS[websocket]
+    for account_id in _as_list(accounts):
+        keys = list(subscription["accounts"]) if account_id == "*" else [_account_key(account_id)]
+        if account_id == "*":
+            subscription["all_accounts"] = False
+            WILDCARD_SUBSCRIBERS.discard(websocket)
+        for key in keys:
+            subscription["accounts"].discard(key)
+            subscribers = SUBSCRIBERS.get(key)
+            if subscribers is not None:
+                subscribers.discard(websocket)
+                if not subscribers:
+                    del SUBSCRIBERS[key]
+    for message_type in _as_list(types):
+        if message_type == "*":
+            subscription["all_types"] = False
+            subscription["types"].clear()
+        else:
+            subscription["types"].discard(message_type)
+
+def add_viewer(websocket, hello):
+    """
+    Registers a viewer. Without "accounts"/"types" in its hello it receives everything,
+    and without "encoding" it receives JSON.
+    """
+    VIEWERS.add(websocket)
+    VIEWER_QUEUES[websocket] = ViewerQueue(
+        websocket, SLOW_VIEWER_POLICY, VIEWER_QUEUE_SIZE, VIEWER_WRITE_LIMIT, wire.negotiate(hello.get("encoding"))
+    )
+    VIEWER_SUBSCRIPTIONS[websocket] = {"accounts": set(), "all_accounts": False, "types": set(), "all_types": False}
+    subscribe(websocket, hello.get("accounts", "*"), hello.get("types", "*"))
+
+def remove_viewer(websocket):
+    if websocket in VIEWER_SUBSCRIPTIONS:
+        unsubscribe(websocket, accounts="*")
+        del VIEWER_SUBSCRIPTIONS[websocket]
+    queue = VIEWER_QUEUES.pop(websocket, None)
+    if queue is not None:
+        queue.close()
+    VIEWERS.discard(websocket)
+
+def subscription_state(websocket):
+    subscription = VIEWER_SUBSCRIPTIONS[websocket]
+    return {
+        "type": "subscription",
+        "accounts": ["*"] if subscription["all_accounts"] else sorted(subscription["accounts"]),
+        "types": ["*"] if subscription["all_types"] else sorted(subscription["types"]),
+        "hub_epoch": HUB_EPOCH,
+        "hub_seq": REPLAY_STATE["seq"],
+        "encoding": VIEWER_QUEUES[websocket].encoding,
+    }
+
+def is_subscribed(websocket, account_key, message_type):
+    subscription = VIEWER_SUBSCRIPTIONS[websocket]
+    return (subscription["all_accounts"] or account_key in subscription["accounts"] or account_key == DERIVED_ACCOUNT) and \
+        (subscription["all_types"] or message_type in subscription["types"])
+
+def conflation_key(account_key, message_type):
+    # An account's keyframes and deltas conflate with each other
+    if message_type in ("account_update", "account_delta"):
+        return (account_key, "account")
+    return (account_key, message_type)
+
+def merge_market_data(account_key, data):
+    """
+    market_data frames only carry the symbols that changed, so the last-value cache merges them
+    into the latest quote and book of every symbol. Tick sequences are events, not state, and are not kept.
+    """
+    cached = LAST_VALUES.get((account_key, "market_data"))
+    if cached is None:
+        cached = LAST_VALUES[(account_key, "market_data")] = {"type": "market_data", "data": {}}
+    cached.update((k, v) for k, v in data.items() if k != "data")
+    symbols = cached["data"]
+    updates = data.get("data")
+    if not isinstance(updates, dict):
+        return
+    for symbol, update in updates.items():
+        if isinstance(update, dict):
+            quote = symbols.setdefault(symbol, {})
+            quote.update((k, v) for k, v in update.items() if k != "ticks")
+
+def last_value_snapshot(account_key, message_type, hub_seq):
+    """
+    Renders the cached value of a merged message type when a queued message is finally written.
+    """
+    def render(encoding):
+        return wire.encode(encoding, dict(LAST_VALUES[(account_key, message_type)], hub_seq=hub_seq, snapshot=True))
+    return render
+
+def account_snapshot(account_key, hub_seq, fallback):
+    """
+    Renders the account's current state when a queued delta is finally written,
+    so a conflated run of deltas reaches a slow viewer as one snapshot.
+    """
+    def render(encoding):
+        state = ACCOUNT_STATES.accounts.get(ACCOUNT_NUMBERS.get(account_key))
+        if state is None or state.stale:
+            return fallback.encode(encoding)
+        snapshot = state.snapshot()
+        snapshot.update(hub_seq=hub_seq, snapshot=True)
+        return wire.encode(encoding, snapshot)
+    return render
+
+def conflated_value(account_key, message_type, message, hub_seq):
+    """
+    What replaces a pending message of this type when a newer one arrives for a slow viewer
+    (None: the newer message itself).
+    """
+    if message_type == "account_delta":
+        return account_snapshot(account_key, hub_seq, message)
+    if message_type == "market_data":
+        # Each frame only has the symbols that changed; the cached value has all of them
+        return last_value_snapshot(account_key, message_type, hub_seq)
+    return None
+
+def deliver(viewer, account_key, message_type, message, conflated):
+    """
+    Queues a WireMessage on a viewer's outbound queue, in the viewer's encoding.
+    """
+    queue = VIEWER_QUEUES.get(viewer)
+    if queue is not None:
+        queue.push(conflation_key(account_key, message_type), message.encode(queue.encoding), conflated)
+
+def viewer_label(viewer):
+    address = viewer.remote_address
+    return f"{address[0]}:{address[1]}" if address else "unknown"
+
+metrics.Gauge(
+    "hub_viewer_queue_depth", "Messages waiting in each viewer's outbound queue.", ("viewer",),
+    callback=lambda: {(viewer_label(viewer),): len(queue.pending) for viewer, queue in VIEWER_QUEUES.items()})
+metrics.Counter(
+    "hub_viewer_messages_total", "Messages per connected viewer, by outcome (sent, queued, conflated, dropped).",
+    ("viewer", "outcome"),
+    callback=lambda: {
+        (viewer_label(viewer), outcome): count
+        for viewer, queue in VIEWER_QUEUES.items() for outcome, count in queue.counters.items()
+    })
+
+def viewer_queue_stats():
+    return [
+        dict(queue.stats(), viewer=viewer.remote_address[0] if viewer.remote_address else None)
+        for viewer, queue in VIEWER_QUEUES.items()
+    ]
+
+def recipients_for(account_id, message_type):
+    """
+    The viewers interested in a message: cost is proportional to the interested viewers only.
+    """
+    explicit = SUBSCRIBERS.get(_account_key(account_id), ())
+    if account_id == DERIVED_ACCOUNT:
+        candidates = VIEWERS
+    elif explicit and WILDCARD_SUBSCRIBERS:
+        # A viewer may be both a wildcard and an explicit subscriber
+        candidates = WILDCARD_SUBSCRIBERS.union(explicit)
+    else:
+        candidates = explicit or WILDCARD_SUBSCRIBERS
+    recipients = []
+    for viewer in candidates:
+        subscription = VIEWER_SUBSCRIPTIONS[viewer]
+        if subscription["all_types"] or message_type in subscription["types"]:
+            recipients.append(viewer)
+    return recipients
+
+def cache_last_value(account_id, account_key, message_type, data):
+    """Updates the last-value cache and the portfolio totals with one decoded streamer message."""
+    try:
+        state = ACCOUNT_STATES.apply(data)
+    except ValueError as e:
+        # Still forwarded to viewers, but kept out of the last-value cache and the portfolio totals
+        logging.warning(f"Not caching malformed {message_type} from streamer {account_id}: {e}")
+        MALFORMED_MESSAGES.inc((account_key, "not_cached"))
+        return
+    if message_type == "market_data":
+        merge_market_data(account_key, data)
+    elif state is None:
+        LAST_VALUES[(account_key, message_type)] = data
+    else:
+        ACCOUNT_NUMBERS[account_key] = state.account_number
+        if not state.stale:
+            PORTFOLIO.update(account_key, state.account_number, state.fields, state.positions.values())
+        else:
+            # After a sequence gap the totals leave the account out until its next keyframe
+            PORTFOLIO.remove(account_key)
+
+def publish(account_id, message, hub_seq=None, encoding=None):
+    """
+    Records a streamer message in the last-value cache and the replay buffer,
+    then forwards it to the subscribed viewers.
+    In multi-process mode the bus assigns `hub_seq` and has already tagged the message with it.
+    Viewers that use the streamer's encoding get the received bytes as they are; the message is
+    translated at most once for the viewers of the other encoding.
+    """
+    encoding = encoding or wire.frame_encoding(message)
+    account_key = _account_key(account_id)
+    try:
+        data = wire.decode(encoding, message)
+    except (ValueError, TypeError, AttributeError):
+        data = None
+    if not isinstance(data, dict):
+        logging.warning(f"Dropping invalid message from streamer {account_id}.")
+        MALFORMED_MESSAGES.inc((account_key, "dropped"))
+        return
+    message_type = data.get("type")
+
+    cache_last_value(account_id, account_key, message_type, data)
+
+    # Replay ring buffer
+    if hub_seq is None:
+        REPLAY_STATE["seq"] += 1
+        hub_seq = REPLAY_STATE["seq"]
+        message = wire.with_hub_seq(encoding, message, hub_seq)
+    else:
+        REPLAY_STATE["seq"] = hub_seq
+    message = WireMessage(encoding, message, data={"hub_seq": hub_seq, **data})
+    REPLAY_BUFFER.append((hub_seq, account_key, message_type, message))
+    REPLAY_STATE["bytes"] += len(message.raw)
+    while len(REPLAY_BUFFER) > REPLAY_BUFFER_SIZE or REPLAY_STATE["bytes"] > REPLAY_BUFFER_BYTES:
+        REPLAY_STATE["bytes"] -= len(REPLAY_BUFFER.popleft()[3].raw)
+
+    # Queue the message for the subscribed viewers
+    if VIEWERS:
+        started = time.perf_counter() if metrics.ENABLED else None
+        recipients = recipients_for(account_id, message_type)
+        if recipients:
+            conflated = conflated_value(account_key, message_type, message, hub_seq)
+            for viewer in recipients:
+                deliver(viewer, account_key, message_type, message, conflated)
+        if started is not None:
+            FANOUT_SECONDS.observe(time.perf_counter() - started)
+    # The decoded form is only kept while fanning out; a later translation decodes the raw message again
+    message.data = None
+
+def publish_derived(message_type, data):
+    """
+    Sends a message computed by the hub itself (see DERIVED_ACCOUNT) to the viewers subscribed to its type.
+    Derived messages are kept in the last-value cache but not in the replay buffer: each one replaces the
+    previous one, so they carry the current hub_seq instead of taking a new one. This also keeps hub_seq
+    the same on every worker in multi-process mode, where each worker derives them on its own.
+    """
+    hub_seq = REPLAY_STATE["seq"]
+    payload = {"type": message_type, "timestamp": int(time.time()), "data": data}
+    LAST_VALUES[(DERIVED_ACCOUNT, message_type)] = payload
+    if VIEWERS:
+        recipients = recipients_for(DERIVED_ACCOUNT, message_type)
+        if recipients:
+            message = WireMessage.from_payload(dict(payload, hub_seq=hub_seq))
+            for viewer in recipients:
+                deliver(viewer, DERIVED_ACCOUNT, message_type, message, None)
+
+def catch_up_messages(websocket, hello):
+    """
+    Messages a new or reconnecting viewer needs before live messages:
+    the missed messages if the viewer's last_seq is still in the replay buffer,
+    otherwise a fresh snapshot of every subscribed account.
+    Returns (account_key, message_type, WireMessage, hub_seq) tuples.
+    """
+    last_seq = hello.get("last_seq")
+    oldest_seq = REPLAY_BUFFER[0][0] if REPLAY_BUFFER else REPLAY_STATE["seq"] + 1
+    if isinstance(last_seq, int) and hello.get("hub_epoch") == HUB_EPOCH \
+            and oldest_seq - 1 <= last_seq <= REPLAY_STATE["seq"]:
+        messages = [
+            (account_key, message_type, message, hub_seq)
+            for hub_seq, account_key, message_type, message in REPLAY_BUFFER
+            if hub_seq > last_seq and is_subscribed(websocket, account_key, message_type)
+        ]
+        # Derived messages are not replayed; their latest value is enough
+        for (account_key, message_type), data in LAST_VALUES.items():
+            if account_key == DERIVED_ACCOUNT and is_subscribed(websocket, account_key, message_type):
+                snapshot = dict(data, hub_seq=REPLAY_STATE["seq"], snapshot=True)
+                messages.append((account_key, message_type, WireMessage.from_payload(snapshot), REPLAY_STATE["seq"]))
+        return messages
+
+    hub_seq = REPLAY_STATE["seq"]
+    messages = []
+    for account_id, state in ACCOUNT_STATES.accounts.items():
+        account_key = _account_key(account_id)
+        if not state.stale and is_subscribed(websocket, account_key, "account_update"):
+            snapshot = state.snapshot()
+            snapshot.update(hub_seq=hub_seq, snapshot=True)
+            messages.append((account_key, "account_update", WireMessage.from_payload(snapshot), hub_seq))
+    for (account_key, message_type), data in LAST_VALUES.items():
+        if is_subscribed(websocket, account_key, message_type):
+            snapshot = dict(data, hub_seq=hub_seq, snapshot=True)
+            messages.append((account_key, message_type, WireMessage.from_payload(snapshot), hub_seq))
+    return messages
+
 async def handle_streamer(websocket, account_id):
     """
     Manages the logic for a connected Streamer.
-    It forwards any message received from this client to all viewers.
+    It forwards any message received from this client to the viewers subscribed to it.
     """
     logging.info(f"Streamer for account {account_id} is now live.")
     try:
         async for message in websocket:
-            # Broadcast the message only if there are viewers
-            if VIEWERS:
-                websockets.broadcast(VIEWERS, message)
+            # Counted here, on the worker the streamer is connected to, so each message counts once
+            if metrics.ENABLED:
+                MESSAGES_RECEIVED.inc((_account_key(account_id),))
+                BYTES_RECEIVED.inc((_account_key(account_id),), len(message))
+            if BUS is None:
+                publish(account_id, message)
+            else:
+                # Every worker, including this one, publishes it when the bus relays it back
+                await BUS.publish(_account_key(account_id), message)
     finally:
         # When the streamer disconnects, remove it from the dictionary
         logging.info(f"Streamer for account {account_id} disconnected.")
-        if account_id in STREAMERS:
-            del STREAMERS[account_id]
+        remove_streamer(account_id, websocket)
+
+def remove_streamer(account_id, websocket):
+    """
+    Forgets a disconnected streamer, unless a newer connection for the account already replaced it,
+    and drops the account from the portfolio totals on every worker.
+    The account's last-value cache is kept, so viewers still get its last known state.
+    """
+    if STREAMERS.get(account_id) is websocket:
+        del STREAMERS[account_id]
+        logging.info(f"Cleaned up streamer for account {account_id}.")
+        if BUS is None:
+            PORTFOLIO.remove(_account_key(account_id))
+    if BUS is not None:
+        # Relayed back to every worker, this one included, which then call PORTFOLIO.remove
+        BUS.unregister_streamer(_account_key(account_id), websocket)
 
 async def handle_viewer(websocket):
     """
     Manages the logic for a connected Viewer.
-    Its main job is to keep the connection alive to receive messages.
+    Viewers mostly listen, but may send subscribe/unsubscribe control messages,
+    or ask for their outbound queue counters with a "stats" message.
     """
     logging.info(f"Viewer connected from {websocket.remote_address[0]}.")
     try:
-        # We just wait until the viewer's connection is closed.
-        # Viewers are typically listeners and don't send messages.
-        await websocket.wait_closed()
+        async for message in websocket:
+            try:
+                data = wire.decode(wire.frame_encoding(message), message)
+                control = data.get("type")
+            except (ValueError, TypeError, AttributeError):
+                logging.warning(f"Ignoring invalid control message from viewer {websocket.remote_address[0]}.")
+                continue
+            if control == "subscribe":
+                subscribe(websocket, data.get("accounts"), data.get("types"))
+                reply = subscription_state(websocket)
+            elif control == "unsubscribe":
+                unsubscribe(websocket, data.get("accounts"), data.get("types"))
+                reply = subscription_state(websocket)
+            elif control == "stats":
+                reply = dict(VIEWER_QUEUES[websocket].stats(), type="viewer_stats")
+            else:
+                logging.warning(f"Unknown control message '{control}' from viewer {websocket.remote_address[0]}.")
+                continue
+            # Replies share the outbound queue, so they stay in order with the data messages
+            queue = VIEWER_QUEUES[websocket]
+            queue.push((None, reply["type"]), wire.encode(queue.encoding, reply))
     finally:
-        # When the viewer disconnects, remove it from the set
+        # When the viewer disconnects, remove it from the subscriber index
         logging.info(f"Viewer disconnected from {websocket.remote_address[0]}.")
-        VIEWERS.remove(websocket)
+        remove_viewer(websocket)
 
 async def main_handler(websocket):
     """
@@ -71,6 +528,12 @@ async def main_handler(websocket):
             if account_id is None:
                 await websocket.close(1008, "Account number is required for streamers.")
                 return
+            # The hello is JSON; afterwards binary frames carry MessagePack and text frames JSON
+            encoding = data.get("encoding", wire.ENCODING_JSON)
+            if encoding not in wire.ENCODINGS:
+                logging.error(f"Streamer for account {account_id} asked for unsupported encoding '{encoding}'.")
+                await websocket.close(1003, f"Unsupported encoding '{encoding}'.")
+                return
             
             client_info = ("streamer", account_id)
             
@@ -80,11 +543,23 @@ async def main_handler(websocket):
                  await STREAMERS[account_id].close(1012, "New connection established.")
 
             STREAMERS[account_id] = websocket
+            if BUS is not None:
+                # Closes the account's connection on the other workers too
+                await BUS.register_streamer(_account_key(account_id), websocket)
             await handle_streamer(websocket, account_id)
 
         elif client_type == "viewer_hello":
             client_info = ("viewer", websocket)
-            VIEWERS.add(websocket)
+            add_viewer(websocket, data)
+            # The subscription state and catch-up messages are queued before any live message can be,
+            # since nothing awaits in between
+            queue = VIEWER_QUEUES[websocket]
+            queue.push((None, "subscription"), wire.encode(queue.encoding, subscription_state(websocket)))
+            catch_up = catch_up_messages(websocket, data)
+            for account_key, message_type, message, hub_seq in catch_up:
+                deliver(websocket, account_key, message_type, message,
+                        conflated_value(account_key, message_type, message, hub_seq))
+            logging.info(f"Sent {len(catch_up)} catch-up messages to viewer {websocket.remote_address[0]}.")
             await handle_viewer(websocket)
 
         else:
@@ -103,27 +578,184 @@ async def main_handler(websocket):
         # Proper cleanup after disconnection
         if client_info:
             role, identity = client_info
-            if role == "streamer" and identity in STREAMERS and STREAMERS[identity] == websocket:
-                del STREAMERS[identity]
-                logging.info(f"Cleaned up streamer for account {identity}.")
+            if role == "streamer":
+                remove_streamer(identity, websocket)
             elif role == "viewer" and identity in VIEWERS:
-                VIEWERS.remove(identity)
+                remove_viewer(identity)
                 logging.info(f"Cleaned up viewer from {websocket.remote_address[0]}.")
 
 
-async def main():
+async def publish_portfolio_aggregates():
+    """
+    Publishes the portfolio aggregate at most every PORTFOLIO_INTERVAL seconds, and only when it changed.
+    """
+    while True:
+        await asyncio.sleep(PORTFOLIO_INTERVAL)
+        if PORTFOLIO.dirty:
+            PORTFOLIO.dirty = False
+            publish_derived("portfolio_aggregate", PORTFOLIO.snapshot())
+
+async def report_viewer_queues():
+    """
+    Periodically logs the viewers that are falling behind.
+    """
+    while True:
+        await asyncio.sleep(VIEWER_STATS_INTERVAL)
+        for stats in viewer_queue_stats():
+            if stats["depth"] or stats["dropped"]:
+                logging.warning(
+                    f"Slow viewer {stats['viewer']}: queue depth {stats['depth']}, "
+                    f"dropped {stats['dropped']}, conflated {stats['conflated']}, sent {stats['sent']}."
+                )
+
+async def main(host="0.0.0.0", port=8765, bus_path=None):
     """
     The main function to start the server.
+    With `bus_path` it runs as one worker of a multi-process hub, sharing the port with the other workers.
     """
-    host = "0.0.0.0"
-    port = 8765
+    global BUS
+    if bus_path is not None:
+        BUS = await BusClient.connect(bus_path, publish, PORTFOLIO.remove)
 
-    async with websockets.serve(main_handler, host, port):
-        logging.info(f"🚀 Professional WebSocket Hub started on ws://{host}:{port}")
-        await asyncio.Future()  # Keep the server running forever
+    async with websockets.serve(main_handler, host, port, reuse_port=bus_path is not None,
+                                process_request=http_request, **server_compression()):
+        role = f"worker {os.getpid()}" if bus_path is not None else "Professional WebSocket Hub"
+        logging.info(f"🚀 {role} started on ws://{host}:{port} (slow viewer policy: {SLOW_VIEWER_POLICY})")
+        background = [
+            asyncio.create_task(report_viewer_queues()),
+            asyncio.create_task(publish_portfolio_aggregates()),
+        ]
+        if BUS is not None and metrics.ENABLED:
+            background.append(asyncio.create_task(push_metrics()))
+        try:
+            if BUS is not None:
+                await BUS.task  # Runs until the bus goes away
+            else:
+                await asyncio.Future()  # Keep the server running forever
+        finally:
+            for task in background:
+                task.cancel()
+
+def worker_metrics():
+    """
+    This process's metrics, labeled with the worker's pid in multi-process mode.
+    """
+    collection = metrics.REGISTRY.collect()
+    if BUS is None:
+        return collection
+    worker = [("worker", str(os.getpid()))]
+    return [
+        (name, kind, help_text, [(suffix, worker + labels, value) for suffix, labels, value in samples])
+        for name, kind, help_text, samples in collection
+    ]
+
+async def push_metrics():
+    """
+    Sends this worker's metrics to the other workers, so that /metrics on any worker covers all of them.
+    """
+    while True:
+        await asyncio.sleep(HUB_METRICS_PUSH_INTERVAL)
+        await BUS.publish_metrics(os.getpid(), worker_metrics())
+
+async def http_request(connection, request):
+    """
+    Answers plain HTTP requests on the hub port: GET /metrics and, with HUB_PROFILER=1,
+    GET /debug/profile?seconds=N&interval=S. WebSocket handshakes go through, only choosing
+    whether the connection may use deflate (see HUB_COMPRESSION).
+    """
+    url = urlparse(request.path)
+    if request.headers.get("Upgrade", "").lower() == "websocket":
+        # Still before extension negotiation, so deflate can be left out for this connection only
+        if HUB_COMPRESSION == "auto" and parse_qs(url.query).get("encoding") == [wire.ENCODING_MSGPACK]:
+            connection.protocol.available_extensions = None
+        return None
+    if url.path == "/metrics":
+        collections = [worker_metrics()]
+        if BUS is not None:
+            collections.extend(BUS.peer_metrics(os.getpid(), 3 * HUB_METRICS_PUSH_INTERVAL))
+        return connection.respond(HTTPStatus.OK, metrics.render(*collections))
+    if url.path == "/debug/profile" and HUB_PROFILER:
+        query = parse_qs(url.query)
+        try:
+            seconds = float(query.get("seconds", ["10"])[0])
+            interval = float(query.get("interval", [str(metrics.PROFILE_INTERVAL)])[0])
+        except ValueError:
+            return connection.respond(HTTPStatus.BAD_REQUEST, "seconds and interval must be numbers\n")
+        logging.info(f"Profiling for {seconds} seconds.")
+        try:
+            # The profiler samples from another thread, so the event loop keeps running as usual
+            stacks = await asyncio.to_thread(metrics.PROFILER.profile, seconds, interval)
+        except RuntimeError as e:
+            return connection.respond(HTTPStatus.CONFLICT, f"{e}\n")
+        return connection.respond(HTTPStatus.OK, stacks)
+    # Anything else gets the regular handshake response (426 Upgrade Required)
+    return None
+
+def server_compression():
+    """
+    websockets.serve() arguments for the permessage-deflate settings.
+    """
+    if HUB_COMPRESSION == "none":
+        return {"compression": None}
+    return {"extensions": [ServerPerMessageDeflateFactory(
+        server_max_window_bits=HUB_DEFLATE_WINDOW_BITS,
+        client_max_window_bits=HUB_DEFLATE_WINDOW_BITS,
+        compress_settings={"memLevel": HUB_DEFLATE_MEM_LEVEL, "level": HUB_DEFLATE_LEVEL},
+    )]}
+
+def run_worker(host, port, bus_path, hub_epoch):
+    """
+    Entry point of a worker process.
+    """
+    global HUB_EPOCH
+    # All workers share one epoch, so a viewer can resume on any of them
+    HUB_EPOCH = hub_epoch
+    try:
+        asyncio.run(main(host, port, bus_path))
+    except KeyboardInterrupt:
+        pass
+
+async def run_workers(host, port, workers):
+    """
+    Runs the IPC bus and `workers` worker processes that accept connections on the same port.
+    """
+    bus_path = os.path.join(tempfile.mkdtemp(prefix="websocket-hub-"), "bus.sock")
+    bus = HubBus(bus_path)
+    await bus.start()
+
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=run_worker, args=(host, port, bus_path, HUB_EPOCH), daemon=True)
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    logging.info(f"🚀 Professional WebSocket Hub started on ws://{host}:{port} with {workers} workers")
+    try:
+        # Stop the hub if a worker dies, instead of silently running with fewer
+        while all(process.is_alive() for process in processes):
+            await asyncio.sleep(1)
+        logging.error("A hub worker exited. Shutting down.")
+    finally:
+        for process in processes:
+            process.terminate()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="WebSocket Hub/Router for MT5 streamers and viewers.")
+    parser.add_argument("--host", default=os.environ.get("HUB_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("HUB_PORT", 8765)))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("HUB_WORKERS", 1)),
+                        help="Number of worker processes (needs SO_REUSEPORT and Unix sockets, e.g. Linux)")
+    args = parser.parse_args()
+
+    if args.workers > 1 and not (hasattr(socket, "SO_REUSEPORT") and hasattr(socket, "AF_UNIX")):
+        logging.warning("Multiple workers are not supported on this platform. Running a single process.")
+        args.workers = 1
+
     try:
-        asyncio.run(main())
+        if args.workers > 1:
+            asyncio.run(run_workers(args.host, args.port, args.workers))
+        else:
+            asyncio.run(main(args.host, args.port))
     except KeyboardInterrupt:
         logging.info("Server is shutting down.")
\ No newline at end of file
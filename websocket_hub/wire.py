@@ -0,0 +1,120 @@
+#
+# Wire Encodings
+# The message encodings streamers, the hub and viewers can agree on in their hello:
+# JSON (text frames, the default) or MessagePack (binary frames).
+#
+
+import json
+
+try:
+    import msgpack
+except ImportError:  # MessagePack is optional; without it everything stays JSON
+    msgpack = None
+
+ENCODING_JSON = "json"
+ENCODING_MSGPACK = "msgpack"
+ENCODINGS = (ENCODING_JSON, ENCODING_MSGPACK) if msgpack is not None else (ENCODING_JSON,)
+
+_MSGPACK_HUB_SEQ_KEY = b"\xa7hub_seq"
+
+
+def negotiate(requested):
+    """The encoding to use for a peer that asked for `requested`: it if supported, JSON otherwise."""
+    return requested if requested in ENCODINGS else ENCODING_JSON
+
+def frame_encoding(frame):
+    """Binary frames carry MessagePack, text frames carry JSON."""
+    return ENCODING_MSGPACK if isinstance(frame, (bytes, bytearray, memoryview)) else ENCODING_JSON
+
+def decode(encoding, raw):
+    if encoding == ENCODING_MSGPACK:
+        if msgpack is None:
+            raise ValueError("msgpack is not installed")
+        return msgpack.unpackb(raw, raw=False, strict_map_key=False)
+    return json.loads(raw)
+
+def encode(encoding, payload):
+    """Encodes a payload: JSON as str (text frame), MessagePack as bytes (binary frame)."""
+    if encoding == ENCODING_MSGPACK:
+        return msgpack.packb(payload, use_bin_type=True)
+    return json.dumps(payload)
+
+def with_hub_seq(encoding, raw, hub_seq):
+    """
+    Tags an encoded map message with the hub sequence number without re-encoding it,
+    by splicing a "hub_seq" entry in front of its other entries.
+    A message that already has a "hub_seq" entry is decoded and re-encoded instead.
+    """
+    if encoding == ENCODING_MSGPACK:
+        if _MSGPACK_HUB_SEQ_KEY in raw:
+            return _reencode_with_hub_seq(encoding, raw, hub_seq)
+        return _msgpack_with_hub_seq(raw, hub_seq)
+    if isinstance(raw, str):
+        opening, closing, separator, key, tag = "{", "}", ",", '"hub_seq"', f'{{"hub_seq":{hub_seq}'
+    else:
+        opening, closing, separator, key, tag = b"{", b"}", b",", b'"hub_seq"', b'{"hub_seq":%d' % hub_seq
+    body = raw.lstrip()
+    if not body.startswith(opening):
+        return raw
+    if key in body:
+        return _reencode_with_hub_seq(encoding, raw, hub_seq)
+    rest = body[1:].lstrip()
+    # An empty object gets no separator after the new entry
+    return tag + rest if rest.startswith(closing) else tag + separator + rest
+
+def _reencode_with_hub_seq(encoding, raw, hub_seq):
+    try:
+        payload = decode(encoding, raw)
+    except (ValueError, TypeError):
+        return raw
+    if not isinstance(payload, dict):
+        return raw
+    payload["hub_seq"] = hub_seq
+    message = encode(encoding, payload)
+    # The bus carries JSON as bytes; keep the type the message came in
+    return message.encode() if isinstance(raw, bytes) and isinstance(message, str) else message
+
+def _msgpack_with_hub_seq(raw, hub_seq):
+    first = raw[0] if raw else None
+    if first is None:
+        return raw
+    if 0x80 <= first <= 0x8e:  # fixmap with up to 14 entries
+        header, body = bytes([first + 1]), raw[1:]
+    elif first == 0x8f:  # fixmap with 15 entries becomes a map16
+        header, body = b"\xde\x00\x10", raw[1:]
+    elif first == 0xde and raw[1:3] != b"\xff\xff":  # map16
+        header, body = b"\xde" + (int.from_bytes(raw[1:3], "big") + 1).to_bytes(2, "big"), raw[3:]
+    elif first == 0xdf:  # map32
+        header, body = b"\xdf" + (int.from_bytes(raw[1:5], "big") + 1).to_bytes(4, "big"), raw[5:]
+    else:
+        return raw
+    return header + _MSGPACK_HUB_SEQ_KEY + msgpack.packb(hub_seq) + body
+
+
+class WireMessage:
+    """
+    One message and its encodings. It is translated at most once per encoding,
+    however many viewers receive it.
+
+    `raw` is the message as received (in `encoding`). `data` is its decoded form, if already
+    available; it is only used to skip decoding when translating and may be dropped afterwards.
+    """
+
+    __slots__ = ("encoding", "raw", "data", "encoded")
+
+    def __init__(self, encoding=None, raw=None, data=None):
+        self.encoding = encoding
+        self.raw = raw
+        self.data = data
+        self.encoded = {encoding: raw} if raw is not None else {}
+
+    @classmethod
+    def from_payload(cls, payload):
+        return cls(data=payload)
+
+    def encode(self, encoding):
+        message = self.encoded.get(encoding)
+        if message is None:
+            data = self.data if self.data is not None else decode(self.encoding, self.raw)
+            message = self.encoded[encoding] = encode(encoding, data)
+        return message